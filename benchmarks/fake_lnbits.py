@@ -0,0 +1,92 @@
+"""Local LNbits stand-in with configurable latency and error rate.
+
+Only invoice creation (POST /api/v1/payments) is implemented, which is all
+the payment workers call. Each successful response is timestamped by the
+payee prefix in its memo so the runner can measure repost-to-invoice
+latency.
+"""
+
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+
+# Payee prefix in memos written by request_invoice
+MEMO_PAYEE = re.compile(r"by ([0-9a-f]{8})")
+
+class FakeLNbits:
+    """Threaded HTTP server answering invoice requests."""
+
+    def __init__(self, latency: float = 0.05, error_rate: float = 0.0):
+        """Initialize the server.
+
+        Args:
+            latency: Seconds each request takes
+            error_rate: Share of requests answered with HTTP 503
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self.invoiced_at: Dict[str, float] = {}
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def _handler(self) -> type:
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self) -> None:
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self.path != "/api/v1/payments":
+                    self.send_error(404)
+                    return
+                time.sleep(fake.latency)
+                with fake._lock:
+                    fake.requests += 1
+                    failed = random.random() < fake.error_rate
+                    fake.errors += failed
+                if failed:
+                    self.send_error(503)
+                    return
+
+                payment_hash = "%064x" % random.getrandbits(256)
+                reply = json.dumps({
+                    "payment_hash": payment_hash,
+                    "payment_request": f"lnbc1fake{payment_hash[:32]}",
+                }).encode()
+                self.send_response(201)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(reply)))
+                self.end_headers()
+                self.wfile.write(reply)
+
+                match = MEMO_PAYEE.search(json.loads(body).get("memo", ""))
+                if match:
+                    with fake._lock:
+                        fake.invoiced_at.setdefault(match.group(1), time.perf_counter())
+
+            def log_message(self, format: str, *args) -> None:
+                pass
+
+        return Handler
+
+    def start(self) -> str:
+        """Serve from a background thread.
+
+        Returns:
+            The base URL to use as LNBITS_URL
+        """
+        thread = threading.Thread(target=self.server.serve_forever, name="fake-lnbits", daemon=True)
+        thread.start()
+        return self.url
+
+    def close(self) -> None:
+        """Stop the server."""
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,179 @@
+"""Local Nostr relay that replays a generated event mix at a target rate.
+
+The mix contains noise notes that mention no watched note, genuine reposts
+of watched notes, reposts with forged signatures, and events that are sent
+by every relay so the bot has to deduplicate them.
+"""
+
+import asyncio
+import json
+import random
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+import websockets
+from nostr.event import Event
+from nostr.key import PrivateKey
+
+@dataclass
+class EventMix:
+    """Shares of each kind of event in the generated stream."""
+
+    repost_ratio: float = 0.1  # Signed reposts of watched notes
+    forged_ratio: float = 0.01  # Reposts whose signature does not match
+    duplicate_ratio: float = 0.5  # Events sent by every relay, not just one
+
+@dataclass
+class GeneratedEvents:
+    """Frames to send per relay and what the bot should make of them."""
+
+    # Per relay: (frame, pubkey prefix for genuine reposts, else None)
+    frames: List[List[Tuple[str, Optional[str]]]]
+    reposts: int = 0
+    forged: int = 0
+    total: int = 0
+
+def _random_hex(length: int) -> str:
+    return "".join(random.choices("0123456789abcdef", k=length))
+
+def _frame(data: dict) -> str:
+    return json.dumps(["EVENT", "{sub}", data])
+
+def _event_data(event: Event) -> dict:
+    return {
+        "id": event.id,
+        "pubkey": event.public_key,
+        "created_at": event.created_at,
+        "kind": event.kind,
+        "tags": event.tags,
+        "content": event.content,
+        "sig": event.signature,
+    }
+
+def generate_events(count: int, relays: int, note_ids: List[str], mix: EventMix) -> GeneratedEvents:
+    """Build the event stream for a benchmark run.
+
+    Signing is slow, so every event is generated before the run starts.
+
+    Args:
+        count: Number of distinct events
+        relays: Number of relays the events are spread over
+        note_ids: Watched note IDs reposts refer to
+        mix: Shares of each kind of event
+
+    Returns:
+        Frames per relay, with a "{sub}" placeholder for the subscription ID
+    """
+    generated = GeneratedEvents(frames=[[] for _ in range(relays)], total=count)
+    now = int(time.time())
+
+    for n in range(count):
+        roll = random.random()
+        if roll < mix.repost_ratio + mix.forged_ratio:
+            # Every repost comes from a new user so none is rate limited
+            key = PrivateKey()
+            event = Event(
+                key.public_key.hex(), "", created_at=now, kind=6,
+                tags=[["e", random.choice(note_ids)], ["p", _random_hex(64)]]
+            )
+            key.sign_event(event)
+            tag = None
+            if roll < mix.forged_ratio:
+                event.signature = _random_hex(128)
+                generated.forged += 1
+            else:
+                # LNbits memos name the payee by this prefix
+                tag = event.public_key[:8]
+                generated.reposts += 1
+            data = _event_data(event)
+        else:
+            tag = None
+            data = {
+                "id": _random_hex(64),
+                "pubkey": _random_hex(64),
+                "created_at": now,
+                "kind": 1,
+                "tags": [["e", _random_hex(64)]],
+                "content": "noise " * random.randint(1, 40),
+                "sig": _random_hex(128),
+            }
+
+        item = (_frame(data), tag)
+        if relays > 1 and random.random() < mix.duplicate_ratio:
+            for frames in generated.frames:
+                frames.append(item)
+        else:
+            generated.frames[n % relays].append(item)
+
+    for frames in generated.frames:
+        random.shuffle(frames)
+    return generated
+
+class FakeRelay:
+    """Websocket relay streaming pre-built frames to every subscription."""
+
+    def __init__(self, frames: List[Tuple[str, Optional[str]]], rate: float, sent_at: Dict[str, float]):
+        """Initialize the relay.
+
+        Args:
+            frames: (frame, tag) pairs from generate_events
+            rate: Frames per second
+            sent_at: Shared mapping that receives the first send time
+                (perf_counter) of every tagged frame
+        """
+        self.frames = frames
+        self.rate = rate
+        self.sent_at = sent_at
+        self.server = None
+        self.url: Optional[str] = None
+        self.started = asyncio.Event()
+        self.finished = asyncio.Event()
+
+    async def start(self) -> str:
+        """Start listening on a free local port.
+
+        Returns:
+            The relay URL
+        """
+        self.server = await websockets.serve(self._handle, "127.0.0.1", 0, max_size=None)
+        self.url = f"ws://127.0.0.1:{self.server.sockets[0].getsockname()[1]}"
+        return self.url
+
+    async def _handle(self, websocket) -> None:
+        try:
+            async for message in websocket:
+                request = json.loads(message)
+                if request[0] == "REQ":
+                    # Nothing stored: catch-up ends right away and the stream is live
+                    await websocket.send(json.dumps(["EOSE", request[1]]))
+                    if not self.started.is_set():
+                        self.started.set()
+                        asyncio.create_task(self._stream(websocket, request[1]))
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+    async def _stream(self, websocket, subscription_id: str) -> None:
+        tick = 0.01
+        per_tick = max(1, int(self.rate * tick))
+        prefix = json.dumps(subscription_id)
+        start = time.perf_counter()
+        try:
+            for index in range(0, len(self.frames), per_tick):
+                for frame, tag in self.frames[index:index + per_tick]:
+                    if tag is not None:
+                        self.sent_at.setdefault(tag, time.perf_counter())
+                    await websocket.send(frame.replace('"{sub}"', prefix, 1))
+                # Pace against the start time so slow sends do not drift
+                delay = start + (index + per_tick) / self.rate - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            self.finished.set()
+
+    async def close(self) -> None:
+        """Stop the relay."""
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
@@ -0,0 +1,238 @@
+"""End-to-end load benchmark for the AutoZap pipeline.
+
+Starts local fake relays and a fake LNbits, points the real bot at them
+and measures how it copes with the generated load:
+
+    python -m benchmarks.run --events 20000 --rate 2000 --relays 3
+
+Results can be saved as a baseline and later runs compared against it:
+
+    python -m benchmarks.run --save benchmarks/results/baseline.json
+    python -m benchmarks.run --baseline benchmarks/results/baseline.json
+
+A comparison exits with status 1 if any tracked figure regressed by more
+than the tolerance.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The bot imports itself both as backend.* and src.backend.*
+sys.path[:0] = [os.path.join(ROOT, "src"), ROOT]
+
+from benchmarks.fake_lnbits import FakeLNbits
+from benchmarks.fake_relay import EventMix, FakeRelay, generate_events
+
+# Figures compared against a baseline: (higher is better, changes smaller
+# than this are noise)
+TRACKED = {
+    "events_per_second": (True, 0),
+    "latency_p50": (False, 0.005),
+    "latency_p99": (False, 0.005),
+    "rss_growth_mb": (False, 5),
+}
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    """Return the nearest-rank percentile of a list of values.
+
+    Args:
+        values: Observed values
+        fraction: Percentile as a fraction, e.g. 0.99
+
+    Returns:
+        The percentile, or None if there are no values
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))
+    return ordered[index]
+
+def rss_mb() -> float:
+    """Return the current resident set size in MB."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        # Peak rather than current RSS; kB on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (2**20 if sys.platform == "darwin" else 2**10)
+
+def db_size_mb(path: str) -> float:
+    """Return the size of a SQLite database including its WAL in MB."""
+    total = 0
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            total += os.path.getsize(path + suffix)
+    return total / 2**20
+
+def configure(lnbits_url: str, relay_urls: List[str], db_path: str, note_ids: List[str], args) -> None:
+    """Point the bot's configuration at the fake services."""
+    os.environ.update({
+        "LNBITS_API_KEY": "benchmark",
+        "LNBITS_URL": lnbits_url,
+        "NOSTR_RELAY_URLS": ",".join(relay_urls),
+        "NOSTR_BACKUP_RELAY_URLS": "",
+        "DB_PATH": db_path,
+        "WATCH_NOTE_IDS": ",".join(note_ids),
+        "DEDUP_SNAPSHOT_PATH": "",
+        "PAYMENT_WORKERS": str(args.payment_workers),
+        "VERIFY_WORKERS": str(args.verify_workers),
+        "LNBITS_MAX_RETRIES": "0",
+        "METRICS_PORT": "0",
+    })
+
+async def drain(expected: int, fake_lnbits: FakeLNbits, relays: List[FakeRelay], timeout: float) -> None:
+    """Wait until every relay finished sending and every repost was invoiced."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        sent = all(relay.finished.is_set() for relay in relays)
+        if sent and fake_lnbits.requests >= expected:
+            return
+        await asyncio.sleep(0.05)
+    print("Timed out waiting for the pipeline to drain", file=sys.stderr)
+
+async def run_benchmark(args) -> Dict[str, object]:
+    """Run one benchmark and collect its results."""
+    note_ids = ["%064x" % n for n in range(1, args.notes + 1)]
+    mix = EventMix(args.repost_ratio, args.forged_ratio, args.duplicate_ratio)
+    print(f"Generating {args.events} events...", file=sys.stderr)
+    generated = generate_events(args.events, args.relays, note_ids, mix)
+
+    sent_at: Dict[str, float] = {}
+    rate = args.rate / args.relays
+    relays = [FakeRelay(frames, rate, sent_at) for frames in generated.frames]
+    relay_urls = [await relay.start() for relay in relays]
+    fake_lnbits = FakeLNbits(args.lnbits_latency, args.lnbits_error_rate)
+    fake_lnbits.start()
+
+    workdir = tempfile.mkdtemp(prefix="autozap-bench-")
+    db_path = os.path.join(workdir, "payments.db")
+    configure(fake_lnbits.url, relay_urls, db_path, note_ids, args)
+
+    # Imported late so the modules see the benchmark configuration
+    from backend import metrics
+    from backend.config import get_config
+    from backend.db.models import get_database
+    from backend.nostr_bot import bot
+    from backend.nostr_bot.campaigns import CampaignRegistry
+
+    logging.getLogger().setLevel(args.log_level)
+    metrics.enable()
+    config = get_config()
+    db = get_database(config.db_path)
+    bot.bot_status.campaigns = CampaignRegistry(
+        bot.load_campaigns(db, note_ids), chunk_size=config.relay_filter_chunk_size
+    )
+
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    task = asyncio.create_task(bot._run(db, note_ids))
+    await drain(generated.reposts, fake_lnbits, relays, args.timeout)
+    elapsed = time.perf_counter() - start
+    rss_after = rss_mb()
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+    for relay in relays:
+        await relay.close()
+    fake_lnbits.close()
+    db.close()
+
+    latencies = [
+        fake_lnbits.invoiced_at[tag] - sent
+        for tag, sent in sent_at.items() if tag in fake_lnbits.invoiced_at
+    ]
+    frames = sum(len(frames) for frames in generated.frames)
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "params": {key: value for key, value in vars(args).items() if key not in ("save", "baseline", "log_level")},
+        "frames_sent": frames,
+        "events_per_second": round(frames / elapsed, 1),
+        "elapsed_seconds": round(elapsed, 3),
+        "reposts": generated.reposts,
+        "invoiced": len(latencies),
+        "lnbits_errors": fake_lnbits.errors,
+        "forged": generated.forged,
+        "rejected": metrics.REPOSTS_REJECTED.value(),
+        "dedup_hits": metrics.DEDUP_HITS.value(),
+        "latency_p50": percentile(latencies, 0.5),
+        "latency_p99": percentile(latencies, 0.99),
+        "rss_growth_mb": round(rss_after - rss_before, 1),
+        "db_size_mb": round(db_size_mb(db_path), 3),
+    }
+
+def compare(result: Dict[str, object], baseline: Dict[str, object], tolerance: float) -> List[str]:
+    """List the tracked figures that regressed beyond the tolerance.
+
+    Args:
+        result: This run's results
+        baseline: Saved results to compare against
+        tolerance: Allowed relative change, e.g. 0.1 for 10%
+
+    Returns:
+        Human-readable regressions (empty if none)
+    """
+    regressions = []
+    for key, (higher_is_better, noise) in TRACKED.items():
+        new, old = result.get(key), baseline.get(key)
+        if new is None or old is None:
+            continue
+        change = old - new if higher_is_better else new - old
+        if change > abs(old) * tolerance and change > noise:
+            regressions.append(f"{key}: {old} -> {new}")
+    return regressions
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="AutoZap end-to-end load benchmark")
+    parser.add_argument("--events", type=int, default=20000, help="distinct events to send")
+    parser.add_argument("--rate", type=float, default=2000, help="frames per second across all relays")
+    parser.add_argument("--relays", type=int, default=3, help="fake relays to run")
+    parser.add_argument("--notes", type=int, default=10, help="watched notes")
+    parser.add_argument("--repost-ratio", type=float, default=0.1, help="share of genuine reposts")
+    parser.add_argument("--forged-ratio", type=float, default=0.01, help="share of reposts with bad signatures")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.5, help="share of events sent by every relay")
+    parser.add_argument("--lnbits-latency", type=float, default=0.05, help="seconds per LNbits request")
+    parser.add_argument("--lnbits-error-rate", type=float, default=0.0, help="share of LNbits requests failing")
+    parser.add_argument("--payment-workers", type=int, default=4, help="PAYMENT_WORKERS for the bot")
+    parser.add_argument("--verify-workers", type=int, default=0, help="VERIFY_WORKERS for the bot")
+    parser.add_argument("--timeout", type=float, default=300, help="seconds to wait for the pipeline to drain")
+    parser.add_argument("--log-level", default="WARNING", help="bot log level during the run")
+    parser.add_argument("--save", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against results saved with --save")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed relative regression")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    result = asyncio.run(run_benchmark(args))
+    print(json.dumps(result, indent=2))
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump(result, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
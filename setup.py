@@ -6,6 +6,7 @@ setup(
     packages=find_packages(),
     install_requires=[
         "python-nostr>=0.5.0",
+        "websockets>=12.0",
         "python-dotenv>=1.0.0",
         "requests>=2.31.0",
     ],
@@ -0,0 +1 @@
+"""AutoZap read-only stats API package."""
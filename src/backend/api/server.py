@@ -0,0 +1,280 @@
+"""Read-only stats API for AutoZap.
+
+This module serves campaign status, recent payouts, payment totals and
+relay/pipeline health as JSON for dashboards. It reads the payments
+database through its own read-only connections, and every response is
+cached for a few seconds and tagged with an ETag, so many pollers cost a
+handful of queries per cache period and unchanged data is answered with
+304 Not Modified.
+
+    GET /api/campaigns              active campaigns with their totals
+    GET /api/payouts?limit=50       most recent payments
+    GET /api/notes/<note_id>        totals for one note
+    GET /api/totals/daily?days=30   totals per UTC day
+    GET /api/health                 relay and pipeline statistics
+"""
+
+import hashlib
+import itertools
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+from backend.config import NOTE_ID_PATTERN
+from backend.db.models import Database, PaymentTotals
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "application/json"
+
+# Upper bounds for query parameters
+MAX_PAYOUTS = 500
+MAX_DAYS = 366
+
+# Threads running database queries; each keeps one read-only connection
+QUERY_THREADS = 2
+
+class ResponseCache:
+    """Short-lived cache of rendered responses.
+
+    Concurrent requests for an expired entry wait for a single rebuild
+    instead of each running the query.
+    """
+
+    def __init__(self, ttl: float = 5.0, max_entries: int = 1024, clock: Callable[[], float] = time.monotonic):
+        """Initialize an empty cache.
+
+        Args:
+            ttl: Seconds a response is served before it is rebuilt
+            max_entries: Responses kept before the oldest are dropped
+            clock: Monotonic time source
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[str, Tuple[float, bytes, str]] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str, build: Callable[[], Any]) -> Tuple[bytes, str]:
+        """Return a cached response, building it if missing or expired.
+
+        Args:
+            key: Cache key (the request path and query)
+            build: Returns the JSON-serializable response data
+
+        Returns:
+            (response body, ETag)
+        """
+        entry = self._entries.get(key)
+        if entry and entry[0] > self.clock():
+            self.hits += 1
+            return entry[1], entry[2]
+
+        with self._lock:
+            key_lock = self._locks.setdefault(key, threading.Lock())
+        with key_lock:
+            # Another request may have rebuilt it while we waited
+            entry = self._entries.get(key)
+            if entry and entry[0] > self.clock():
+                self.hits += 1
+                return entry[1], entry[2]
+
+            self.misses += 1
+            body = json.dumps(build(), separators=(",", ":"), default=str).encode()
+            etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+            with self._lock:
+                self._entries.pop(key, None)
+                self._entries[key] = (self.clock() + self.ttl, body, etag)
+                while len(self._entries) > self.max_entries:
+                    oldest = next(iter(self._entries))
+                    del self._entries[oldest]
+                    self._locks.pop(oldest, None)
+            return body, etag
+
+class NotFound(Exception):
+    """Raised for a request no route matches."""
+    pass
+
+def totals_dict(totals: PaymentTotals) -> Dict[str, int]:
+    """Return payment totals as a plain dictionary."""
+    return {
+        "payments": totals.payments,
+        "amount": totals.amount,
+        "paid_payments": totals.paid_payments,
+        "paid_amount": totals.paid_amount,
+    }
+
+def _int_param(query: Dict[str, list], name: str, default: int, maximum: int) -> int:
+    try:
+        value = int(query.get(name, [default])[0])
+    except ValueError:
+        value = default
+    return max(1, min(value, maximum))
+
+class StatsAPI:
+    """Builds the API responses from a read-only database."""
+
+    def __init__(
+        self,
+        db: Database,
+        health: Optional[Callable[[], Dict[str, Any]]] = None,
+        cache_seconds: float = 5.0
+    ):
+        """Initialize the API.
+
+        Args:
+            db: Database opened with read_only=True
+            health: Returns relay and pipeline statistics
+            cache_seconds: How long responses are cached
+        """
+        self.db = db
+        self.health = health
+        self.cache = ResponseCache(cache_seconds)
+        # Request threads are short-lived, so queries run on a few long-lived
+        # threads rather than opening a connection per request
+        self._queries = ThreadPoolExecutor(max_workers=QUERY_THREADS, thread_name_prefix="stats-db")
+
+    def _query(self, route: Callable[..., Dict[str, Any]], *args) -> Callable[[], Dict[str, Any]]:
+        return lambda: self._queries.submit(route, *args).result()
+
+    def campaigns(self) -> Dict[str, Any]:
+        """Active campaigns with their payment totals."""
+        return {"campaigns": [
+            {
+                "note_id": campaign.note_id,
+                "amount": campaign.amount,
+                "budget": campaign.budget,
+                "totals": totals_dict(self.db.get_note_totals(campaign.note_id)),
+            }
+            for campaign in self.db.get_active_campaigns()
+        ]}
+
+    def payouts(self, limit: int) -> Dict[str, Any]:
+        """The most recent payments, newest first."""
+        payments = itertools.islice(self.db.iter_payments(page_size=limit), limit)
+        return {"payouts": [
+            {
+                "id": payment.id,
+                "npub": payment.npub,
+                "note_id": payment.note_id,
+                "amount": payment.amount,
+                "status": payment.status,
+                "created_at": int(payment.created_at.timestamp()),
+            }
+            for payment in payments
+        ]}
+
+    def note(self, note_id: str) -> Dict[str, Any]:
+        """Payment totals for one note."""
+        return {"note_id": note_id, "totals": totals_dict(self.db.get_note_totals(note_id))}
+
+    def daily(self, days: int) -> Dict[str, Any]:
+        """Payment totals for each of the last days with payments."""
+        today = datetime.now(timezone.utc).date()
+        first = (today - timedelta(days=days - 1)).isoformat()
+        return {"days": [
+            {"day": day, **totals_dict(totals)}
+            for day, totals in self.db.get_daily_totals(first, today.isoformat())
+        ]}
+
+    def pipeline(self) -> Dict[str, Any]:
+        """Relay and pipeline statistics from the running bot."""
+        return self.health()
+
+    def respond(self, target: str) -> Tuple[bytes, str]:
+        """Return the (possibly cached) response for a request target.
+
+        Args:
+            target: Request path with query string
+
+        Returns:
+            (response body, ETag)
+
+        Raises:
+            NotFound: If no route matches
+        """
+        url = urlsplit(target)
+        path = url.path.rstrip("/")
+        query = parse_qs(url.query)
+
+        # Cache keys use the parsed parameters, so arbitrary query strings
+        # cannot fill the cache or bypass it
+        if path == "/api/campaigns":
+            return self.cache.get("campaigns", self._query(self.campaigns))
+        if path == "/api/payouts":
+            limit = _int_param(query, "limit", 50, MAX_PAYOUTS)
+            return self.cache.get(f"payouts:{limit}", self._query(self.payouts, limit))
+        if path == "/api/totals/daily":
+            days = _int_param(query, "days", 30, MAX_DAYS)
+            return self.cache.get(f"daily:{days}", self._query(self.daily, days))
+        if path == "/api/health" and self.health is not None:
+            return self.cache.get("health", self.pipeline)
+        if path.startswith("/api/notes/"):
+            note_id = path[len("/api/notes/"):]
+            if NOTE_ID_PATTERN.match(note_id):
+                return self.cache.get(f"note:{note_id}", self._query(self.note, note_id))
+        raise NotFound(path)
+
+    def close(self) -> None:
+        """Stop the query threads."""
+        self._queries.shutdown(wait=True)
+
+class _APIHandler(BaseHTTPRequestHandler):
+    api: StatsAPI
+
+    def do_GET(self) -> None:
+        try:
+            body, etag = self.api.respond(self.path)
+        except NotFound:
+            self.send_error(404)
+            return
+        except Exception as e:
+            logger.error(f"Stats API error for {self.path}: {str(e)}")
+            self.send_error(500)
+            return
+
+        cache_control = f"max-age={int(self.api.cache.ttl)}"
+        if etag in self.headers.get("If-None-Match", ""):
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", cache_control)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", cache_control)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug(f"Stats API request from {self.address_string()}: {format % args}")
+
+def start_api_server(api: StatsAPI, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve the stats API from a background thread.
+
+    Args:
+        api: The API to serve
+        port: TCP port to listen on (0 picks a free port)
+        host: Address to bind
+
+    Returns:
+        The running server; call shutdown() to stop it
+    """
+    handler = type("APIHandler", (_APIHandler,), {"api": api})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="stats-api", daemon=True)
+    thread.start()
+    logger.info(f"Serving stats API on http://{host}:{server.server_address[1]}/api/")
+    return server
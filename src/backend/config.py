@@ -5,13 +5,16 @@ and provides a centralized configuration object for the application.
 """
 
 import os
+import re
 import logging
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import List
 from dotenv import load_dotenv
 
 logger = logging.getLogger(__name__)
 
+NOTE_ID_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
 @dataclass
 class Config:
     """Configuration container for AutoZap."""
@@ -22,6 +25,52 @@ class Config:
     payment_amount: int
     rate_limit_hours: int
     db_path: str
+    repost_lookback_hours: int = 24
+    watch_note_ids: List[str] = field(default_factory=list)
+    relay_filter_chunk_size: int = 256
+    campaign_refresh_seconds: int = 30
+    dedup_window_hours: int = 24
+    dedup_max_entries: int = 200000
+    dedup_snapshot_path: str = ""
+    rate_limit_cache_size: int = 100000
+    payment_workers: int = 4
+    payment_queue_size: int = 1000
+    lnbits_timeout: float = 10.0
+    lnbits_max_retries: int = 2
+    lnbits_breaker_threshold: int = 5
+    lnbits_breaker_reset_seconds: float = 30.0
+    lnbits_park_seconds: float = 300.0
+    verify_workers: int = 0
+    verify_batch_size: int = 64
+    relay_cursor_overlap_seconds: int = 600
+    nostr_backup_relay_urls: List[str] = field(default_factory=list)
+    relay_min_active: int = 2
+    relay_evaluate_seconds: int = 300
+    metrics_port: int = 0
+    metrics_host: str = "127.0.0.1"
+    reconcile_interval_seconds: int = 60
+    reconcile_page_size: int = 200
+    reconcile_concurrency: int = 8
+    api_port: int = 0
+    api_host: str = "127.0.0.1"
+    api_cache_seconds: float = 5
+    shards: int = 1
+    budget_hourly_sats: int = 0
+    budget_daily_sats: int = 0
+    profile_cache_hours: float = 0
+    profile_negative_cache_minutes: float = 60
+    profile_batch_ms: int = 100
+    profile_batch_size: int = 500
+    profile_fetch_timeout: float = 5
+    profile_cache_size: int = 100000
+    lnurl_timeout: float = 5
+    lnurl_cache_seconds: int = 3600
+    lnurl_domain_concurrency: int = 4
+    relay_ready_quorum: int = 2
+    relay_ready_timeout: float = 10
+    outbox_lease_seconds: int = 900
+    outbox_max_attempts: int = 5
+    payout_mode: str = "invoice"
 
 def validate_config() -> Config:
     """Load and validate configuration from environment variables.
@@ -43,6 +92,52 @@ def validate_config() -> Config:
     payment_amount = int(os.getenv("PAYMENT_AMOUNT", "1"))
     rate_limit_hours = int(os.getenv("RATE_LIMIT_HOURS", "24"))
     db_path = os.getenv("DB_PATH", "payments.db")
+    repost_lookback_hours = int(os.getenv("REPOST_LOOKBACK_HOURS", "24"))
+    watch_note_ids = os.getenv("WATCH_NOTE_IDS", "")
+    relay_filter_chunk_size = int(os.getenv("RELAY_FILTER_CHUNK_SIZE", "256"))
+    campaign_refresh_seconds = int(os.getenv("CAMPAIGN_REFRESH_SECONDS", "30"))
+    dedup_window_hours = int(os.getenv("DEDUP_WINDOW_HOURS", "24"))
+    dedup_max_entries = int(os.getenv("DEDUP_MAX_ENTRIES", "200000"))
+    dedup_snapshot_path = os.getenv("DEDUP_SNAPSHOT_PATH", "")
+    rate_limit_cache_size = int(os.getenv("RATE_LIMIT_CACHE_SIZE", "100000"))
+    payment_workers = int(os.getenv("PAYMENT_WORKERS", "4"))
+    payment_queue_size = int(os.getenv("PAYMENT_QUEUE_SIZE", "1000"))
+    lnbits_timeout = float(os.getenv("LNBITS_TIMEOUT", "10"))
+    lnbits_max_retries = int(os.getenv("LNBITS_MAX_RETRIES", "2"))
+    lnbits_breaker_threshold = int(os.getenv("LNBITS_BREAKER_THRESHOLD", "5"))
+    lnbits_breaker_reset_seconds = float(os.getenv("LNBITS_BREAKER_RESET_SECONDS", "30"))
+    lnbits_park_seconds = float(os.getenv("LNBITS_PARK_SECONDS", "300"))
+    verify_workers = int(os.getenv("VERIFY_WORKERS", "0"))
+    verify_batch_size = int(os.getenv("VERIFY_BATCH_SIZE", "64"))
+    relay_cursor_overlap_seconds = int(os.getenv("RELAY_CURSOR_OVERLAP_SECONDS", "600"))
+    backup_relay_urls = os.getenv("NOSTR_BACKUP_RELAY_URLS", "")
+    relay_min_active = int(os.getenv("RELAY_MIN_ACTIVE", "2"))
+    relay_evaluate_seconds = int(os.getenv("RELAY_EVALUATE_SECONDS", "300"))
+    metrics_port = int(os.getenv("METRICS_PORT", "0"))
+    metrics_host = os.getenv("METRICS_HOST", "127.0.0.1")
+    reconcile_interval_seconds = int(os.getenv("RECONCILE_INTERVAL_SECONDS", "60"))
+    reconcile_page_size = int(os.getenv("RECONCILE_PAGE_SIZE", "200"))
+    reconcile_concurrency = int(os.getenv("RECONCILE_CONCURRENCY", "8"))
+    api_port = int(os.getenv("API_PORT", "0"))
+    api_host = os.getenv("API_HOST", "127.0.0.1")
+    api_cache_seconds = float(os.getenv("API_CACHE_SECONDS", "5"))
+    shards = int(os.getenv("SHARDS", "1"))
+    budget_hourly_sats = int(os.getenv("BUDGET_HOURLY_SATS", "0"))
+    budget_daily_sats = int(os.getenv("BUDGET_DAILY_SATS", "0"))
+    profile_cache_hours = float(os.getenv("PROFILE_CACHE_HOURS", "0"))
+    profile_negative_cache_minutes = float(os.getenv("PROFILE_NEGATIVE_CACHE_MINUTES", "60"))
+    profile_batch_ms = int(os.getenv("PROFILE_BATCH_MS", "100"))
+    profile_batch_size = int(os.getenv("PROFILE_BATCH_SIZE", "500"))
+    profile_fetch_timeout = float(os.getenv("PROFILE_FETCH_TIMEOUT", "5"))
+    profile_cache_size = int(os.getenv("PROFILE_CACHE_SIZE", "100000"))
+    lnurl_timeout = float(os.getenv("LNURL_TIMEOUT", "5"))
+    lnurl_cache_seconds = int(os.getenv("LNURL_CACHE_SECONDS", "3600"))
+    lnurl_domain_concurrency = int(os.getenv("LNURL_DOMAIN_CONCURRENCY", "4"))
+    relay_ready_quorum = int(os.getenv("RELAY_READY_QUORUM", "2"))
+    relay_ready_timeout = float(os.getenv("RELAY_READY_TIMEOUT", "10"))
+    outbox_lease_seconds = int(os.getenv("OUTBOX_LEASE_SECONDS", "900"))
+    outbox_max_attempts = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+    payout_mode = os.getenv("PAYOUT_MODE", "invoice")
     
     # Validation
     if not lnbits_api_key:
@@ -59,27 +154,207 @@ def validate_config() -> Config:
         
     if rate_limit_hours < 1:
         raise ValueError("RATE_LIMIT_HOURS must be at least 1")
+        
+    if repost_lookback_hours < 0:
+        raise ValueError("REPOST_LOOKBACK_HOURS must not be negative")
+        
+    if relay_filter_chunk_size < 1:
+        raise ValueError("RELAY_FILTER_CHUNK_SIZE must be at least 1")
+        
+    if campaign_refresh_seconds < 1:
+        raise ValueError("CAMPAIGN_REFRESH_SECONDS must be at least 1")
+        
+    if dedup_window_hours < 1:
+        raise ValueError("DEDUP_WINDOW_HOURS must be at least 1")
+        
+    if dedup_max_entries < 1:
+        raise ValueError("DEDUP_MAX_ENTRIES must be at least 1")
+        
+    if rate_limit_cache_size < 1:
+        raise ValueError("RATE_LIMIT_CACHE_SIZE must be at least 1")
+        
+    if payment_workers < 1:
+        raise ValueError("PAYMENT_WORKERS must be at least 1")
+        
+    if payment_queue_size < 1:
+        raise ValueError("PAYMENT_QUEUE_SIZE must be at least 1")
+        
+    if lnbits_timeout <= 0:
+        raise ValueError("LNBITS_TIMEOUT must be positive")
+        
+    if lnbits_max_retries < 0:
+        raise ValueError("LNBITS_MAX_RETRIES must not be negative")
+        
+    if lnbits_breaker_threshold < 1:
+        raise ValueError("LNBITS_BREAKER_THRESHOLD must be at least 1")
+        
+    if lnbits_breaker_reset_seconds <= 0:
+        raise ValueError("LNBITS_BREAKER_RESET_SECONDS must be positive")
+        
+    if lnbits_park_seconds < 0:
+        raise ValueError("LNBITS_PARK_SECONDS must not be negative")
+        
+    if verify_workers < 0:
+        raise ValueError("VERIFY_WORKERS must not be negative")
+        
+    if verify_batch_size < 1:
+        raise ValueError("VERIFY_BATCH_SIZE must be at least 1")
+        
+    if relay_cursor_overlap_seconds < 0:
+        raise ValueError("RELAY_CURSOR_OVERLAP_SECONDS must not be negative")
+        
+    if relay_min_active < 1:
+        raise ValueError("RELAY_MIN_ACTIVE must be at least 1")
+        
+    if relay_evaluate_seconds < 1:
+        raise ValueError("RELAY_EVALUATE_SECONDS must be at least 1")
+        
+    if not 0 <= metrics_port <= 65535:
+        raise ValueError("METRICS_PORT must be between 0 and 65535")
+        
+    if reconcile_interval_seconds < 0:
+        raise ValueError("RECONCILE_INTERVAL_SECONDS must not be negative")
+        
+    if reconcile_page_size < 1:
+        raise ValueError("RECONCILE_PAGE_SIZE must be at least 1")
+        
+    if reconcile_concurrency < 1:
+        raise ValueError("RECONCILE_CONCURRENCY must be at least 1")
+        
+    if not 0 <= api_port <= 65535:
+        raise ValueError("API_PORT must be between 0 and 65535")
+        
+    if api_cache_seconds < 0:
+        raise ValueError("API_CACHE_SECONDS must not be negative")
+        
+    if shards < 1:
+        raise ValueError("SHARDS must be at least 1")
+        
+    if budget_hourly_sats < 0:
+        raise ValueError("BUDGET_HOURLY_SATS must not be negative")
+        
+    if budget_daily_sats < 0:
+        raise ValueError("BUDGET_DAILY_SATS must not be negative")
+        
+    if profile_cache_hours < 0:
+        raise ValueError("PROFILE_CACHE_HOURS must not be negative")
+        
+    if profile_negative_cache_minutes < 0:
+        raise ValueError("PROFILE_NEGATIVE_CACHE_MINUTES must not be negative")
+        
+    if profile_batch_ms < 0:
+        raise ValueError("PROFILE_BATCH_MS must not be negative")
+        
+    if profile_batch_size < 1:
+        raise ValueError("PROFILE_BATCH_SIZE must be at least 1")
+        
+    if profile_fetch_timeout <= 0:
+        raise ValueError("PROFILE_FETCH_TIMEOUT must be positive")
+        
+    if profile_cache_size < 1:
+        raise ValueError("PROFILE_CACHE_SIZE must be at least 1")
+        
+    if lnurl_timeout <= 0:
+        raise ValueError("LNURL_TIMEOUT must be positive")
+        
+    if lnurl_cache_seconds < 0:
+        raise ValueError("LNURL_CACHE_SECONDS must not be negative")
+        
+    if lnurl_domain_concurrency < 1:
+        raise ValueError("LNURL_DOMAIN_CONCURRENCY must be at least 1")
+        
+    if relay_ready_quorum < 1:
+        raise ValueError("RELAY_READY_QUORUM must be at least 1")
+        
+    if relay_ready_timeout < 0:
+        raise ValueError("RELAY_READY_TIMEOUT must not be negative")
+        
+    if outbox_lease_seconds <= lnbits_park_seconds:
+        raise ValueError("OUTBOX_LEASE_SECONDS must be longer than LNBITS_PARK_SECONDS")
+        
+    if outbox_max_attempts < 1:
+        raise ValueError("OUTBOX_MAX_ATTEMPTS must be at least 1")
+        
+    if payout_mode not in ("invoice", "lightning_address"):
+        raise ValueError("PAYOUT_MODE must be invoice or lightning_address")
+        
+    if payout_mode == "lightning_address" and not profile_cache_hours:
+        raise ValueError("PAYOUT_MODE=lightning_address requires PROFILE_CACHE_HOURS above 0")
     
     # Parse relay URLs
     relay_url_list = [url.strip() for url in relay_urls.split(",") if url.strip()]
     if not relay_url_list:
         raise ValueError("At least one valid relay URL must be provided")
     
+    backup_relay_url_list = [url.strip() for url in backup_relay_urls.split(",") if url.strip()]
+    
     # Validate URLs
-    for url in relay_url_list:
+    for url in relay_url_list + backup_relay_url_list:
         if not url.startswith(("ws://", "wss://")):
             raise ValueError(f"Invalid relay URL: {url}. Must start with ws:// or wss://")
             
     if not lnbits_url.startswith(("http://", "https://")):
         raise ValueError(f"Invalid LNbits URL: {lnbits_url}. Must start with http:// or https://")
     
+    # Parse watched note IDs
+    note_id_list = [n.strip().lower() for n in watch_note_ids.split(",") if n.strip()]
+    for note_id in note_id_list:
+        if not NOTE_ID_PATTERN.match(note_id):
+            raise ValueError(f"Invalid note ID: {note_id}. Must be 64 hex characters")
+    
     return Config(
         lnbits_api_key=lnbits_api_key,
         lnbits_url=lnbits_url,
         nostr_relay_urls=relay_url_list,
         payment_amount=payment_amount,
         rate_limit_hours=rate_limit_hours,
-        db_path=db_path
+        db_path=db_path,
+        repost_lookback_hours=repost_lookback_hours,
+        watch_note_ids=note_id_list,
+        relay_filter_chunk_size=relay_filter_chunk_size,
+        campaign_refresh_seconds=campaign_refresh_seconds,
+        dedup_window_hours=dedup_window_hours,
+        dedup_max_entries=dedup_max_entries,
+        dedup_snapshot_path=dedup_snapshot_path,
+        rate_limit_cache_size=rate_limit_cache_size,
+        payment_workers=payment_workers,
+        payment_queue_size=payment_queue_size,
+        lnbits_timeout=lnbits_timeout,
+        lnbits_max_retries=lnbits_max_retries,
+        lnbits_breaker_threshold=lnbits_breaker_threshold,
+        lnbits_breaker_reset_seconds=lnbits_breaker_reset_seconds,
+        lnbits_park_seconds=lnbits_park_seconds,
+        verify_workers=verify_workers,
+        verify_batch_size=verify_batch_size,
+        relay_cursor_overlap_seconds=relay_cursor_overlap_seconds,
+        nostr_backup_relay_urls=backup_relay_url_list,
+        relay_min_active=relay_min_active,
+        relay_evaluate_seconds=relay_evaluate_seconds,
+        metrics_port=metrics_port,
+        metrics_host=metrics_host,
+        reconcile_interval_seconds=reconcile_interval_seconds,
+        reconcile_page_size=reconcile_page_size,
+        reconcile_concurrency=reconcile_concurrency,
+        api_port=api_port,
+        api_host=api_host,
+        api_cache_seconds=api_cache_seconds,
+        shards=shards,
+        budget_hourly_sats=budget_hourly_sats,
+        budget_daily_sats=budget_daily_sats,
+        profile_cache_hours=profile_cache_hours,
+        profile_negative_cache_minutes=profile_negative_cache_minutes,
+        profile_batch_ms=profile_batch_ms,
+        profile_batch_size=profile_batch_size,
+        profile_fetch_timeout=profile_fetch_timeout,
+        profile_cache_size=profile_cache_size,
+        lnurl_timeout=lnurl_timeout,
+        lnurl_cache_seconds=lnurl_cache_seconds,
+        lnurl_domain_concurrency=lnurl_domain_concurrency,
+        relay_ready_quorum=relay_ready_quorum,
+        relay_ready_timeout=relay_ready_timeout,
+        outbox_lease_seconds=outbox_lease_seconds,
+        outbox_max_attempts=outbox_max_attempts,
+        payout_mode=payout_mode
     )
 
 # Initialize configuration lazily
@@ -94,3 +369,16 @@ def init_config():
     except ValueError as e:
         logger.error(f"Configuration error: {e}")
         raise
+
+def get_config() -> Config:
+    """Return the active configuration, loading it on first use.
+    
+    Modules that import ``config`` directly bind ``None`` until
+    ``init_config`` runs; calling this at use time avoids that.
+    
+    Returns:
+        The initialized Config object
+    """
+    if config is None:
+        init_config()
+    return config
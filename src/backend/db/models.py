@@ -2,9 +2,475 @@
 
 from datetime import datetime
 import sqlite3
-from typing import Optional
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
 from dataclasses import dataclass
 
+# Connection settings applied once per connection. WAL lets readers run
+# alongside the writer, and NORMAL sync only fsyncs at checkpoints.
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -20000",  # 20 MB page cache
+    "PRAGMA mmap_size = 268435456",  # 256 MB memory-mapped I/O
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+)
+
+# Pragmas for read-only connections; the journal mode belongs to the writer
+READ_ONLY_PRAGMAS = PRAGMAS[2:] + ("PRAGMA query_only = ON",)
+
+# Number of prepared statements cached per connection
+STATEMENT_CACHE_SIZE = 256
+
+# Current time as integer epoch seconds, for column defaults
+EPOCH_NOW = "(CAST(strftime('%s', 'now') AS INTEGER))"
+
+# Payment totals tables: (table, key column, key expression over a payments
+# row, with {row} standing for the row prefix)
+TOTALS_TABLES = (
+    ("payment_totals_note", "note_id", "{row}note_id"),
+    ("payment_totals_user", "npub", "{row}npub"),
+    ("payment_totals_day", "day", "date({row}created_at, 'unixepoch')"),
+)
+
+def _payment_totals_migration() -> list[str]:
+    """Build the statements creating and backfilling the payment totals.
+    
+    Triggers keep the totals in step with every payment insert and status
+    change, inside the transaction that writes the payment.
+    """
+    statements = []
+    inserts = []
+    updates = []
+    for table, key, expression in TOTALS_TABLES:
+        new_key = expression.format(row="new.")
+        statements.append(f"""
+            CREATE TABLE {table} (
+                {key} TEXT PRIMARY KEY,
+                payments INTEGER NOT NULL DEFAULT 0,
+                amount INTEGER NOT NULL DEFAULT 0,
+                paid_payments INTEGER NOT NULL DEFAULT 0,
+                paid_amount INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID
+            """)
+        statements.append(f"""
+            INSERT INTO {table} ({key}, payments, amount, paid_payments, paid_amount)
+            SELECT {expression.format(row="")}, COUNT(*), SUM(amount), SUM(status = 'paid'),
+                SUM(CASE WHEN status = 'paid' THEN amount ELSE 0 END)
+            FROM payments GROUP BY 1
+            """)
+        inserts.append(f"""
+                INSERT INTO {table} ({key}, payments, amount, paid_payments, paid_amount)
+                VALUES ({new_key}, 1, new.amount, new.status = 'paid', (new.status = 'paid') * new.amount)
+                ON CONFLICT({key}) DO UPDATE SET
+                    payments = payments + 1,
+                    amount = amount + excluded.amount,
+                    paid_payments = paid_payments + excluded.paid_payments,
+                    paid_amount = paid_amount + excluded.paid_amount;
+            """)
+        updates.append(f"""
+                UPDATE {table} SET
+                    paid_payments = paid_payments + (new.status = 'paid') - (old.status = 'paid'),
+                    paid_amount = paid_amount + ((new.status = 'paid') - (old.status = 'paid')) * new.amount
+                WHERE {key} = {new_key};
+            """)
+    statements.append(f"""
+            CREATE TRIGGER payments_totals_insert AFTER INSERT ON payments
+            BEGIN {"".join(inserts)} END
+            """)
+    statements.append(f"""
+            CREATE TRIGGER payments_totals_status AFTER UPDATE OF status ON payments
+            WHEN (old.status = 'paid') != (new.status = 'paid')
+            BEGIN {"".join(updates)} END
+            """)
+    return statements
+
+# Payment statuses that ended without moving funds
+UNSPENT_STATUSES = "('failed', 'expired')"
+
+def _unspent_totals_migration() -> list[str]:
+    """Build the statements tracking failed and expired amounts in the totals.
+    
+    Spend limits count paid and pending payments only, so the amount of
+    payments that ended unpaid is kept next to each total and subtracted.
+    """
+    statements = []
+    inserts = []
+    updates = []
+    for table, key, expression in TOTALS_TABLES:
+        new_key = expression.format(row="new.")
+        statements.append(f"ALTER TABLE {table} ADD COLUMN unspent_amount INTEGER NOT NULL DEFAULT 0")
+        statements.append(f"""
+            UPDATE {table} SET unspent_amount = (
+                SELECT COALESCE(SUM(amount), 0) FROM payments
+                WHERE {expression.format(row="payments.")} = {table}.{key}
+                    AND status IN {UNSPENT_STATUSES}
+            )
+            """)
+        # An upsert, as the row may not exist yet when this trigger runs first
+        inserts.append(f"""
+                INSERT INTO {table} ({key}, unspent_amount) VALUES ({new_key}, new.amount)
+                ON CONFLICT({key}) DO UPDATE SET
+                    unspent_amount = unspent_amount + excluded.unspent_amount;
+            """)
+        updates.append(f"""
+                UPDATE {table} SET
+                    unspent_amount = unspent_amount
+                        + ((new.status IN {UNSPENT_STATUSES}) - (old.status IN {UNSPENT_STATUSES})) * new.amount
+                WHERE {key} = {new_key};
+            """)
+    statements.append(f"""
+            CREATE TRIGGER payments_unspent_insert AFTER INSERT ON payments
+            WHEN new.status IN {UNSPENT_STATUSES}
+            BEGIN {"".join(inserts)} END
+            """)
+    statements.append(f"""
+            CREATE TRIGGER payments_unspent_status AFTER UPDATE OF status ON payments
+            WHEN (old.status IN {UNSPENT_STATUSES}) != (new.status IN {UNSPENT_STATUSES})
+            BEGIN {"".join(updates)} END
+            """)
+    return statements
+
+# Schema migrations, applied in order inside one transaction each. After
+# entry N has run, PRAGMA user_version is N + 1.
+MIGRATIONS = [
+    # 1: initial schema
+    (
+        """
+        CREATE TABLE IF NOT EXISTS payments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            npub TEXT NOT NULL,
+            amount INTEGER NOT NULL,
+            bolt11 TEXT NOT NULL,
+            status TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            note_id TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS campaigns (
+            note_id TEXT PRIMARY KEY,
+            amount INTEGER,
+            active INTEGER NOT NULL DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ),
+    # 2: integer epoch timestamps and an index covering the rate-limit check.
+    # Text timestamps are read as UTC, matching CURRENT_TIMESTAMP.
+    (
+        f"""
+        CREATE TABLE payments_v2 (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            npub TEXT NOT NULL,
+            amount INTEGER NOT NULL,
+            bolt11 TEXT NOT NULL,
+            status TEXT NOT NULL,
+            created_at INTEGER NOT NULL DEFAULT {EPOCH_NOW},
+            note_id TEXT NOT NULL
+        )
+        """,
+        f"""
+        INSERT INTO payments_v2 (id, npub, amount, bolt11, status, created_at, note_id)
+        SELECT id, npub, amount, bolt11, status,
+            COALESCE(
+                CASE WHEN typeof(created_at) = 'integer' THEN created_at
+                ELSE CAST(strftime('%s', created_at) AS INTEGER) END,
+                {EPOCH_NOW}
+            ),
+            note_id
+        FROM payments
+        """,
+        "DROP TABLE payments",
+        "ALTER TABLE payments_v2 RENAME TO payments",
+        """
+        CREATE INDEX idx_payments_rate_limit
+        ON payments (npub, note_id, status, created_at)
+        """,
+    ),
+    # 3: index for scanning recent payments by status
+    (
+        """
+        CREATE INDEX idx_payments_status_created
+        ON payments (status, created_at)
+        """,
+    ),
+    # 4: payment outbox, one row per repost event
+    (
+        f"""
+        CREATE TABLE payment_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            event_id TEXT NOT NULL UNIQUE,
+            npub TEXT NOT NULL,
+            note_id TEXT NOT NULL,
+            amount INTEGER,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            payment_id INTEGER REFERENCES payments (id),
+            created_at INTEGER NOT NULL DEFAULT {EPOCH_NOW},
+            updated_at INTEGER NOT NULL DEFAULT {EPOCH_NOW}
+        )
+        """,
+        """
+        CREATE INDEX idx_payment_outbox_status
+        ON payment_outbox (status, id)
+        """,
+    ),
+    # 5: newest event time received per relay and watched note
+    (
+        """
+        CREATE TABLE relay_cursors (
+            relay_url TEXT NOT NULL,
+            note_id TEXT NOT NULL,
+            created_at INTEGER NOT NULL,
+            PRIMARY KEY (relay_url, note_id)
+        ) WITHOUT ROWID
+        """,
+    ),
+    # 6: how far each backfill input file has been processed
+    (
+        f"""
+        CREATE TABLE backfill_checkpoints (
+            path TEXT PRIMARY KEY,
+            offset INTEGER NOT NULL,
+            updated_at INTEGER NOT NULL DEFAULT {EPOCH_NOW}
+        )
+        """,
+    ),
+    # 7: LNbits payment hash for reconciliation; the partial index only
+    # holds rows still waiting for a result, so it stays small
+    (
+        "ALTER TABLE payments ADD COLUMN payment_hash TEXT",
+        """
+        CREATE INDEX idx_payments_pending ON payments (id)
+        WHERE status = 'pending' AND payment_hash IS NOT NULL
+        """,
+    ),
+    # 8: keyset history indexes and payment totals per note, user and UTC day
+    (
+        "CREATE INDEX idx_payments_created ON payments (created_at, id)",
+        "CREATE INDEX idx_payments_note ON payments (note_id, created_at, id)",
+        *_payment_totals_migration(),
+    ),
+    # 9: optional spend budget per campaign
+    (
+        "ALTER TABLE campaigns ADD COLUMN budget INTEGER",
+    ),
+    # 10: cached recipient profiles (lightning addresses from kind-0 metadata)
+    (
+        """
+        CREATE TABLE profiles (
+            pubkey TEXT PRIMARY KEY,
+            lud16 TEXT,
+            lud06 TEXT,
+            created_at INTEGER NOT NULL DEFAULT 0,
+            fetched_at INTEGER NOT NULL
+        ) WITHOUT ROWID
+        """,
+    ),
+    # 11: payment hash of an outbox entry's LNbits call, so an entry taken
+    # over from a stalled worker is looked up before LNbits is called again
+    (
+        "ALTER TABLE payment_outbox ADD COLUMN payment_hash TEXT",
+    ),
+    # 12: spend held for outbox entries in flight, shared by every process
+    # so budgets and spend limits hold across shards and backfills
+    (
+        """
+        CREATE TABLE budget_reservations (
+            entry_id INTEGER PRIMARY KEY,
+            note_id TEXT NOT NULL,
+            amount INTEGER NOT NULL,
+            created_at INTEGER NOT NULL
+        )
+        """,
+    ),
+    # 13: failed and expired amounts in the payment totals, which spend
+    # limits leave out
+    (
+        *_unspent_totals_migration(),
+    ),
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+# SQL is kept in constants so every call reuses the cached statement
+INSERT_PAYMENT_SQL = """
+INSERT INTO payments (npub, amount, bolt11, status, note_id, created_at, payment_hash)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+RECENT_PAYMENT_SQL = """
+SELECT EXISTS (
+    SELECT 1 FROM payments
+    WHERE npub = ? AND note_id = ? AND status = 'paid' AND created_at >= ?
+    LIMIT 1
+)
+"""
+
+LATEST_PAID_SQL = """
+SELECT MAX(created_at) FROM payments
+WHERE npub = ? AND note_id = ? AND status = 'paid' AND created_at >= ?
+"""
+
+RECENT_PAID_SQL = """
+SELECT npub, note_id, MAX(created_at) FROM payments
+WHERE status = 'paid' AND created_at >= ?
+GROUP BY npub, note_id
+"""
+
+PAYMENT_COLUMNS = "id, npub, amount, bolt11, status, created_at, note_id, payment_hash"
+
+TOTALS_COLUMNS = "payments, amount, paid_payments, paid_amount"
+
+NOTE_TOTALS_SQL = f"SELECT {TOTALS_COLUMNS} FROM payment_totals_note WHERE note_id = ?"
+
+USER_TOTALS_SQL = f"SELECT {TOTALS_COLUMNS} FROM payment_totals_user WHERE npub = ?"
+
+# Spend counted against a limit scope: paid and pending payments plus the
+# reservations of other entries (?2; NULL counts every reservation)
+BUDGET_SPENT_SQL = {
+    "note": """
+        SELECT COALESCE((SELECT amount - unspent_amount FROM payment_totals_note WHERE note_id = ?1), 0)
+            + (SELECT COALESCE(SUM(amount), 0) FROM budget_reservations
+               WHERE note_id = ?1 AND entry_id IS NOT ?2)
+        """,
+    "hour": f"""
+        SELECT (SELECT COALESCE(SUM(amount), 0) FROM payments
+                WHERE created_at >= ?1 AND status NOT IN {UNSPENT_STATUSES})
+            + (SELECT COALESCE(SUM(amount), 0) FROM budget_reservations
+               WHERE created_at >= ?1 AND entry_id IS NOT ?2)
+        """,
+    "day": """
+        SELECT COALESCE((SELECT amount - unspent_amount FROM payment_totals_day WHERE day = ?1), 0)
+            + (SELECT COALESCE(SUM(amount), 0) FROM budget_reservations
+               WHERE date(created_at, 'unixepoch') = ?1 AND entry_id IS NOT ?2)
+        """,
+}
+
+RESERVE_BUDGET_SQL = """
+INSERT INTO budget_reservations (entry_id, note_id, amount, created_at) VALUES (?, ?, ?, ?)
+ON CONFLICT(entry_id) DO UPDATE SET
+    note_id = excluded.note_id, amount = excluded.amount, created_at = excluded.created_at
+"""
+
+RELEASE_BUDGET_SQL = "DELETE FROM budget_reservations WHERE entry_id = ?"
+
+DAILY_TOTALS_SQL = f"""
+SELECT day, {TOTALS_COLUMNS} FROM payment_totals_day
+WHERE day >= ? AND day <= ? ORDER BY day
+"""
+
+PENDING_PAYMENTS_SQL = """
+SELECT id, npub, note_id, payment_hash, created_at FROM payments
+WHERE status = 'pending' AND payment_hash IS NOT NULL AND id > ?
+ORDER BY id LIMIT ?
+"""
+
+UPDATE_PAYMENT_STATUS_SQL = """
+UPDATE payments SET status = ? WHERE id = ? AND status = 'pending'
+"""
+
+UPSERT_CAMPAIGN_SQL = """
+INSERT INTO campaigns (note_id, amount, budget, active) VALUES (?, ?, ?, 1)
+ON CONFLICT(note_id) DO UPDATE SET amount = excluded.amount, budget = excluded.budget, active = 1
+"""
+
+DEACTIVATE_CAMPAIGN_SQL = "UPDATE campaigns SET active = 0 WHERE note_id = ? AND active = 1"
+
+ACTIVE_CAMPAIGNS_SQL = "SELECT note_id, amount, budget FROM campaigns WHERE active = 1"
+
+SAVE_CURSOR_SQL = """
+INSERT INTO relay_cursors (relay_url, note_id, created_at) VALUES (?, ?, ?)
+ON CONFLICT(relay_url, note_id) DO UPDATE
+SET created_at = MAX(created_at, excluded.created_at)
+"""
+
+RELAY_CURSORS_SQL = "SELECT relay_url, note_id, created_at FROM relay_cursors"
+
+SAVE_PROFILE_SQL = """
+INSERT INTO profiles (pubkey, lud16, lud06, created_at, fetched_at) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT(pubkey) DO UPDATE SET
+    lud16 = excluded.lud16, lud06 = excluded.lud06,
+    created_at = excluded.created_at, fetched_at = excluded.fetched_at
+"""
+
+# Profiles are read in chunks to stay under SQLite's bound-parameter limit
+PROFILE_CHUNK_SIZE = 500
+
+SAVE_CHECKPOINT_SQL = f"""
+INSERT INTO backfill_checkpoints (path, offset) VALUES (?, ?)
+ON CONFLICT(path) DO UPDATE
+SET offset = excluded.offset, updated_at = {EPOCH_NOW}
+"""
+
+CHECKPOINT_SQL = "SELECT offset FROM backfill_checkpoints WHERE path = ?"
+
+# Payment outbox states: pending -> submitted -> paid | failed. A row stays
+# submitted while its LNbits call is in flight and only pending rows can be
+# claimed, so two workers never call LNbits for the same row. A submitted row
+# whose worker stalled or died is taken over once its lease (the time since
+# updated_at) has run out.
+OUTBOX_PENDING = "pending"
+OUTBOX_SUBMITTED = "submitted"
+OUTBOX_PAID = "paid"
+OUTBOX_FAILED = "failed"
+
+ENQUEUE_OUTBOX_SQL = """
+INSERT INTO payment_outbox (event_id, npub, note_id, amount) VALUES (?, ?, ?, ?)
+ON CONFLICT(event_id) DO NOTHING
+"""
+
+CLAIM_OUTBOX_SQL = f"""
+UPDATE payment_outbox
+SET status = 'submitted', attempts = attempts + 1, updated_at = {EPOCH_NOW}
+WHERE id = ? AND (
+    status = 'pending' OR (status = 'submitted' AND updated_at <= {EPOCH_NOW} - ?)
+)
+"""
+
+OUTBOX_HASH_SQL = f"""
+UPDATE payment_outbox SET payment_hash = ?, updated_at = {EPOCH_NOW}
+WHERE id = ? AND status = 'submitted'
+"""
+
+COMPLETE_OUTBOX_SQL = f"""
+UPDATE payment_outbox
+SET status = 'paid', payment_id = ?, error = NULL, updated_at = {EPOCH_NOW}
+WHERE id = ? AND status = 'submitted'
+"""
+
+# A postponed entry gets its attempt back, as LNbits never saw it
+RELEASE_OUTBOX_SQL = f"""
+UPDATE payment_outbox SET status = ?, error = ?, attempts = attempts - ?, updated_at = {EPOCH_NOW}
+WHERE id = ? AND status = 'submitted'
+"""
+
+UNFINISHED_OUTBOX_SQL = """
+SELECT id, event_id, npub, note_id, amount, status, attempts, error, payment_hash
+FROM payment_outbox WHERE status IN ('pending', 'submitted') ORDER BY id
+"""
+
+# Pending rows postponed while LNbits was down (they keep the error) and due
+# again, plus rows untouched for a whole lease: never-tried pending rows
+# whose queue went away and submitted rows whose worker stalled or died
+STALE_OUTBOX_SQL = f"""
+SELECT id, event_id, npub, note_id, amount, status, attempts, error, payment_hash
+FROM payment_outbox
+WHERE (status = 'pending' AND updated_at <= {EPOCH_NOW} - CASE WHEN error IS NOT NULL THEN ? ELSE ? END)
+   OR (status = 'submitted' AND updated_at <= {EPOCH_NOW} - ?)
+ORDER BY id
+"""
+
+OUTBOX_ENTRY_SQL = """
+SELECT id, event_id, npub, note_id, amount, status, attempts, error, payment_hash
+FROM payment_outbox WHERE id = ?
+"""
+
 @dataclass
 class Payment:
     """Represents a Lightning Network payment made by the bot."""
@@ -15,71 +481,207 @@ class Payment:
     status: str
     created_at: datetime
     note_id: str
+    payment_hash: Optional[str] = None
+
+@dataclass
+class PaymentTotals:
+    """Payment counts and amounts for a note, user or day."""
+    payments: int = 0
+    amount: int = 0
+    paid_payments: int = 0
+    paid_amount: int = 0
+
+@dataclass
+class Campaign:
+    """Represents a note watched for reposts."""
+    note_id: str
+    amount: Optional[int] = None  # Overrides the configured payment amount
+    budget: Optional[int] = None  # Total satoshis the campaign may pay out
+
+@dataclass
+class Profile:
+    """Represents the lightning addresses from a user's kind-0 metadata."""
+    pubkey: str
+    lud16: Optional[str] = None  # Lightning address (name@domain)
+    lud06: Optional[str] = None  # Bech32 LNURL
+    created_at: int = 0  # Time of the metadata event, 0 if none was found
+    fetched_at: int = 0  # When relays were last asked
+
+    @property
+    def has_address(self) -> bool:
+        """Whether the profile names somewhere to send zaps."""
+        return bool(self.lud16 or self.lud06)
+
+@dataclass
+class OutboxEntry:
+    """Represents a repost queued for payment in the outbox."""
+    id: Optional[int]
+    event_id: str  # The repost event, which is paid at most once
+    npub: str
+    note_id: str
+    amount: Optional[int] = None
+    status: str = OUTBOX_PENDING
+    attempts: int = 0
+    error: Optional[str] = None
+    payment_hash: Optional[str] = None  # Set once an LNbits call is known to be made
 
 class Database:
-    """Handles database operations for payment tracking."""
+    """Handles database operations for payment tracking.
     
-    def __init__(self, db_path: str = "payments.db"):
+    Connections are opened once per thread and reused for the lifetime of
+    the Database, so callers running in worker threads each get their own
+    connection without paying for a connect and schema check per call.
+    """
+    
+    def __init__(self, db_path: str = "payments.db", read_only: bool = False):
         """Initialize database connection and create tables if they don't exist.
         
         Args:
             db_path: Path to the SQLite database file
+            read_only: Open read-only connections to a database another
+                Database maintains; with WAL, readers never block its writes
         """
         self.db_path = db_path
+        self.read_only = read_only
         self.connection = None  # For persistent connections in tests
-        conn = sqlite3.connect(self.db_path)
-        self._create_tables(conn)
-        conn.close()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: List[sqlite3.Connection] = []
+        
+        if db_path == ":memory:":
+            # Every connection to :memory: is a separate database, so share one
+            self.connection = self._open()
+        
+        if not read_only:
+            self._create_tables(self._get_connection())
+    
+    def _open(self) -> sqlite3.Connection:
+        """Open a new connection with the standard pragmas applied.
+        
+        Returns:
+            Configured SQLite connection
+        """
+        if self.read_only:
+            conn = sqlite3.connect(
+                f"{Path(self.db_path).resolve().as_uri()}?mode=ro",
+                uri=True,
+                check_same_thread=False,
+                cached_statements=STATEMENT_CACHE_SIZE
+            )
+        else:
+            conn = sqlite3.connect(
+                self.db_path,
+                check_same_thread=False,  # Closed from the owning Database
+                cached_statements=STATEMENT_CACHE_SIZE
+            )
+        for pragma in READ_ONLY_PRAGMAS if self.read_only else PRAGMAS:
+            conn.execute(pragma)
+        
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+    
+    def _get_connection(self) -> sqlite3.Connection:
+        """Return the calling thread's connection, opening it on first use.
+        
+        Returns:
+            SQLite connection for the current thread
+        """
+        if self.connection is not None:
+            return self.connection
+        
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+        return conn
+    
+    def close(self) -> None:
+        """Close every connection opened by this Database.
+        
+        A shared instance is also dropped from the get_database() registry,
+        so the next caller for the path gets a fresh, open Database.
+        """
+        with _databases_lock:
+            if _databases.get(self.db_path) is self:
+                del _databases[self.db_path]
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+        self.connection = None
     
     def _create_tables(self, conn: sqlite3.Connection):
-        """Create necessary database tables if they don't exist.
+        """Create or upgrade database tables to the current schema version.
         
         Args:
             conn: SQLite database connection
         """
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS payments (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            npub TEXT NOT NULL,
-            amount INTEGER NOT NULL,
-            bolt11 TEXT NOT NULL,
-            status TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            note_id TEXT NOT NULL
-        )
-        """)
-        
-        conn.commit()
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+            return
+            
+        # Take the write lock first so concurrent processes migrate only once
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for index in range(version, SCHEMA_VERSION):
+                for statement in MIGRATIONS[index]:
+                    conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
     
     def add_payment(self, payment: Payment) -> int:
         """Add a new payment record to the database.
         
         Args:
             payment: Payment object containing payment details
-            
+        
         Returns:
             The ID of the inserted payment record
         """
-        conn = self.connection or sqlite3.connect(self.db_path)
-        try:
-            cursor = conn.cursor()
-            if not self.connection:
-                self._create_tables(conn)  # Ensure tables exist
+        conn = self._get_connection()
+        created_at = int(payment.created_at.timestamp()) if payment.created_at else int(time.time())
+        with conn:
+            cursor = conn.execute(INSERT_PAYMENT_SQL, (
+                payment.npub, payment.amount, payment.bolt11,
+                payment.status, payment.note_id, created_at, payment.payment_hash
+            ))
+        return cursor.lastrowid
+    
+    def get_pending_payments(self, after_id: int = 0, limit: int = 200) -> list[tuple[int, str, str, str, int]]:
+        """Get a page of pending payments that can be looked up in LNbits.
+        
+        Pages are keyed on the payment ID, so each page costs the same no
+        matter how far into the table it starts.
+        
+        Args:
+            after_id: Only return payments with a greater ID
+            limit: Maximum number of payments to return
             
-            created_at = payment.created_at or datetime.now()
-            cursor.execute("""
-            INSERT INTO payments (npub, amount, bolt11, status, note_id, created_at)
-            VALUES (?, ?, ?, ?, ?, ?)
-            """, (payment.npub, payment.amount, payment.bolt11, payment.status, payment.note_id, created_at))
+        Returns:
+            List of (id, npub, note_id, payment_hash, created_at) tuples in ID order
+        """
+        return self._get_connection().execute(PENDING_PAYMENTS_SQL, (after_id, limit)).fetchall()
+    
+    def update_payment_statuses(self, updates: list[tuple[str, int]]) -> int:
+        """Move pending payments to a new status in one transaction.
+        
+        Payments that are no longer pending are left unchanged.
+        
+        Args:
+            updates: (new status, payment ID) tuples
             
-            payment_id = cursor.lastrowid
-            conn.commit()
-            return payment_id
-        finally:
-            if not self.connection:
-                conn.close()
+        Returns:
+            Number of payments updated
+        """
+        conn = self._get_connection()
+        with conn:
+            cursor = conn.executemany(UPDATE_PAYMENT_STATUS_SQL, updates)
+        return cursor.rowcount
     
     def has_recent_payment(self, npub: str, note_id: str, hours: int = 24) -> bool:
         """Check if a user has received a payment for a specific note in the recent past.
@@ -88,69 +690,496 @@ class Database:
             npub: The user's public key
             note_id: The ID of the note being reposted
             hours: Number of hours to look back (default: 24)
-            
+        
         Returns:
             True if a recent payment exists, False otherwise
         """
-        conn = self.connection or sqlite3.connect(self.db_path)
-        try:
-            cursor = conn.cursor()
-            if not self.connection:
-                self._create_tables(conn)  # Ensure tables exist
+        cutoff = int(time.time()) - hours * 3600
+        cursor = self._get_connection().execute(RECENT_PAYMENT_SQL, (npub, note_id, cutoff))
+        return bool(cursor.fetchone()[0])
+    
+    def latest_paid_at(self, npub: str, note_id: str, since: int) -> Optional[int]:
+        """Get the time of a user's most recent paid payment for a note.
+        
+        Args:
+            npub: The user's public key
+            note_id: The ID of the note being reposted
+            since: Only consider payments at or after this Unix timestamp
             
-            cursor.execute("""
-            SELECT COUNT(*) FROM payments 
-            WHERE npub = ? AND note_id = ? 
-            AND created_at >= datetime('now', '-' || ? || ' hours')
-            AND status = 'paid'
-            """, (npub, note_id, hours))
+        Returns:
+            Unix timestamp of the latest paid payment, or None if there is none
+        """
+        cursor = self._get_connection().execute(LATEST_PAID_SQL, (npub, note_id, since))
+        return cursor.fetchone()[0]
+    
+    def get_recent_paid(self, since: int) -> list[tuple[str, str, int]]:
+        """Get the latest paid payment time per user and note.
+        
+        Args:
+            since: Only consider payments at or after this Unix timestamp
             
-            count = cursor.fetchone()[0]
-            return count > 0
-        finally:
-            if not self.connection:
-                conn.close()
+        Returns:
+            List of (npub, note_id, latest created_at) tuples
+        """
+        return self._get_connection().execute(RECENT_PAID_SQL, (since,)).fetchall()
     
     def get_payment_history(self, npub: Optional[str] = None) -> list[Payment]:
         """Get payment history, optionally filtered by user.
         
         Args:
             npub: Optional public key to filter payments by user
-            
+        
         Returns:
             List of Payment objects representing the payment history
         """
-        conn = self.connection or sqlite3.connect(self.db_path)
-        try:
-            cursor = conn.cursor()
-            if not self.connection:
-                self._create_tables(conn)  # Ensure tables exist
-            
-            if npub:
-                cursor.execute("""
-                SELECT id, npub, amount, bolt11, status, created_at, note_id 
-                FROM payments WHERE npub = ? ORDER BY created_at DESC
-                """, (npub,))
-            else:
-                cursor.execute("""
-                SELECT id, npub, amount, bolt11, status, created_at, note_id 
-                FROM payments ORDER BY created_at DESC
-                """)
-                
-            rows = cursor.fetchall()
-            
-            return [
-                Payment(
+        return list(self.iter_payments(npub=npub))
+    
+    def iter_payments(
+        self,
+        npub: Optional[str] = None,
+        note_id: Optional[str] = None,
+        status: Optional[str] = None,
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+        newest_first: bool = True,
+        page_size: int = 500
+    ) -> Iterator[Payment]:
+        """Iterate over payments in creation order, one page at a time.
+        
+        Pages continue from the last (created_at, id) seen rather than an
+        offset, so every page costs the same and memory use does not grow
+        with the table. No read transaction is held between pages.
+        
+        Args:
+            npub: Only payments to this user
+            note_id: Only payments for this note
+            status: Only payments with this status
+            since: Only payments created at or after this Unix timestamp
+            until: Only payments created before this Unix timestamp
+            newest_first: Order from newest to oldest (default) or the reverse
+            page_size: Payments read per query
+        
+        Yields:
+            Payment objects
+        """
+        conditions = []
+        params: list = []
+        for column, value in (("npub", npub), ("note_id", note_id), ("status", status)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            conditions.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("created_at < ?")
+            params.append(until)
+        
+        order = "DESC" if newest_first else "ASC"
+        after = "(created_at, id) < (?, ?)" if newest_first else "(created_at, id) > (?, ?)"
+        first_sql = self._history_sql(conditions, order)
+        next_sql = self._history_sql(conditions + [after], order)
+        
+        conn = self._get_connection()
+        rows = conn.execute(first_sql, params + [page_size]).fetchall()
+        while True:
+            for row in rows:
+                yield Payment(
                     id=row[0],
                     npub=row[1],
                     amount=row[2],
                     bolt11=row[3],
                     status=row[4],
-                    created_at=datetime.fromisoformat(row[5]),
-                    note_id=row[6]
+                    created_at=datetime.fromtimestamp(row[5]),
+                    note_id=row[6],
+                    payment_hash=row[7]
                 )
-                for row in rows
-            ]
-        finally:
-            if not self.connection:
-                conn.close()
\ No newline at end of file
+            if len(rows) < page_size:
+                return
+            last = rows[-1]
+            rows = conn.execute(next_sql, params + [last[5], last[0], page_size]).fetchall()
+    
+    @staticmethod
+    def _history_sql(conditions: list[str], order: str) -> str:
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        return (
+            f"SELECT {PAYMENT_COLUMNS} FROM payments {where}"
+            f"ORDER BY created_at {order}, id {order} LIMIT ?"
+        )
+    
+    def get_note_totals(self, note_id: str) -> PaymentTotals:
+        """Get payment totals for a note.
+        
+        Args:
+            note_id: The ID of the note
+            
+        Returns:
+            PaymentTotals (all zero if the note has no payments)
+        """
+        row = self._get_connection().execute(NOTE_TOTALS_SQL, (note_id,)).fetchone()
+        return PaymentTotals(*row) if row else PaymentTotals()
+    
+    def get_user_totals(self, npub: str) -> PaymentTotals:
+        """Get payment totals for a user.
+        
+        Args:
+            npub: The user's public key
+            
+        Returns:
+            PaymentTotals (all zero if the user has no payments)
+        """
+        row = self._get_connection().execute(USER_TOTALS_SQL, (npub,)).fetchone()
+        return PaymentTotals(*row) if row else PaymentTotals()
+    
+    def get_daily_totals(self, first_day: str = "0000-00-00", last_day: str = "9999-12-31") -> list[tuple[str, PaymentTotals]]:
+        """Get payment totals per UTC day.
+        
+        Args:
+            first_day: First day to include, as YYYY-MM-DD
+            last_day: Last day to include, as YYYY-MM-DD
+            
+        Returns:
+            List of (day, PaymentTotals) tuples for days with payments, in order
+        """
+        rows = self._get_connection().execute(DAILY_TOTALS_SQL, (first_day, last_day)).fetchall()
+        return [(row[0], PaymentTotals(*row[1:])) for row in rows]
+
+    def reserve_budget(
+        self,
+        entry_id: int,
+        note_id: str,
+        amount: int,
+        limits: list[tuple[str, str, int]],
+        now: int
+    ) -> bool:
+        """Reserve spend for an outbox entry if every limit allows it.
+
+        The check and the insert run under the database write lock, so
+        processes sharing the database never reserve past a limit together.
+
+        Args:
+            entry_id: ID of the outbox entry; an earlier reservation for it
+                is replaced rather than counted
+            note_id: The note the payment is for
+            amount: Amount to reserve in satoshis
+            limits: (kind, key, limit) tuples, kind being "note" (key is the
+                note ID), "hour" (key is the hour's start as a Unix
+                timestamp) or "day" (key is the UTC day as YYYY-MM-DD)
+            now: Unix timestamp the reservation is counted at
+
+        Returns:
+            True if the amount was reserved, False if a limit would be exceeded
+        """
+        conn = self._get_connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for kind, key, limit in limits:
+                if kind == "hour":
+                    key = int(key)
+                spent = conn.execute(BUDGET_SPENT_SQL[kind], (key, entry_id)).fetchone()[0]
+                if spent + amount > limit:
+                    conn.rollback()
+                    return False
+            conn.execute(RESERVE_BUDGET_SQL, (entry_id, note_id, amount, now))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return True
+
+    def release_budget(self, entry_id: int) -> None:
+        """Drop the budget reservation of an outbox entry, if any.
+
+        Args:
+            entry_id: ID of the outbox entry
+        """
+        conn = self._get_connection()
+        with conn:
+            conn.execute(RELEASE_BUDGET_SQL, (entry_id,))
+
+    def get_budget_spent(self, kind: str, key: str) -> int:
+        """Get the spend counted against a limit, reservations included.
+
+        Args:
+            kind: "note", "hour" or "day", as for reserve_budget()
+            key: The note ID, hour start or UTC day
+
+        Returns:
+            Satoshis paid, pending or reserved; failed and expired
+            payments are left out
+        """
+        if kind == "hour":
+            key = int(key)
+        return self._get_connection().execute(BUDGET_SPENT_SQL[kind], (key, None)).fetchone()[0]
+
+    def add_campaign(self, campaign: Campaign) -> None:
+        """Add a campaign, or reactivate and update an existing one.
+        
+        Args:
+            campaign: Campaign object describing the note to watch
+        """
+        conn = self._get_connection()
+        with conn:
+            conn.execute(UPSERT_CAMPAIGN_SQL, (campaign.note_id, campaign.amount, campaign.budget))
+    
+    def deactivate_campaign(self, note_id: str) -> bool:
+        """Stop watching a note.
+        
+        Args:
+            note_id: The ID of the campaign's note
+        
+        Returns:
+            True if an active campaign was deactivated, False otherwise
+        """
+        conn = self._get_connection()
+        with conn:
+            cursor = conn.execute(DEACTIVATE_CAMPAIGN_SQL, (note_id,))
+        return cursor.rowcount > 0
+    
+    def get_active_campaigns(self) -> list[Campaign]:
+        """Get all campaigns that should currently be watched.
+        
+        Returns:
+            List of active Campaign objects
+        """
+        cursor = self._get_connection().execute(ACTIVE_CAMPAIGNS_SQL)
+        return [Campaign(note_id=row[0], amount=row[1], budget=row[2]) for row in cursor.fetchall()]
+
+    def enqueue_outbox_entry(self, entry: OutboxEntry) -> Optional[OutboxEntry]:
+        """Add a repost to the payment outbox unless it is already there.
+        
+        Args:
+            entry: OutboxEntry describing the repost to pay
+        
+        Returns:
+            The stored OutboxEntry, or None if the event was already queued
+        """
+        conn = self._get_connection()
+        with conn:
+            cursor = conn.execute(ENQUEUE_OUTBOX_SQL, (
+                entry.event_id, entry.npub, entry.note_id, entry.amount
+            ))
+        if cursor.rowcount == 0:
+            return None
+        return OutboxEntry(
+            id=cursor.lastrowid,
+            event_id=entry.event_id,
+            npub=entry.npub,
+            note_id=entry.note_id,
+            amount=entry.amount
+        )
+    
+    def claim_outbox_entry(self, entry_id: int, lease_seconds: int = 900) -> Optional[OutboxEntry]:
+        """Mark an outbox entry as submitted before calling LNbits.
+        
+        Pending entries can always be claimed. A submitted entry can only be
+        claimed once it has not been touched for lease_seconds, meaning the
+        worker driving it stalled or died; its payment_hash, if set, must be
+        looked up in LNbits before LNbits is called again.
+        
+        Args:
+            entry_id: ID of the outbox entry
+            lease_seconds: How long a submitted entry belongs to its worker
+        
+        Returns:
+            The claimed OutboxEntry, or None if it is finished or in flight
+        """
+        conn = self._get_connection()
+        with conn:
+            cursor = conn.execute(CLAIM_OUTBOX_SQL, (entry_id, lease_seconds))
+            if cursor.rowcount == 0:
+                return None
+            row = conn.execute(OUTBOX_ENTRY_SQL, (entry_id,)).fetchone()
+        return OutboxEntry(*row)
+    
+    def set_outbox_payment_hash(self, entry_id: int, payment_hash: str) -> bool:
+        """Remember the LNbits payment hash of a submitted outbox entry.
+        
+        This also renews the entry's lease.
+        
+        Args:
+            entry_id: ID of the submitted outbox entry
+            payment_hash: Hash of the invoice created or about to be paid
+        
+        Returns:
+            True if the entry is still submitted
+        """
+        conn = self._get_connection()
+        with conn:
+            cursor = conn.execute(OUTBOX_HASH_SQL, (payment_hash, entry_id))
+        return cursor.rowcount > 0
+    
+    def complete_outbox_entry(self, entry_id: int, payment: Payment) -> int:
+        """Record the payment for an outbox entry and mark it paid.
+        
+        Both writes happen in one transaction, so a payment row exists
+        exactly when its outbox entry is paid. The entry's budget
+        reservation is dropped in the same transaction, now that the
+        payment counts as spend.
+        
+        Args:
+            entry_id: ID of the submitted outbox entry
+            payment: Payment to record
+        
+        Returns:
+            The ID of the inserted payment record
+        """
+        conn = self._get_connection()
+        with conn:
+            cursor = conn.execute(INSERT_PAYMENT_SQL, (
+                payment.npub, payment.amount, payment.bolt11, payment.status,
+                payment.note_id, int(payment.created_at.timestamp()), payment.payment_hash
+            ))
+            payment_id = cursor.lastrowid
+            if conn.execute(COMPLETE_OUTBOX_SQL, (payment_id, entry_id)).rowcount == 0:
+                raise sqlite3.IntegrityError(f"Outbox entry {entry_id} is not submitted")
+            conn.execute(RELEASE_BUDGET_SQL, (entry_id,))
+        return payment_id
+    
+    def release_outbox_entry(self, entry_id: int, error: str, retry: bool = False) -> None:
+        """Finish a submitted outbox entry without a payment.
+        
+        Any budget reservation held for the entry is dropped with it.
+        
+        Args:
+            entry_id: ID of the submitted outbox entry
+            error: Why no payment was made
+            retry: Return the entry to pending instead of failing it; the
+                attempt is not counted
+        """
+        status = OUTBOX_PENDING if retry else OUTBOX_FAILED
+        conn = self._get_connection()
+        with conn:
+            if conn.execute(RELEASE_OUTBOX_SQL, (status, error, int(retry), entry_id)).rowcount:
+                conn.execute(RELEASE_BUDGET_SQL, (entry_id,))
+    
+    def get_outbox_entry(self, entry_id: int) -> Optional[OutboxEntry]:
+        """Get an outbox entry by ID.
+        
+        Args:
+            entry_id: ID of the outbox entry
+        
+        Returns:
+            The OutboxEntry, or None if it does not exist
+        """
+        row = self._get_connection().execute(OUTBOX_ENTRY_SQL, (entry_id,)).fetchone()
+        return OutboxEntry(*row) if row else None
+    
+    def get_unfinished_outbox_entries(self) -> list[OutboxEntry]:
+        """Get outbox entries that are pending or were interrupted.
+        
+        Returns:
+            List of OutboxEntry objects in the order they were queued
+        """
+        cursor = self._get_connection().execute(UNFINISHED_OUTBOX_SQL)
+        return [OutboxEntry(*row) for row in cursor.fetchall()]
+    
+    def get_stale_outbox_entries(self, retry_seconds: float, lease_seconds: int) -> list[OutboxEntry]:
+        """Get outbox entries that no worker is driving any more.
+        
+        Args:
+            retry_seconds: Age after which a pending entry that was already
+                tried (and postponed) is due again
+            lease_seconds: Age after which any other unfinished entry is
+                considered abandoned
+        
+        Returns:
+            List of OutboxEntry objects in the order they were queued
+        """
+        cursor = self._get_connection().execute(
+            STALE_OUTBOX_SQL, (retry_seconds, lease_seconds, lease_seconds)
+        )
+        return [OutboxEntry(*row) for row in cursor.fetchall()]
+
+    def save_relay_cursors(self, cursors: list[tuple[str, str, int]]) -> None:
+        """Store relay cursors, keeping the newer time on conflict.
+        
+        Args:
+            cursors: (relay URL, note ID, created_at) tuples
+        """
+        conn = self._get_connection()
+        with conn:
+            conn.executemany(SAVE_CURSOR_SQL, cursors)
+    
+    def get_relay_cursors(self) -> list[tuple[str, str, int]]:
+        """Get all stored relay cursors.
+        
+        Returns:
+            List of (relay URL, note ID, created_at) tuples
+        """
+        return self._get_connection().execute(RELAY_CURSORS_SQL).fetchall()
+    
+    def save_profiles(self, profiles: list[Profile]) -> None:
+        """Store resolved profiles, replacing earlier lookups.
+        
+        Args:
+            profiles: Profiles to store, including ones without an address
+        """
+        conn = self._get_connection()
+        with conn:
+            conn.executemany(SAVE_PROFILE_SQL, [
+                (p.pubkey, p.lud16, p.lud06, p.created_at, p.fetched_at) for p in profiles
+            ])
+    
+    def get_profiles(self, pubkeys: list[str]) -> list[Profile]:
+        """Get stored profiles.
+        
+        Args:
+            pubkeys: Public keys to look up
+            
+        Returns:
+            Stored profiles for the pubkeys that have one
+        """
+        conn = self._get_connection()
+        profiles = []
+        for start in range(0, len(pubkeys), PROFILE_CHUNK_SIZE):
+            chunk = pubkeys[start:start + PROFILE_CHUNK_SIZE]
+            rows = conn.execute(
+                "SELECT pubkey, lud16, lud06, created_at, fetched_at FROM profiles "
+                f"WHERE pubkey IN ({','.join('?' * len(chunk))})",
+                chunk
+            ).fetchall()
+            profiles.extend(Profile(*row) for row in rows)
+        return profiles
+    
+    def save_backfill_checkpoint(self, path: str, offset: int) -> None:
+        """Record how far a backfill input file has been processed.
+        
+        Args:
+            path: Absolute path of the input file
+            offset: Byte offset up to which every event was handled
+        """
+        conn = self._get_connection()
+        with conn:
+            conn.execute(SAVE_CHECKPOINT_SQL, (path, offset))
+    
+    def get_backfill_checkpoint(self, path: str) -> int:
+        """Get the byte offset a backfill of a file should resume from.
+        
+        Args:
+            path: Absolute path of the input file
+            
+        Returns:
+            Saved offset, or 0 if the file was never processed
+        """
+        row = self._get_connection().execute(CHECKPOINT_SQL, (path,)).fetchone()
+        return row[0] if row else 0
+
+# Shared Database instances, one per path
+_databases: Dict[str, Database] = {}
+_databases_lock = threading.Lock()
+
+def get_database(db_path: str) -> Database:
+    """Return the process-wide Database for a path, creating it on first use.
+    
+    Args:
+        db_path: Path to the SQLite database file
+    
+    Returns:
+        Shared Database instance
+    """
+    with _databases_lock:
+        db = _databases.get(db_path)
+        if db is None:
+            db = _databases[db_path] = Database(db_path)
+        return db
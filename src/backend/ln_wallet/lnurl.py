@@ -0,0 +1,525 @@
+"""LNURL-pay resolution for AutoZap.
+
+Paying a lightning address (LUD-16) or LNURL (LUD-06) takes two requests
+to the recipient's wallet provider: one for the pay parameters, then one to
+the callback for an invoice. The pay parameters rarely change, so this
+module caches them and a payment only makes the callback request before
+LNbits pays the invoice. Requests share keep-alive connections, each
+provider domain gets a limited number of concurrent requests, and failures
+are remembered with an exponential backoff so dead providers are not asked
+again on every payment.
+
+Addresses and pay parameters come from untrusted profiles, so only https
+URLs on the default port of public hosts are requested, the callback must
+be on the host that sent the pay parameters, redirects are not followed
+and responses are size-capped.
+"""
+
+import ipaddress
+import json
+import logging
+import re
+import socket
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from nostr.bech32 import CHARSET, bech32_verify_checksum, convertbits
+from backend.config import get_config
+from backend.ln_wallet.wallet import FAILED_STATES, LNbitsClient, PaymentError, PaymentResult
+
+logger = logging.getLogger(__name__)
+
+# Shared resolver, created on first use
+_resolver: Optional["LNURLResolver"] = None
+_resolver_lock = threading.Lock()
+
+# Bounds for how long pay parameters are cached, whatever the provider says
+MIN_CACHE_SECONDS = 60
+MAX_CACHE_SECONDS = 86400
+
+# Backoff after failed requests, doubling per consecutive failure
+FAILURE_BACKOFF_BASE = 30.0
+FAILURE_BACKOFF_MAX = 3600.0
+
+# Largest provider response read, in bytes
+MAX_RESPONSE_BYTES = 64 * 1024
+
+# Amount in a BOLT11 human-readable part: digits and an optional multiplier
+INVOICE_AMOUNT = re.compile(r"^ln(?:bc|tbs|tb|bcrt|sb)(\d+)([munp]?)1[02-9ac-hj-np-z]+$")
+MSAT_PER_UNIT = {"": 100_000_000_000, "m": 100_000_000, "u": 100_000, "n": 100, "p": 0.1}
+
+class LNURLError(Exception):
+    """Raised when a recipient's wallet provider cannot be paid."""
+    pass
+
+class LNURLUnavailable(LNURLError):
+    """Raised while an address or provider is backing off after failures."""
+
+    def __init__(self, key: str, retry_after: float, error: str):
+        super().__init__(f"{key} unavailable ({error}), retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+@dataclass(frozen=True)
+class PayParams:
+    """Pay parameters from a LUD-06 payRequest response."""
+
+    callback: str
+    min_sendable: int  # Millisatoshis
+    max_sendable: int  # Millisatoshis
+    metadata: str
+    comment_allowed: int = 0
+    expires_at: float = 0.0  # Monotonic time the parameters are refetched
+
+    def accepts(self, amount_msat: int) -> bool:
+        """Check that the provider takes payments of this size."""
+        return self.min_sendable <= amount_msat <= self.max_sendable
+
+@dataclass
+class _Failure:
+    """Consecutive failures of an address or domain."""
+
+    count: int
+    retry_at: float
+    error: str
+
+def decode_lnurl(lnurl: str) -> str:
+    """Decode a bech32 LNURL to its URL.
+
+    LNURLs are longer than the 90 characters bech32 addresses are limited
+    to, so the reference decoder cannot be used.
+
+    Args:
+        lnurl: The LNURL, optionally prefixed with lightning:
+
+    Returns:
+        The URL it encodes
+
+    Raises:
+        LNURLError: If it is not a valid LNURL
+    """
+    lnurl = lnurl.strip().lower()
+    if lnurl.startswith("lightning:"):
+        lnurl = lnurl[len("lightning:"):]
+    hrp, _, encoded = lnurl.rpartition("1")
+    data = [CHARSET.find(char) for char in encoded]
+    if hrp != "lnurl" or len(data) < 6 or -1 in data or bech32_verify_checksum(hrp, data) is None:
+        raise LNURLError("Invalid LNURL")
+    decoded = convertbits(data[:-6], 5, 8, False)
+    if decoded is None:
+        raise LNURLError("Invalid LNURL")
+    return bytes(decoded).decode()
+
+def check_provider_url(url: str, allow_local: bool = False) -> None:
+    """Check that a provider URL is safe to request.
+
+    Args:
+        url: URL from a lightning address, LNURL or pay parameters
+        allow_local: Also allow http, IP literals, local hosts and other
+            ports (for tests against a local provider)
+
+    Raises:
+        LNURLError: If the URL must not be requested
+    """
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError as e:
+        raise LNURLError(f"Invalid provider URL {url!r}") from e
+    host = parts.hostname or ""
+    if allow_local:
+        if parts.scheme not in ("http", "https") or not host:
+            raise LNURLError(f"Invalid provider URL {url!r}")
+        return
+    if parts.scheme != "https" or not host or parts.username is not None:
+        raise LNURLError(f"Provider URL must be https: {url!r}")
+    if port not in (None, 443):
+        raise LNURLError(f"Provider URL must use the default port: {url!r}")
+    try:
+        ipaddress.ip_address(host)
+    except ValueError:
+        pass
+    else:
+        raise LNURLError(f"Provider URL must name a host, not an address: {url!r}")
+    if "." not in host.strip(".") or host.endswith((".localhost", ".local", ".internal")):
+        raise LNURLError(f"Provider URL must name a public host: {url!r}")
+
+def _check_public_address(host: str) -> None:
+    """Check that a host only resolves to public addresses.
+
+    Raises:
+        LNURLError: If it resolves to a private, loopback or link-local address
+        OSError: If it cannot be resolved
+    """
+    for *_, sockaddr in socket.getaddrinfo(host, 443, proto=socket.IPPROTO_TCP):
+        address = ipaddress.ip_address(sockaddr[0].split("%")[0])
+        if not address.is_global:
+            raise LNURLError(f"{host} resolves to non-public address {address}")
+
+def pay_url(address: str, scheme: str = "https") -> str:
+    """Return the URL of the pay parameters for a lightning address or LNURL.
+
+    Args:
+        address: A lightning address (name@domain) or bech32 LNURL
+        scheme: URL scheme for lightning addresses
+
+    Returns:
+        URL to fetch the payRequest from
+
+    Raises:
+        LNURLError: If the address is malformed
+    """
+    if "@" in address:
+        name, _, domain = address.strip().rpartition("@")
+        if not name or not domain or "/" in domain:
+            raise LNURLError(f"Invalid lightning address {address!r}")
+        return f"{scheme}://{domain.lower()}/.well-known/lnurlp/{name.lower()}"
+    return decode_lnurl(address)
+
+def invoice_msat(bolt11: str) -> Optional[int]:
+    """Read the amount from a BOLT11 invoice's human-readable part.
+
+    Args:
+        bolt11: The invoice
+
+    Returns:
+        Amount in millisatoshis, or None if the invoice has no amount or
+        cannot be parsed
+    """
+    match = INVOICE_AMOUNT.match(bolt11.strip().lower())
+    if not match:
+        return None
+    return int(int(match.group(1)) * MSAT_PER_UNIT[match.group(2)])
+
+def invoice_payment_hash(bolt11: str) -> Optional[str]:
+    """Read the payment hash from a BOLT11 invoice's tagged fields.
+
+    Invoices are longer than the 90 characters bech32 addresses are
+    limited to, so the reference decoder cannot be used.
+
+    Args:
+        bolt11: The invoice
+
+    Returns:
+        The payment hash as hex, or None if the invoice cannot be parsed
+    """
+    hrp, _, encoded = bolt11.strip().lower().rpartition("1")
+    data = [CHARSET.find(char) for char in encoded]
+    # Timestamp (7 groups), tagged fields, signature (104) and checksum (6)
+    if not hrp.startswith("ln") or len(data) < 117 or -1 in data or bech32_verify_checksum(hrp, data) is None:
+        return None
+    fields = data[7:-110]
+    while len(fields) >= 3:
+        tag, length = fields[0], fields[1] * 32 + fields[2]
+        if tag == 1 and length == 52:
+            decoded = convertbits(fields[3:55], 5, 8, False)
+            return bytes(decoded).hex() if decoded is not None else None
+        fields = fields[3 + length:]
+    return None
+
+class LNURLResolver:
+    """Fetches and caches LNURL-pay parameters and requests invoices."""
+
+    def __init__(
+        self,
+        timeout: float = 5.0,
+        cache_seconds: float = 3600,
+        domain_concurrency: int = 4,
+        pool_domains: int = 64,
+        allow_local: bool = False,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """Initialize the resolver.
+
+        Args:
+            timeout: Per-request timeout in seconds
+            cache_seconds: How long pay parameters are cached when the
+                provider sends no Cache-Control max-age
+            domain_concurrency: Requests in flight to one domain at a time
+            pool_domains: Domains whose keep-alive connections are kept open
+            allow_local: Request lightning addresses over http and allow
+                local hosts and ports (for tests against a local provider)
+            clock: Monotonic time source
+        """
+        if domain_concurrency < 1:
+            raise ValueError("domain_concurrency must be at least 1")
+
+        self.timeout = timeout
+        self.cache_seconds = cache_seconds
+        self.domain_concurrency = domain_concurrency
+        self.allow_local = allow_local
+        self.scheme = "http" if allow_local else "https"
+        self.clock = clock
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_domains, pool_maxsize=domain_concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.requests = 0
+        self.hits = 0
+        self.failures = 0
+        self._params: Dict[str, PayParams] = {}
+        self._failures: Dict[str, _Failure] = {}
+        self._domains: Dict[str, threading.BoundedSemaphore] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _check_backoff(self, *keys: str) -> None:
+        now = self.clock()
+        with self._lock:
+            for key in keys:
+                failure = self._failures.get(key)
+                if failure is not None and failure.retry_at > now:
+                    raise LNURLUnavailable(key, failure.retry_at - now, failure.error)
+
+    def _record_failure(self, key: str, error: str) -> None:
+        with self._lock:
+            self.failures += 1
+            failure = self._failures.get(key)
+            count = failure.count + 1 if failure else 1
+            delay = min(FAILURE_BACKOFF_MAX, FAILURE_BACKOFF_BASE * 2 ** (count - 1))
+            self._failures[key] = _Failure(count, self.clock() + delay, error)
+        logger.warning(f"LNURL request to {key} failed ({error}); backing off {delay:.0f}s")
+
+    def _get(self, url: str, address: str, **params: Any) -> Tuple[Dict[str, Any], requests.Response]:
+        """Send a GET to a provider, recording failures against it.
+
+        Transport errors, server errors and oversized responses are held
+        against the whole domain; anything else only against the address.
+        """
+        check_provider_url(url, self.allow_local)
+        parts = urlsplit(url)
+        domain = parts.netloc
+        with self._lock:
+            semaphore = self._domains.setdefault(domain, threading.BoundedSemaphore(self.domain_concurrency))
+            self.requests += 1
+
+        with semaphore:
+            try:
+                if not self.allow_local:
+                    _check_public_address(parts.hostname)
+                response = self.session.get(
+                    url, params=params or None, timeout=self.timeout, allow_redirects=False, stream=True
+                )
+                body = bytearray()
+                with response:
+                    for chunk in response.iter_content(8192):
+                        body += chunk
+                        if len(body) > MAX_RESPONSE_BYTES:
+                            break
+            except (requests.exceptions.RequestException, OSError) as e:
+                self._record_failure(domain, str(e))
+                raise LNURLError(f"Failed to reach {domain}: {str(e)}") from e
+
+        if len(body) > MAX_RESPONSE_BYTES:
+            self._record_failure(domain, "response too large")
+            raise LNURLError(f"{domain} sent more than {MAX_RESPONSE_BYTES} bytes")
+
+        if response.status_code >= 500 or response.status_code == 429:
+            self._record_failure(domain, f"HTTP {response.status_code}")
+            raise LNURLError(f"{domain} answered HTTP {response.status_code}")
+        try:
+            response.raise_for_status()
+            data = json.loads(body)
+        except ValueError:
+            data = None
+        except requests.exceptions.RequestException as e:
+            self._record_failure(address, str(e))
+            raise LNURLError(f"{address}: {str(e)}") from e
+        if not isinstance(data, dict):
+            self._record_failure(address, "invalid response")
+            raise LNURLError(f"{address}: invalid response")
+        if str(data.get("status", "")).upper() == "ERROR":
+            reason = str(data.get("reason", "unknown error"))
+            self._record_failure(address, reason)
+            raise LNURLError(f"{address}: {reason}")
+        return data, response
+
+    def _cache_seconds(self, response: requests.Response) -> float:
+        match = re.search(r"max-age=(\d+)", response.headers.get("Cache-Control", ""))
+        seconds = int(match.group(1)) if match else self.cache_seconds
+        return max(MIN_CACHE_SECONDS, min(seconds, MAX_CACHE_SECONDS))
+
+    def pay_params(self, address: str) -> PayParams:
+        """Return the pay parameters for an address, fetching them if needed.
+
+        Concurrent lookups of the same address wait for a single request.
+
+        Args:
+            address: A lightning address or LNURL
+
+        Returns:
+            The PayParams
+
+        Raises:
+            LNURLUnavailable: If the address or its domain is backing off
+            LNURLError: If the parameters cannot be fetched
+        """
+        params = self._params.get(address)
+        if params is not None and params.expires_at > self.clock():
+            self.hits += 1
+            return params
+
+        url = pay_url(address, self.scheme)
+        self._check_backoff(urlsplit(url).netloc, address)
+        with self._lock:
+            address_lock = self._locks.setdefault(address, threading.Lock())
+        with address_lock:
+            params = self._params.get(address)
+            if params is not None and params.expires_at > self.clock():
+                self.hits += 1
+                return params
+
+            data, response = self._get(url, address)
+            try:
+                if data.get("tag") != "payRequest":
+                    raise ValueError(f"not a payRequest ({data.get('tag')!r})")
+                params = PayParams(
+                    callback=str(data["callback"]),
+                    min_sendable=int(data["minSendable"]),
+                    max_sendable=int(data["maxSendable"]),
+                    metadata=str(data.get("metadata", "")),
+                    comment_allowed=int(data.get("commentAllowed") or 0),
+                    expires_at=self.clock() + self._cache_seconds(response)
+                )
+                # The callback may only reach the host that sent the parameters
+                check_provider_url(params.callback, self.allow_local)
+                if urlsplit(params.callback).netloc.lower() != urlsplit(url).netloc.lower():
+                    raise ValueError(f"callback is not on {urlsplit(url).netloc}")
+            except (KeyError, TypeError, ValueError, LNURLError) as e:
+                self._record_failure(address, str(e))
+                raise LNURLError(f"{address}: invalid pay parameters ({str(e)})") from e
+
+            with self._lock:
+                self._params[address] = params
+                self._failures.pop(address, None)
+                self._failures.pop(urlsplit(url).netloc, None)
+            return params
+
+    def request_invoice(self, address: str, amount: int, comment: Optional[str] = None) -> str:
+        """Ask an address's provider for an invoice.
+
+        Args:
+            address: A lightning address or LNURL
+            amount: Amount in satoshis
+            comment: Optional comment, sent if the provider accepts one
+
+        Returns:
+            BOLT11 invoice for exactly the requested amount
+
+        Raises:
+            LNURLUnavailable: If the address or its domain is backing off
+            LNURLError: If no valid invoice was returned
+        """
+        params = self.pay_params(address)
+        amount_msat = amount * 1000
+        if not params.accepts(amount_msat):
+            raise LNURLError(
+                f"{address} accepts {params.min_sendable // 1000}-{params.max_sendable // 1000} sat, "
+                f"not {amount}"
+            )
+
+        query: Dict[str, Any] = {"amount": amount_msat}
+        if comment and params.comment_allowed:
+            query["comment"] = comment[:params.comment_allowed]
+        self._check_backoff(urlsplit(params.callback).netloc)
+        data, _ = self._get(params.callback, address, **query)
+
+        bolt11 = data.get("pr")
+        if not isinstance(bolt11, str) or invoice_msat(bolt11) != amount_msat:
+            # A wrong amount would pay someone more than the campaign offers
+            self._record_failure(address, "invoice does not match the amount")
+            raise LNURLError(f"{address}: invoice does not match {amount} sat")
+        with self._lock:
+            self._failures.pop(address, None)
+            self._failures.pop(urlsplit(params.callback).netloc, None)
+        return bolt11
+
+    def stats(self) -> Dict[str, int]:
+        """Return request and cache counters.
+
+        Returns:
+            Dictionary of resolver statistics
+        """
+        now = self.clock()
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "cache_hits": self.hits,
+                "failures": self.failures,
+                "cached": len(self._params),
+                "backing_off": sum(failure.retry_at > now for failure in self._failures.values()),
+            }
+
+    def close(self) -> None:
+        """Close pooled connections."""
+        self.session.close()
+
+def get_resolver() -> LNURLResolver:
+    """Return the process-wide LNURL resolver.
+
+    Returns:
+        LNURLResolver built from the active configuration
+    """
+    global _resolver
+    with _resolver_lock:
+        if _resolver is None:
+            config = get_config()
+            _resolver = LNURLResolver(
+                timeout=config.lnurl_timeout,
+                cache_seconds=config.lnurl_cache_seconds,
+                domain_concurrency=config.lnurl_domain_concurrency
+            )
+        return _resolver
+
+def pay_address(
+    resolver: LNURLResolver,
+    client: LNbitsClient,
+    address: str,
+    amount: int,
+    comment: Optional[str] = None,
+    on_invoice: Optional[Callable[[str], None]] = None
+) -> PaymentResult:
+    """Pay a lightning address or LNURL from the LNbits wallet.
+
+    Args:
+        resolver: Resolver for the address
+        client: LNbits client that pays the invoice
+        address: A lightning address or LNURL
+        amount: Amount in satoshis
+        comment: Optional comment for the recipient
+        on_invoice: Called with the invoice's payment hash before LNbits
+            pays it; raise to stop the payment
+
+    Returns:
+        PaymentResult with the invoice, its payment hash and the status LNbits
+        reports: "paid" once settled, "pending" while still being routed
+
+    Raises:
+        LNURLError: If no invoice could be obtained
+        PaymentError: If LNbits reports the payment failed
+        CircuitOpenError: If LNbits is currently considered unhealthy
+        requests.exceptions.RequestException: If LNbits could not pay
+    """
+    bolt11 = resolver.request_invoice(address, amount, comment)
+    payment_hash = invoice_payment_hash(bolt11)
+    if payment_hash is None:
+        raise LNURLError(f"{address}: invoice has no payment hash")
+    if on_invoice is not None:
+        on_invoice(payment_hash)
+    result = client.pay_invoice(bolt11)
+    state = str(result.get("status") or "").lower()
+    if state in FAILED_STATES:
+        raise PaymentError(f"Payment to {address} {state}")
+    status = "paid" if result.get("paid") or state == "success" else "pending"
+    logger.info(f"Payment of {amount} sat to {address} {status}")
+    return PaymentResult(
+        success=True,
+        status=status,
+        bolt11=bolt11,
+        payment_hash=result.get("payment_hash") or payment_hash
+    )
@@ -0,0 +1,112 @@
+"""Payment reconciliation for AutoZap.
+
+Payments are recorded as pending when their invoice is created. This module
+pages through pending payments, looks each one up in LNbits by its payment
+hash (several lookups at a time) and writes the results back in one
+transaction per page, so rate limiting sees which payments were actually
+paid.
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+import requests
+from backend.ln_wallet.wallet import CircuitOpenError, LNbitsClient, payment_state
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class ReconcileResult:
+    """Outcome of one reconciliation pass."""
+
+    checked: int = 0
+    unchanged: int = 0
+    errors: int = 0
+    changed: Dict[str, int] = field(default_factory=dict)  # new status -> count
+    # (npub, note_id, created_at) of payments found paid
+    paid: List[Tuple[str, str, int]] = field(default_factory=list)
+    interrupted: bool = False
+
+class PaymentReconciler:
+    """Updates pending payments with their status in LNbits."""
+
+    def __init__(self, db, client: LNbitsClient, page_size: int = 200, concurrency: int = 8):
+        """Initialize the reconciler.
+
+        Args:
+            db: Database holding the payments
+            client: LNbits client used for lookups
+            page_size: Pending payments read and updated at once
+            concurrency: LNbits lookups in flight at once
+        """
+        if page_size < 1 or concurrency < 1:
+            raise ValueError("page_size and concurrency must be at least 1")
+        self.db = db
+        self.client = client
+        self.page_size = page_size
+        self.concurrency = concurrency
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="reconcile")
+        self._lock = threading.Lock()
+
+    def _lookup(self, payment_hash: str) -> Tuple[Optional[str], bool]:
+        try:
+            return payment_state(self.client.payment_status(payment_hash)), False
+        except CircuitOpenError:
+            raise
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.warning(f"Could not look up payment {payment_hash[:8]}...: {str(e)}")
+            return None, True
+
+    def reconcile(self) -> ReconcileResult:
+        """Check every pending payment once.
+
+        A pass stops early if LNbits becomes unhealthy; the remaining
+        payments are checked on the next pass.
+
+        Returns:
+            Counts of checked and changed payments
+        """
+        result = ReconcileResult()
+        # One pass at a time, even if called from several threads
+        with self._lock:
+            after_id = 0
+            while True:
+                page = self.db.get_pending_payments(after_id, self.page_size)
+                if not page:
+                    break
+                after_id = page[-1][0]
+
+                try:
+                    lookups = list(self._executor.map(self._lookup, [row[3] for row in page]))
+                except CircuitOpenError as e:
+                    logger.warning(f"Stopping reconciliation: {str(e)}")
+                    result.interrupted = True
+                    break
+
+                updates = []
+                for (payment_id, npub, note_id, _, created_at), (status, error) in zip(page, lookups):
+                    result.checked += 1
+                    if error:
+                        result.errors += 1
+                    elif status is None:
+                        result.unchanged += 1
+                    else:
+                        updates.append((status, payment_id))
+                        result.changed[status] = result.changed.get(status, 0) + 1
+                        if status == "paid":
+                            result.paid.append((npub, note_id, created_at))
+
+                if updates:
+                    self.db.update_payment_statuses(updates)
+                if len(page) < self.page_size:
+                    break
+
+        if result.changed:
+            logger.info(f"Reconciled {result.checked} pending payments: {result.changed}")
+        return result
+
+    def close(self) -> None:
+        """Stop the lookup threads."""
+        self._executor.shutdown(wait=True)
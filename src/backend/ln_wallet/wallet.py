@@ -4,26 +4,41 @@ This module handles all Lightning Network payment operations through the LNbits
 """
 
 import logging
+import random
+import threading
+import time
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Dict, Optional
+from typing import Any, Dict, Optional
 import requests
-from src.backend.config import config, Config
-from src.backend.db.models import Database, Payment
+from requests.adapters import HTTPAdapter
+from backend.config import get_config, Config
+from backend.db.models import Payment, get_database
 
 logger = logging.getLogger(__name__)
 
 # Store config instance for testing
 _config_instance: Optional[Config] = None
 
+# Shared LNbits client, created on first use
+_client: Optional["LNbitsClient"] = None
+_client_lock = threading.Lock()
+
+# HTTP statuses worth retrying: rate limiting and gateway/availability errors
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+
+# LNbits detail states that end a payment without it being paid
+FAILED_STATES = {"failed": "failed", "expired": "expired", "cancelled": "failed"}
+
 def set_config_for_testing(cfg: Config) -> None:
     """Set configuration for testing purposes.
     
     Args:
         cfg: Configuration instance to use
     """
-    global _config_instance
+    global _config_instance, _client
     _config_instance = cfg
+    _client = None
 
 @dataclass
 class PaymentResult:
@@ -47,8 +62,410 @@ class PaymentError(LNbitsError):
     """Raised when payment processing fails."""
     pass
 
+class CircuitOpenError(LNbitsError):
+    """Raised when LNbits calls are refused because LNbits is unhealthy."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"LNbits circuit open, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """Stops calling LNbits after repeated failures until it recovers.
+
+    After failure_threshold consecutive failures the circuit opens and calls
+    fail fast. Once reset_timeout has passed a single trial call is let
+    through; its outcome closes the circuit again or reopens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, clock=time.monotonic):
+        """Initialize a closed circuit.
+
+        Args:
+            failure_threshold: Consecutive failures that open the circuit
+            reset_timeout: Seconds to wait before trying again
+            clock: Monotonic time source
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        """Check that a call may proceed.
+
+        Raises:
+            CircuitOpenError: If the circuit is open
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+
+            remaining = self.opened_at + self.reset_timeout - self.clock()
+            if self.state == self.OPEN and remaining <= 0:
+                # Let one trial call through
+                self.state = self.HALF_OPEN
+                return
+
+            raise CircuitOpenError(max(remaining, 0.0) or self.reset_timeout)
+
+    def record_success(self) -> None:
+        """Record a successful call and close the circuit."""
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self) -> None:
+        """Record a failed call, opening the circuit if needed."""
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"LNbits circuit opened after {self.failures} failures")
+                self.state = self.OPEN
+                self.opened_at = self.clock()
+
+class LNbitsClient:
+    """LNbits API client with a keep-alive session, retries and a circuit breaker."""
+
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str,
+        timeout: float = 10.0,
+        max_retries: int = 2,
+        backoff_base: float = 0.25,
+        backoff_max: float = 5.0,
+        pool_size: int = 16,
+        breaker: Optional[CircuitBreaker] = None
+    ):
+        """Initialize the client.
+
+        Args:
+            base_url: LNbits instance URL
+            api_key: LNbits wallet API key
+            timeout: Per-request timeout in seconds
+            max_retries: Retries after the first attempt for retryable failures
+            backoff_base: First retry delay ceiling in seconds
+            backoff_max: Maximum retry delay ceiling in seconds
+            pool_size: Keep-alive connections kept open to LNbits
+            breaker: Circuit breaker (a default one is created if omitted)
+        """
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+
+        self.session = requests.Session()
+        self.session.headers.update({
+            "X-Api-Key": api_key,
+            "Content-type": "application/json"
+        })
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.last_latency = 0.0
+        self._stats_lock = threading.Lock()
+
+    def _record_latency(self, latency: float, error: bool) -> None:
+        with self._stats_lock:
+            self.calls += 1
+            self.errors += error
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+            self.last_latency = latency
+
+    def request(self, method: str, path: str, idempotent: bool, **kwargs) -> Dict[str, Any]:
+        """Send an API request, retrying failures that are safe to retry.
+
+        Non-idempotent requests are only retried when LNbits certainly did
+        not act on them (connect timeouts and 429/503 responses).
+
+        Args:
+            method: HTTP method
+            path: API path below the base URL
+            idempotent: Whether repeating the request is harmless
+            **kwargs: Extra arguments passed to requests
+
+        Returns:
+            Decoded JSON response
+
+        Raises:
+            CircuitOpenError: If LNbits is currently considered unhealthy
+            requests.exceptions.RequestException: If the request ultimately fails
+        """
+        url = f"{self.base_url}{path}"
+        attempt = 0
+
+        while True:
+            self.breaker.before_call()
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+                response.raise_for_status()
+                result = response.json()
+            except requests.exceptions.RequestException as e:
+                self._record_latency(time.perf_counter() - start, error=True)
+                status = e.response.status_code if e.response is not None else None
+
+                # A client error is still an answer from a healthy LNbits, so
+                # it also ends a half-open trial
+                if status is None or status >= 500 or status == 429:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+
+                if attempt >= self.max_retries or not self._retryable(e, status, idempotent):
+                    raise
+
+                attempt += 1
+                with self._stats_lock:
+                    self.retries += 1
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+                logger.warning(f"LNbits {method} {path} failed ({str(e)}), retrying in {delay:.2f}s")
+                time.sleep(delay)
+                continue
+
+            self._record_latency(time.perf_counter() - start, error=False)
+            self.breaker.record_success()
+            return result
+
+    @staticmethod
+    def _retryable(error: Exception, status: Optional[int], idempotent: bool) -> bool:
+        if status is not None:
+            return status in RETRY_STATUSES if idempotent else status in (429, 503)
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return True
+        return idempotent and isinstance(
+            error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+        )
+
+    def create_invoice(self, amount: int, memo: str) -> Dict[str, Any]:
+        """Create an incoming invoice.
+
+        Args:
+            amount: Invoice amount in satoshis
+            memo: Invoice description
+
+        Returns:
+            LNbits payment response with payment_request and payment_hash
+        """
+        # Creating an invoice moves no funds, so it is safe to repeat
+        return self.request(
+            "POST", "/api/v1/payments", idempotent=True,
+            json={"out": False, "amount": amount, "memo": memo}
+        )
+
+    def pay_invoice(self, bolt11: str) -> Dict[str, Any]:
+        """Pay an outgoing invoice from the wallet.
+
+        Args:
+            bolt11: The invoice to pay
+
+        Returns:
+            LNbits payment response with payment_hash
+
+        Raises:
+            PaymentError: If LNbits refused the payment, e.g. for an expired
+                invoice or an insufficient balance
+        """
+        # Paying twice would send the funds twice, so only safe failures retry
+        try:
+            return self.request(
+                "POST", "/api/v1/payments", idempotent=False,
+                json={"out": True, "bolt11": bolt11}
+            )
+        except requests.exceptions.HTTPError as e:
+            status = e.response.status_code if e.response is not None else None
+            # Client errors are final; server errors may hide a payment made
+            if status is None or status >= 500 or status == 429:
+                raise
+            try:
+                detail = e.response.json().get("detail")
+            except (ValueError, AttributeError):
+                detail = None
+            raise PaymentError(f"LNbits refused the payment: {detail or f'HTTP {status}'}") from e
+
+    def payment_status(self, payment_hash: str) -> Dict[str, Any]:
+        """Look up a payment.
+
+        Args:
+            payment_hash: Hash of the payment's invoice
+
+        Returns:
+            LNbits payment response with paid and details
+        """
+        return self.request("GET", f"/api/v1/payments/{payment_hash}", idempotent=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return call counters, latency and circuit state.
+
+        Returns:
+            Dictionary of client statistics
+        """
+        with self._stats_lock:
+            return {
+                "calls": self.calls,
+                "errors": self.errors,
+                "retries": self.retries,
+                "latency_avg": self.latency_total / self.calls if self.calls else 0.0,
+                "latency_max": self.latency_max,
+                "latency_last": self.last_latency,
+                "circuit": self.breaker.state,
+            }
+
+    def close(self) -> None:
+        """Close pooled connections."""
+        self.session.close()
+
+def get_client() -> LNbitsClient:
+    """Return the process-wide LNbits client.
+
+    Returns:
+        LNbitsClient built from the active configuration
+
+    Raises:
+        LNbitsError: If the configuration is not initialized
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            cfg = _config_instance or get_config()
+            if cfg is None:
+                raise LNbitsError("Configuration not initialized")
+            _client = LNbitsClient(
+                cfg.lnbits_url,
+                cfg.lnbits_api_key,
+                timeout=cfg.lnbits_timeout,
+                max_retries=cfg.lnbits_max_retries,
+                breaker=CircuitBreaker(
+                    cfg.lnbits_breaker_threshold,
+                    cfg.lnbits_breaker_reset_seconds
+                )
+            )
+        return _client
+
+def request_invoice(npub: str, note_id: str, amount: int) -> PaymentResult:
+    """Generate a Lightning Network invoice through LNbits without recording it.
+    
+    Args:
+        npub: The public key of the user to pay
+        note_id: The ID of the note being reposted
+        amount: Payment amount in satoshis
+        
+    Returns:
+        PaymentResult object containing the operation result
+        
+    Raises:
+        CircuitOpenError: If LNbits is currently considered unhealthy
+        InvoiceGenerationError: If invoice generation fails
+    """
+    memo = f"AutoZap payment for repost of {note_id[:8]}... by {npub[:8]}..."
+
+    try:
+        invoice_result = get_client().create_invoice(amount, memo)
+
+        if "payment_request" not in invoice_result:
+            raise InvoiceGenerationError("No BOLT11 invoice in response")
+
+        logger.info(
+            f"Invoice generated for {amount} sat to {npub[:8]}... "
+            f"for note {note_id[:8]}..."
+        )
+
+        return PaymentResult(
+            success=True,
+            status="invoice_generated",
+            bolt11=invoice_result["payment_request"],
+            payment_hash=invoice_result.get("payment_hash")
+        )
+
+    except (CircuitOpenError, InvoiceGenerationError):
+        raise
+
+    except requests.exceptions.RequestException as e:
+        error_msg = f"Failed to connect to LNbits: {str(e)}"
+        logger.error(error_msg)
+        raise InvoiceGenerationError(error_msg) from e
+
+    except Exception as e:
+        error_msg = f"Unexpected error generating invoice: {str(e)}"
+        logger.error(error_msg)
+        raise InvoiceGenerationError(error_msg) from e
+
+def payment_state(response: Dict[str, Any]) -> Optional[str]:
+    """Map an LNbits payment lookup to a payment status.
+
+    Args:
+        response: Response of GET /api/v1/payments/{payment_hash}
+
+    Returns:
+        "paid", "failed" or "expired", or None while still pending
+    """
+    if response.get("paid"):
+        return "paid"
+    details = response.get("details") or {}
+    state = str(details.get("status") or response.get("status") or "").lower()
+    return FAILED_STATES.get(state)
+
+def find_payment(payment_hash: str) -> Optional[PaymentResult]:
+    """Look up a payment an earlier, interrupted attempt may have made.
+    
+    Args:
+        payment_hash: Hash of the invoice the attempt created or paid
+        
+    Returns:
+        PaymentResult for the payment, or None if LNbits has no such payment.
+        Its status is "paid", "failed", "pending" for an outgoing payment
+        still in flight, or "invoice_generated" for an unpaid incoming
+        invoice, which is all an invoice-only attempt produces.
+        
+    Raises:
+        CircuitOpenError: If LNbits is currently considered unhealthy
+        requests.exceptions.RequestException: If LNbits could not answer;
+            whether the payment exists is then unknown
+    """
+    try:
+        response = get_client().payment_status(payment_hash)
+    except requests.exceptions.HTTPError as e:
+        if e.response is not None and e.response.status_code == 404:
+            return None
+        raise
+
+    details = response.get("details") or {}
+    state = payment_state(response)
+    if state == "paid":
+        status = "paid"
+    elif state is not None:
+        status = "failed"
+    elif details.get("is_out") or (details.get("amount") or 0) < 0:
+        status = "pending"
+    else:
+        status = "invoice_generated"
+    return PaymentResult(
+        success=status != "failed",
+        status=status,
+        bolt11=details.get("bolt11") or response.get("bolt11") or "",
+        payment_hash=payment_hash,
+        error_message=f"payment {state}" if status == "failed" else None
+    )
+
 def create_invoice(npub: str, note_id: str, amount: Optional[int] = None) -> PaymentResult:
-    """Generate a Lightning Network invoice through LNbits.
+    """Generate a Lightning Network invoice through LNbits and record it.
     
     Args:
         npub: The public key of the user to pay
@@ -59,73 +476,36 @@ def create_invoice(npub: str, note_id: str, amount: Optional[int] = None) -> Pay
         PaymentResult object containing the operation result
         
     Raises:
+        CircuitOpenError: If LNbits is currently considered unhealthy
         InvoiceGenerationError: If invoice generation fails
     """
-    cfg = _config_instance or config
+    cfg = _config_instance or get_config()
     if cfg is None:
         raise InvoiceGenerationError("Configuration not initialized")
-        
+
     if amount is None:
         amount = cfg.payment_amount
-            
-        headers = {
-            "X-Api-Key": cfg.lnbits_api_key,
-            "Content-type": "application/json"
-        }
-        
-        invoice_data = {
-            "out": False,
-            "amount": amount,
-            "memo": f"AutoZap payment for repost of {note_id[:8]}... by {npub[:8]}...",
-        }
 
-        try:
-            response = requests.post(
-                f"{cfg.lnbits_url}/api/v1/payments",
-                json=invoice_data,
-                headers=headers,
-                timeout=10
-            )
-            response.raise_for_status()
-            invoice_result = response.json()
-            
-            if "payment_request" not in invoice_result:
-                raise InvoiceGenerationError("No BOLT11 invoice in response")
-                
-            bolt11 = invoice_result["payment_request"]
-            payment_hash = invoice_result.get("payment_hash")
-            
-            # Record the payment in the database
-            db = Database(cfg.db_path)
-            payment = Payment(
-                id=None,
-                npub=npub,
-                amount=amount,
-                bolt11=bolt11,
-                status="pending",
-                created_at=datetime.now(),
-                note_id=note_id
-            )
-            db.add_payment(payment)
-            
-            logger.info(
-                f"Invoice generated for {amount} sat to {npub[:8]}... "
-                f"for note {note_id[:8]}..."
-            )
-            
-            return PaymentResult(
-                success=True,
-                status="invoice_generated",
-                bolt11=bolt11,
-                payment_hash=payment_hash
-            )
+    result = request_invoice(npub, note_id, amount)
+
+    try:
+        # Record the payment in the database
+        db = get_database(cfg.db_path)
+        payment = Payment(
+            id=None,
+            npub=npub,
+            amount=amount,
+            bolt11=result.bolt11,
+            status="pending",
+            created_at=datetime.now(),
+            note_id=note_id,
+            payment_hash=result.payment_hash
+        )
+        db.add_payment(payment)
+
+    except Exception as e:
+        error_msg = f"Failed to record invoice: {str(e)}"
+        logger.error(error_msg)
+        raise InvoiceGenerationError(error_msg) from e
 
-        except requests.exceptions.RequestException as e:
-            error_msg = f"Failed to connect to LNbits: {str(e)}"
-            logger.error(error_msg)
-            raise InvoiceGenerationError(error_msg) from e
-            
-        except Exception as e:
-            error_msg = f"Unexpected error generating invoice: {str(e)}"
-            logger.error(error_msg)
-            raise InvoiceGenerationError(error_msg) from e
+    return result
@@ -0,0 +1,398 @@
+"""Metrics for AutoZap.
+
+This module provides a small metrics registry (counters, gauges and
+histograms) that can be served over HTTP in the Prometheus text format.
+Metrics are disabled until enable() is called; while disabled every update
+returns after a single flag check, so instrumented code costs next to
+nothing when nobody is scraping.
+"""
+
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# http.server is only needed once a metrics port is served
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# Histogram buckets in seconds, from sub-millisecond event handling to slow
+# LNbits calls
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+class Registry:
+    """Collection of metrics rendered together."""
+
+    def __init__(self):
+        self.enabled = False
+        self.metrics: Dict[str, "Metric"] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: "Metric") -> "Metric":
+        """Add a metric, or return the existing one with the same name.
+
+        Args:
+            metric: The metric to add
+
+        Returns:
+            The registered metric
+        """
+        with self._lock:
+            return self.metrics.setdefault(metric.name, metric)
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text format.
+
+        Returns:
+            Exposition text
+        """
+        lines: List[str] = []
+        for metric in list(self.metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        """Clear all recorded values."""
+        for metric in self.metrics.values():
+            metric.reset()
+
+    def snapshot(self) -> Dict[str, Dict[Tuple[str, ...], object]]:
+        """Return a picklable copy of all current values.
+
+        Returns:
+            Mapping of metric name to its values by label set
+        """
+        return {name: metric.snapshot() for name, metric in list(self.metrics.items())}
+
+    def merge(self, snapshots: Iterable[Dict[str, Dict[Tuple[str, ...], object]]]) -> None:
+        """Replace the recorded values with the sum of several snapshots.
+
+        Used to serve the combined metrics of several processes.
+
+        Args:
+            snapshots: Snapshots taken with snapshot(), one per process
+        """
+        snapshots = list(snapshots)
+        for name, metric in list(self.metrics.items()):
+            metric.merge([snapshot[name] for snapshot in snapshots if name in snapshot])
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Metric:
+    """Base class for labelled metrics."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), registry: Optional[Registry] = None):
+        """Create and register the metric.
+
+        Args:
+            name: Metric name
+            help: Description shown in the exposition
+            labelnames: Names of the labels each value is keyed by
+            registry: Registry to join (defaults to the module registry)
+        """
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.registry = registry or REGISTRY
+        self._lock = threading.Lock()
+        self.reset()
+        self.registry.register(self)
+
+    def reset(self) -> None:
+        """Clear recorded values."""
+        raise NotImplementedError
+
+    def samples(self) -> List[str]:
+        """Return exposition lines for the current values."""
+        raise NotImplementedError
+
+    def snapshot(self) -> Dict[Tuple[str, ...], float]:
+        """Return a copy of the current values by label set."""
+        with self._lock:
+            return dict(self._values)
+
+    def merge(self, snapshots: List[Dict[Tuple[str, ...], float]]) -> None:
+        """Set the values to the sum of several snapshots.
+
+        Args:
+            snapshots: Values returned by snapshot()
+        """
+        values: Dict[Tuple[str, ...], float] = {}
+        for snapshot in snapshots:
+            for labels, value in snapshot.items():
+                values[labels] = values.get(labels, 0) + value
+        with self._lock:
+            self._values = values
+
+class Counter(Metric):
+    """Monotonically increasing count."""
+
+    kind = "counter"
+
+    def reset(self) -> None:
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        """Increase the count.
+
+        Args:
+            *labels: Label values, in labelnames order
+            amount: Amount to add
+        """
+        if not self.registry.enabled:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        """Return the current count for a label set."""
+        return self._values.get(labels, 0)
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+            for labels, value in list(self._values.items())
+        ]
+
+class Gauge(Metric):
+    """Value that can go up and down, or is read from a function at scrape time."""
+
+    kind = "gauge"
+
+    def reset(self) -> None:
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._functions: Dict[Tuple[str, ...], Callable[[], float]] = {}
+
+    def set(self, value: float, *labels: str) -> None:
+        """Set the value.
+
+        Args:
+            value: The new value
+            *labels: Label values, in labelnames order
+        """
+        if not self.registry.enabled:
+            return
+        self._values[labels] = value
+
+    def set_function(self, function: Callable[[], float], *labels: str) -> None:
+        """Read the value from a function whenever metrics are rendered.
+
+        Args:
+            function: Returns the current value
+            *labels: Label values, in labelnames order
+        """
+        self._functions[labels] = function
+
+    def snapshot(self) -> Dict[Tuple[str, ...], float]:
+        values = dict(self._values)
+        for labels, function in list(self._functions.items()):
+            try:
+                values[labels] = function()
+            except Exception as e:
+                logger.debug(f"Gauge {self.name} function failed: {str(e)}")
+        return values
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+            for labels, value in self.snapshot().items()
+        ]
+
+class Histogram(Metric):
+    """Distribution of observed values in cumulative buckets."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        registry: Optional[Registry] = None
+    ):
+        """Create and register the histogram.
+
+        Args:
+            name: Metric name
+            help: Description shown in the exposition
+            labelnames: Names of the labels each value is keyed by
+            buckets: Sorted upper bounds of the buckets
+            registry: Registry to join (defaults to the module registry)
+        """
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames, registry)
+
+    def reset(self) -> None:
+        # labels -> (per-bucket counts with a final +Inf bucket, sum)
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        """Record an observation.
+
+        Args:
+            value: The observed value
+            *labels: Label values, in labelnames order
+        """
+        if not self.registry.enabled:
+            return
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(labels) or ([0] * (len(self.buckets) + 1), 0.0)
+            counts[index] += 1
+            self._values[labels] = (counts, total + value)
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        """Observe the duration of a block in seconds.
+
+        Args:
+            *labels: Label values, in labelnames order
+        """
+        if not self.registry.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def count(self, *labels: str) -> int:
+        """Return the number of observations for a label set."""
+        counts, _ = self._values.get(labels, ([], 0.0))
+        return sum(counts)
+
+    def snapshot(self) -> Dict[Tuple[str, ...], Tuple[List[int], float]]:
+        with self._lock:
+            return {labels: (list(counts), total) for labels, (counts, total) in self._values.items()}
+
+    def merge(self, snapshots: List[Dict[Tuple[str, ...], Tuple[List[int], float]]]) -> None:
+        values: Dict[Tuple[str, ...], Tuple[List[int], float]] = {}
+        for snapshot in snapshots:
+            for labels, (counts, total) in snapshot.items():
+                merged, merged_total = values.get(labels) or ([0] * len(counts), 0.0)
+                values[labels] = ([a + b for a, b in zip(merged, counts)], merged_total + total)
+        with self._lock:
+            self._values = values
+
+    def samples(self) -> List[str]:
+        lines = []
+        for labels, (counts, total) in list(self._values.items()):
+            cumulative = 0
+            bounds = [str(bound) for bound in self.buckets] + ["+Inf"]
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                label_text = _format_labels(self.labelnames, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{label_text} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {total}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+# The process-wide registry and the bot's metrics
+REGISTRY = Registry()
+
+EVENTS_RECEIVED = Counter(
+    "autozap_relay_events_total", "Event frames received per relay", ["relay"]
+)
+EVENTS_SKIPPED = Counter(
+    "autozap_relay_events_skipped_total", "Event frames mentioning no watched note"
+)
+DEDUP_HITS = Counter(
+    "autozap_dedup_hits_total", "Events dropped because another relay delivered them first"
+)
+REPOSTS_MATCHED = Counter(
+    "autozap_reposts_matched_total", "Events matching a watched note"
+)
+REPOSTS_REJECTED = Counter(
+    "autozap_reposts_rejected_total", "Matched events with an invalid ID or signature"
+)
+RATE_LIMITED = Counter(
+    "autozap_rate_limited_total", "Reposts skipped because the user was already paid"
+)
+PAYMENTS = Counter(
+    "autozap_payments_total", "Payment attempts by resulting status", ["status"]
+)
+PAYMENTS_RECONCILED = Counter(
+    "autozap_payments_reconciled_total", "Pending payments moved to a final status by LNbits lookups", ["status"]
+)
+PROFILE_LOOKUPS = Counter(
+    "autozap_profile_lookups_total", "Recipient profiles resolved by where they were found", ["source"]
+)
+QUEUE_DEPTH = Gauge(
+    "autozap_queue_depth", "Items waiting in each pipeline queue", ["queue"]
+)
+STAGE_SECONDS = Histogram(
+    "autozap_stage_seconds", "Time spent in each pipeline stage", ["stage"]
+)
+
+def enable() -> None:
+    """Start recording metrics."""
+    REGISTRY.enabled = True
+
+def disable() -> None:
+    """Stop recording metrics."""
+    REGISTRY.enabled = False
+
+def _handler_class(registry: Registry) -> type:
+    """Build a request handler serving the given registry."""
+    from http.server import BaseHTTPRequestHandler
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args) -> None:
+            logger.debug(f"Metrics request from {self.address_string()}: {format % args}")
+
+    return MetricsHandler
+
+def start_http_server(port: int, host: str = "127.0.0.1", registry: Optional[Registry] = None) -> "ThreadingHTTPServer":
+    """Serve /metrics from a background thread and enable recording.
+
+    Args:
+        port: TCP port to listen on (0 picks a free port)
+        host: Address to bind
+        registry: Registry to serve (defaults to the module registry)
+
+    Returns:
+        The running server; call shutdown() to stop it
+    """
+    from http.server import ThreadingHTTPServer
+
+    registry = registry or REGISTRY
+    registry.enabled = True
+    server = ThreadingHTTPServer((host, port), _handler_class(registry))
+    thread = threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True)
+    thread.start()
+    logger.info(f"Serving metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
@@ -0,0 +1,338 @@
+"""Offline backfill for AutoZap.
+
+This module replays reposts from NIP-01 event dumps (one JSON event per
+line, as exported by relays) through the same match, verify, rate-limit and
+pay steps the live bot uses. Files are streamed in chunks of lines; worker
+processes decode, match and verify each chunk, and verified reposts are
+written to the payment outbox before the file's checkpoint moves past the
+chunk, so an interrupted backfill resumes where it stopped without paying
+anything twice.
+
+    PYTHONPATH=$(pwd)/src python3 -m backend.nostr_bot.backfill reposts.jsonl
+"""
+
+import argparse
+import asyncio
+import gzip
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, fields
+from operator import attrgetter
+from typing import IO, Iterator, List, Optional, Sequence, Set, Tuple
+from backend.config import get_config
+from backend.db.models import Campaign, Database, OutboxEntry, get_database
+from backend.nostr_bot.bot import load_campaigns, submit_entries
+from backend.nostr_bot.campaigns import CampaignRegistry
+from backend.nostr_bot.events import RepostEvent, extract_repost_info, handle_repost_event
+from backend.nostr_bot.transactions import enqueue_payment, get_budget_ledger, get_rate_limiter
+from backend.nostr_bot.verify import event_fields, verify_event
+from backend.nostr_bot.wire import WireEvent, mentions_any
+from backend.nostr_bot.workers import PaymentWorkerPool
+
+logger = logging.getLogger(__name__)
+
+# Lines handed to a worker process at once
+DEFAULT_CHUNK_LINES = 5000
+
+# Campaigns of the worker process, set by _init_worker
+_campaigns: Optional[CampaignRegistry] = None
+
+@dataclass
+class ChunkResult:
+    """Outcome of scanning one chunk of lines in a worker process."""
+
+    lines: int = 0
+    malformed: int = 0
+    matched: int = 0
+    rejected: int = 0
+    reposts: List[RepostEvent] = field(default_factory=list)
+
+@dataclass
+class BackfillStats:
+    """Counters for a backfill run."""
+
+    files: int = 0
+    lines: int = 0
+    malformed: int = 0
+    matched: int = 0
+    rejected: int = 0
+    queued: int = 0
+    already_queued: int = 0
+    rate_limited: int = 0
+
+    def add(self, result: ChunkResult) -> None:
+        """Add a chunk's counters."""
+        self.lines += result.lines
+        self.malformed += result.malformed
+        self.matched += result.matched
+        self.rejected += result.rejected
+
+    def to_dict(self) -> dict:
+        """Return the counters as a plain dictionary."""
+        return {f.name: getattr(self, f.name) for f in fields(self)}
+
+def _init_worker(campaigns: List[Campaign]) -> None:
+    global _campaigns
+    _campaigns = CampaignRegistry(campaigns)
+
+def decode_line(line: bytes) -> Optional[WireEvent]:
+    """Decode one dump line into an event.
+
+    Lines may hold a bare event object or a relay EVENT message.
+
+    Args:
+        line: Raw line from the dump
+
+    Returns:
+        The event, or None if the line is not a valid event
+    """
+    try:
+        data = json.loads(line)
+        if isinstance(data, list) and len(data) >= 3 and data[0] == "EVENT":
+            data = data[2]
+        return WireEvent.from_json(data)
+    except (ValueError, KeyError, TypeError, IndexError):
+        return None
+
+def scan_lines(lines: Sequence[bytes]) -> ChunkResult:
+    """Find genuine reposts of watched notes in a chunk of dump lines.
+
+    Runs in a worker process initialized with the watched campaigns.
+
+    Args:
+        lines: Raw lines from the dump
+
+    Returns:
+        Counters and the verified reposts, in file order
+    """
+    result = ChunkResult(lines=len(lines))
+    for line in lines:
+        text = line.decode("utf-8", errors="replace")
+        # Skip decoding events that mention no watched note at all
+        if not text.strip() or not mentions_any(text, _campaigns):
+            continue
+        event = decode_line(line)
+        if event is None:
+            result.malformed += 1
+            continue
+        repost = extract_repost_info(event, _campaigns)
+        if repost is None:
+            continue
+        result.matched += 1
+        if verify_event(event_fields(event)):
+            result.reposts.append(repost)
+        else:
+            result.rejected += 1
+    return result
+
+def open_dump(path: str) -> IO[bytes]:
+    """Open a dump for binary reading, decompressing .gz files."""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+def read_chunks(dump: IO[bytes], chunk_lines: int) -> Iterator[Tuple[List[bytes], int]]:
+    """Read a dump in chunks of whole lines.
+
+    Args:
+        dump: Dump opened in binary mode, positioned at a line start
+        chunk_lines: Maximum lines per chunk
+
+    Yields:
+        (lines, offset just past the chunk's last line)
+    """
+    offset = dump.tell()
+    while True:
+        lines = list(itertools.islice(dump, chunk_lines))
+        if not lines:
+            return
+        offset += sum(len(line) for line in lines)
+        yield lines, offset
+
+def enqueue_reposts(reposts: Sequence[RepostEvent]) -> List[OutboxEntry]:
+    """Write verified reposts to the payment outbox.
+
+    Args:
+        reposts: Reposts to pay
+
+    Returns:
+        Outbox entries for the reposts not already queued
+    """
+    entries = []
+    for repost in reposts:
+        entry = enqueue_payment(repost.event_id, repost.pubkey, repost.note_id, repost.amount)
+        if entry:
+            entries.append(entry)
+    return entries
+
+def count_payable(reposts: Sequence[RepostEvent], seen: Set[Tuple[str, str]]) -> int:
+    """Count reposts a backfill would pay, without paying them.
+
+    Args:
+        reposts: Verified reposts
+        seen: (pubkey, note ID) pairs already counted in this run; updated
+
+    Returns:
+        Reposts neither rate limited nor repeated within the run
+    """
+    limiter = get_rate_limiter()
+    payable = 0
+    for repost in reposts:
+        key = (repost.pubkey, repost.note_id)
+        if key in seen or limiter.is_limited(*key):
+            continue
+        seen.add(key)
+        payable += 1
+    return payable
+
+async def backfill(
+    paths: Sequence[str],
+    campaigns: CampaignRegistry,
+    db: Database,
+    dry_run: bool = False,
+    workers: int = 0,
+    chunk_lines: int = DEFAULT_CHUNK_LINES,
+    resume: bool = True
+) -> BackfillStats:
+    """Pay the reposts found in event dumps.
+
+    Args:
+        paths: Dump files, processed in order
+        campaigns: Watched notes
+        db: Database holding the outbox and checkpoints
+        dry_run: Only count what would be paid; nothing is written
+        workers: Parsing processes (0 for one per CPU core)
+        chunk_lines: Lines handed to a worker at once
+        resume: Continue each file from its saved checkpoint
+
+    Returns:
+        Counters for the run
+    """
+    config = get_config()
+    stats = BackfillStats()
+    seen: Set[Tuple[str, str]] = set()
+    loop = asyncio.get_running_loop()
+    workers = workers or os.cpu_count() or 1
+
+    executor = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(list(campaigns),)
+    )
+
+    payment_pool = None
+    if not dry_run:
+        payment_pool = PaymentWorkerPool(
+            handle_repost_event,
+            workers=config.payment_workers,
+            queue_size=config.payment_queue_size,
+            key=attrgetter("npub"),
+            job_id=attrgetter("id")
+        )
+        payment_pool.start()
+        # A running bot may be driving the other unfinished entries, so only
+        # those nobody has touched for a whole lease are taken over
+        lease = config.outbox_lease_seconds
+        abandoned = await asyncio.to_thread(db.get_stale_outbox_entries, lease, lease)
+        await submit_entries(abandoned, payment_pool, "abandoned")
+
+    async def handle_chunk(path: str, future: asyncio.Future, end: int) -> None:
+        result = await future
+        stats.add(result)
+
+        if dry_run:
+            payable = await asyncio.to_thread(count_payable, result.reposts, seen)
+            stats.queued += payable
+            stats.rate_limited += len(result.reposts) - payable
+            return
+
+        entries = await asyncio.to_thread(enqueue_reposts, result.reposts)
+        stats.queued += len(entries)
+        stats.already_queued += len(result.reposts) - len(entries)
+        for entry in entries:
+            await payment_pool.submit(entry)
+        # Everything before end is now in the outbox
+        await asyncio.to_thread(db.save_backfill_checkpoint, path, end)
+
+    try:
+        for path in paths:
+            path = os.path.abspath(path)
+            offset = await asyncio.to_thread(db.get_backfill_checkpoint, path) if resume else 0
+            logger.info(f"Backfilling {path} from byte {offset}")
+
+            with open_dump(path) as dump:
+                dump.seek(offset)
+                # Keep every worker busy while results are handled in order
+                pending = deque()
+                for lines, end in read_chunks(dump, chunk_lines):
+                    pending.append((loop.run_in_executor(executor, scan_lines, lines), end))
+                    if len(pending) >= workers * 2:
+                        await handle_chunk(path, *pending.popleft())
+                while pending:
+                    await handle_chunk(path, *pending.popleft())
+
+            stats.files += 1
+            logger.info(f"Finished {path} ({stats.to_dict()})")
+
+        if payment_pool:
+            await payment_pool.queue.join()
+
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        if payment_pool:
+            await payment_pool.close()
+            logger.info(f"Stopped payment workers ({payment_pool.stats()})")
+
+    return stats
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description="Pay reposts found in NIP-01 event dumps")
+    parser.add_argument("paths", nargs="+", help="JSONL dumps (optionally .gz), one event per line")
+    parser.add_argument("--dry-run", action="store_true", help="count payable reposts without paying")
+    parser.add_argument("--workers", type=int, default=0, help="parsing processes (default: one per CPU)")
+    parser.add_argument("--chunk-lines", type=int, default=DEFAULT_CHUNK_LINES, help="lines per worker task")
+    parser.add_argument("--restart", action="store_true", help="ignore saved checkpoints")
+    parser.add_argument("--note", action="append", default=[], help="note ID to watch (default: configured campaigns)")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Entry point for the backfill command."""
+    args = parse_args(argv)
+    if args.workers < 0 or args.chunk_lines < 1:
+        logger.error("--workers must not be negative and --chunk-lines must be positive")
+        sys.exit(2)
+
+    config = get_config()
+    db = get_database(config.db_path)
+    campaigns = CampaignRegistry(load_campaigns(db, args.note or config.watch_note_ids))
+    if not campaigns:
+        logger.error("No campaigns to backfill (pass --note, set WATCH_NOTE_IDS or add campaigns)")
+        sys.exit(1)
+
+    get_rate_limiter().warm()
+    get_budget_ledger().set_budgets(campaigns)
+
+    try:
+        stats = asyncio.run(backfill(
+            args.paths, campaigns, db,
+            dry_run=args.dry_run,
+            workers=args.workers,
+            chunk_lines=args.chunk_lines,
+            resume=not args.restart
+        ))
+        logger.info(f"Backfill {'dry run ' if args.dry_run else ''}complete: {stats.to_dict()}")
+    except KeyboardInterrupt:
+        logger.info("Backfill interrupted; rerun to resume from the last checkpoint")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
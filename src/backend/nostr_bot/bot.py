@@ -4,16 +4,37 @@ This module contains the core bot functionality for monitoring Nostr
 events and coordinating payments.
 """
 
+import asyncio
+import functools
 import logging
-import time
 import signal
 import sys
-from typing import Optional
+import time
+from operator import attrgetter
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
 from dataclasses import dataclass
-from nostr.relay_manager import RelayManager
-from backend.config import config
-from backend.nostr_bot.events import subscribe_to_reposts, NostrEventError
-from backend.db.models import Database
+from backend import metrics
+from backend.config import get_config
+from backend.nostr_bot.campaigns import CampaignRegistry
+from backend.nostr_bot.cursors import RelayCursors
+from backend.nostr_bot.dedup import EventDeduplicator
+from backend.nostr_bot.health import RelayScorer
+from backend.nostr_bot.profiles import ProfileCache, ProfileResolver
+from backend.nostr_bot.events import (
+    subscribe_to_reposts, update_subscriptions, handle_repost_event, accept_repost,
+    NostrEventError
+)
+from backend.nostr_bot.relay_pool import RelayPool
+from backend.nostr_bot.shards import Shard
+from backend.nostr_bot.transactions import get_budget_ledger, get_rate_limiter
+from backend.nostr_bot.verify import EventVerifier
+from backend.nostr_bot.workers import PaymentWorkerPool
+from backend.db.models import Campaign, Database, OutboxEntry, get_database
+
+# The LNbits client and stats API pull in requests and http.server; they are
+# imported once the relays are connecting so startup is not held up by them
+if TYPE_CHECKING:
+    from backend.ln_wallet.reconcile import PaymentReconciler
 
 # Configure logging
 logging.basicConfig(
@@ -23,83 +44,632 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# Seconds between dedup snapshots
+DEDUP_SNAPSHOT_SECONDS = 60
+
+# Seconds between saves of relay cursors
+CURSOR_SAVE_SECONDS = 15
+
+# Seconds between stats reports from a shard to the supervisor
+STATS_REPORT_SECONDS = 5
+
 @dataclass
 class BotStatus:
     """Container for bot status information."""
     
     running: bool = True
-    note_id: Optional[str] = None
-    relay_manager: Optional[RelayManager] = None
+    campaigns: Optional[CampaignRegistry] = None
+    relay_pool: Optional[RelayPool] = None
+    payment_pool: Optional[PaymentWorkerPool] = None
+    verifier: Optional[EventVerifier] = None
+    profiles: Optional[ProfileResolver] = None
+    task: Optional[asyncio.Task] = None
+    ready: bool = False  # Enough relays connected to be listening
+    started_at: float = 0.0  # time.monotonic() when the event loop started
+    shard: Optional[Shard] = None  # Set when running as one of several processes
 
 # Global bot status
 bot_status = BotStatus()
 
-def signal_handler(signum: int, frame) -> None:
+def signal_handler(signum: int, frame=None) -> None:
     """Handle shutdown signals gracefully.
     
     Args:
         signum: Signal number
         frame: Current stack frame
     """
+    if not bot_status.running:
+        # Already shutting down; a second cancel would interrupt cleanup
+        return
     logger.info(f"Received signal {signum}, shutting down...")
     bot_status.running = False
+    if bot_status.task:
+        bot_status.task.cancel()
 
-def setup_relays() -> RelayManager:
-    """Initialize and connect to Nostr relays.
+def setup_relays(db: Database, campaigns: CampaignRegistry) -> RelayPool:
+    """Create the relay pool and start connecting to Nostr relays.
+    
+    All relays connect concurrently on the running event loop and are
+    reconnected automatically if they drop.
     
+    Args:
+        db: Database holding the saved relay cursors
+        campaigns: Registry of watched notes; events that mention none of
+            them are dropped before decoding
+        
     Returns:
-        Configured RelayManager instance
+        Started RelayPool instance
         
     Raises:
-        RuntimeError: If relay connection fails
+        RuntimeError: If no relays are configured
+    """
+    config = get_config()
+    
+    dedup = EventDeduplicator(
+        window_seconds=config.dedup_window_hours * 3600,
+        max_entries=config.dedup_max_entries
+    )
+    if dedup_snapshot_path():
+        dedup.load(dedup_snapshot_path())
+    
+    # Subscriptions resume where each relay left off
+    cursors = RelayCursors(overlap_seconds=config.relay_cursor_overlap_seconds)
+    cursors.load(db.get_relay_cursors())
+    
+    relay_pool = RelayPool(
+        config.nostr_relay_urls,
+        dedup=dedup,
+        watched=campaigns,
+        cursors=cursors,
+        backups=config.nostr_backup_relay_urls
+    )
+    
+    if not relay_pool.relays:
+        raise RuntimeError("No relays configured")
+        
+    relay_pool.start()
+    return relay_pool
+
+def setup_profiles(db: Database) -> Optional[ProfileResolver]:
+    """Start recipient profile lookups if they are enabled.
+    
+    Profiles are fetched over their own relay connections so lookups never
+    wait behind repost traffic.
+    
+    Args:
+        db: Database the profiles are persisted to
+        
+    Returns:
+        Started ProfileResolver, or None when PROFILE_CACHE_HOURS is 0
+    """
+    config = get_config()
+    if not config.profile_cache_hours:
+        return None
+    
+    cache = ProfileCache(
+        ttl=config.profile_cache_hours * 3600,
+        negative_ttl=config.profile_negative_cache_minutes * 60,
+        max_entries=config.profile_cache_size
+    )
+    # Profiles are only refetched after they expire, so duplicates need
+    # remembering just for the length of one lookup
+    relay_pool = RelayPool(
+        config.nostr_relay_urls,
+        dedup=EventDeduplicator(window_seconds=config.profile_fetch_timeout * 2)
+    )
+    resolver = ProfileResolver(
+        relay_pool,
+        db,
+        cache,
+        batch_seconds=config.profile_batch_ms / 1000,
+        max_batch=config.profile_batch_size,
+        fetch_timeout=config.profile_fetch_timeout
+    )
+    resolver.start()
+    return resolver
+
+def load_campaigns(db: Database, note_ids: List[str], shard: Optional[Shard] = None) -> List[Campaign]:
+    """Combine configured note IDs with active campaigns from the database.
+    
+    Args:
+        db: Database holding campaign definitions
+        note_ids: Note IDs configured through the environment
+        shard: Only return campaigns for notes this shard owns
+        
+    Returns:
+        List of campaigns to watch (database entries take precedence)
+    """
+    campaigns = {note_id: Campaign(note_id=note_id) for note_id in note_ids}
+    for campaign in db.get_active_campaigns():
+        campaigns[campaign.note_id] = campaign
+    if shard is not None:
+        return [c for c in campaigns.values() if shard.owns(c.note_id)]
+    return list(campaigns.values())
+
+async def refresh_campaigns(
+    db: Database,
+    note_ids: List[str],
+    campaigns: CampaignRegistry,
+    relay_pool: RelayPool
+) -> None:
+    """Periodically pick up campaigns added or removed in the database.
+    
+    Args:
+        db: Database holding campaign definitions
+        note_ids: Note IDs configured through the environment
+        campaigns: Registry to update
+        relay_pool: Relay pool whose subscriptions follow the registry
+    """
+    interval = get_config().campaign_refresh_seconds
+    
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            active = await asyncio.to_thread(load_campaigns, db, note_ids, bot_status.shard)
+            campaigns.replace(active)
+            await asyncio.to_thread(get_budget_ledger().set_budgets, active)
+            await update_subscriptions(campaigns, relay_pool)
+        except Exception as e:
+            logger.error(f"Error refreshing campaigns: {str(e)}")
+
+def dedup_snapshot_path() -> str:
+    """Return this process's dedup snapshot path.
+    
+    Returns:
+        The configured path, suffixed with the shard index when sharded,
+        or an empty string if snapshots are disabled
+    """
+    path = get_config().dedup_snapshot_path
+    if path and bot_status.shard is not None:
+        return f"{path}.{bot_status.shard.index}"
+    return path
+
+def save_dedup_snapshot(dedup: EventDeduplicator) -> None:
+    """Persist recently seen event IDs if a snapshot path is configured.
+    
+    Args:
+        dedup: The relay pool's deduplicator
+    """
+    path = dedup_snapshot_path()
+    if not path:
+        return
+    try:
+        dedup.save(path)
+        logger.debug(f"Saved dedup snapshot ({dedup.stats()})")
+    except OSError as e:
+        logger.error(f"Failed to save dedup snapshot: {str(e)}")
+
+async def snapshot_dedup(dedup: EventDeduplicator) -> None:
+    """Periodically persist the dedup state so restarts skip replayed events.
+    
+    Args:
+        dedup: The relay pool's deduplicator
+    """
+    while True:
+        await asyncio.sleep(DEDUP_SNAPSHOT_SECONDS)
+        save_dedup_snapshot(dedup)
+
+def save_relay_cursors(db: Database, changed: List[Tuple[str, str, int]]) -> None:
+    """Persist relay cursors that changed since the last save.
+    
+    Args:
+        db: Database holding the relay cursors
+        changed: Changed cursors, from RelayCursors.take_dirty
+    """
+    if not changed:
+        return
+    try:
+        db.save_relay_cursors(changed)
+        logger.debug(f"Saved {len(changed)} relay cursors")
+    except Exception as e:
+        logger.error(f"Failed to save relay cursors: {str(e)}")
+
+async def persist_cursors(db: Database, cursors: RelayCursors) -> None:
+    """Periodically persist relay cursors so restarts resume with since.
+    
+    Args:
+        db: Database holding the relay cursors
+        cursors: The relay pool's cursors
+    """
+    while True:
+        await asyncio.sleep(CURSOR_SAVE_SECONDS)
+        # Collect on the loop, which owns the cursors; write off it
+        await asyncio.to_thread(save_relay_cursors, db, cursors.take_dirty())
+
+async def manage_relays(relay_pool: RelayPool) -> None:
+    """Periodically replace unhealthy or redundant relays with backups.
+    
+    Args:
+        relay_pool: The relay pool to rebalance
+    """
+    config = get_config()
+    scorer = RelayScorer(
+        min_active=config.relay_min_active,
+        min_age=config.relay_evaluate_seconds
+    )
+    
+    while True:
+        await asyncio.sleep(config.relay_evaluate_seconds)
+        try:
+            await relay_pool.rebalance(scorer)
+            logger.info(f"Relay health: {relay_pool.health_report()}")
+        except Exception as e:
+            logger.error(f"Error rebalancing relays: {str(e)}")
+
+async def wait_for_relays(relay_pool: RelayPool) -> None:
+    """Mark the bot ready once a quorum of relays is connected.
+    
+    Subscriptions are sent to each relay as it connects, so events are
+    received before this returns; readiness tells health checks (and a
+    rolling deploy) that the bot is listening. Relays still connecting at
+    the deadline are subscribed whenever they come up.
+    
+    Args:
+        relay_pool: The relay pool being connected
+    """
+    config = get_config()
+    quorum = min(config.relay_ready_quorum, len(relay_pool.relays))
+    connected = await relay_pool.wait_connected(quorum, config.relay_ready_timeout)
+    elapsed = time.monotonic() - bot_status.started_at
+    metrics.STAGE_SECONDS.observe(elapsed, "startup")
+    bot_status.ready = True
+    if connected >= quorum:
+        logger.info(f"Listening on {connected} of {len(relay_pool.relays)} relays after {elapsed:.2f}s")
+    else:
+        logger.warning(
+            f"Only {connected} of {len(relay_pool.relays)} relays connected after "
+            f"{elapsed:.2f}s; the rest are subscribed when they connect"
+        )
+
+async def start_payments(db: Database, payment_pool: PaymentWorkerPool) -> None:
+    """Load payment state, then start the payment workers and resume payments.
+    
+    Runs while relays connect. The database reads and the LNbits client
+    import happen in a thread so they never hold up the event loop.
+    
+    Args:
+        db: Database holding payment history and the outbox
+        payment_pool: Worker pool that runs handle_repost_event
+    """
+    shard = bot_status.shard
+    
+    def load() -> None:
+        # Load users still inside their rate-limit window
+        get_rate_limiter().warm(shard.owns if shard else None)
+        # Track the campaign budgets checked before each payment
+        get_budget_ledger().set_budgets(bot_status.campaigns)
+        # Open the LNbits session before the first payment needs it
+        from backend.ln_wallet.wallet import get_client
+        get_client()
+    
+    await asyncio.to_thread(load)
+    payment_pool.start()
+    await resume_payments(db, payment_pool)
+
+async def resume_payments(db: Database, payment_pool: PaymentWorkerPool) -> None:
+    """Queue outbox entries left unfinished by a previous run.
+    
+    This runs while relays already deliver reposts; entries they queued in
+    the meantime are dropped by the pool as duplicates. Submitted entries
+    whose lease has not run out yet are skipped by the workers and picked
+    up later by redrive_payments.
+    
+    Args:
+        db: Database holding the payment outbox
+        payment_pool: Worker pool that runs handle_repost_event
+    """
+    entries = await asyncio.to_thread(db.get_unfinished_outbox_entries)
+    await submit_entries(entries, payment_pool, "unfinished")
+
+async def redrive_payments(db: Database, payment_pool: PaymentWorkerPool) -> None:
+    """Periodically queue outbox entries that no worker is driving.
+    
+    These are entries postponed while the LNbits circuit was open, which
+    are due again once the circuit has had time to close, and entries
+    untouched for a whole lease, whose worker or queue went away.
+    
+    Args:
+        db: Database holding the payment outbox
+        payment_pool: Worker pool that runs handle_repost_event
     """
-    relay_manager = RelayManager()
+    config = get_config()
+    interval = config.lnbits_breaker_reset_seconds
     
-    for url in config.nostr_relay_urls:
+    while True:
+        await asyncio.sleep(interval)
         try:
-            relay_manager.add_relay(url)
-            logger.info(f"Connected to relay: {url}")
+            entries = await asyncio.to_thread(
+                db.get_stale_outbox_entries, interval, config.outbox_lease_seconds
+            )
+            await submit_entries(entries, payment_pool, "postponed or stalled")
         except Exception as e:
-            logger.error(f"Failed to connect to relay {url}: {str(e)}")
+            logger.error(f"Error re-driving payments: {str(e)}")
+
+async def submit_entries(entries: List[OutboxEntry], payment_pool: PaymentWorkerPool, kind: str) -> None:
+    """Queue this process's share of outbox entries for payment.
     
-    if not relay_manager.relays:
-        raise RuntimeError("Failed to connect to any relays")
+    Args:
+        entries: Outbox entries to drive
+        payment_pool: Worker pool that runs handle_repost_event
+        kind: Description of the entries for the log
+    """
+    if bot_status.shard is not None:
+        entries = [entry for entry in entries if bot_status.shard.owns(entry.note_id)]
+    if entries:
+        logger.info(f"Resuming {len(entries)} {kind} payments")
+    for entry in entries:
+        await payment_pool.submit(entry)
+
+def create_reconciler(db: Database) -> "PaymentReconciler":
+    """Build the payment reconciler from the configuration.
+    
+    Args:
+        db: Database holding the payments
         
-    return relay_manager
+    Returns:
+        PaymentReconciler using the shared LNbits client
+    """
+    from backend.ln_wallet.reconcile import PaymentReconciler
+    from backend.ln_wallet.wallet import get_client
+    
+    config = get_config()
+    return PaymentReconciler(
+        db,
+        get_client(),
+        page_size=config.reconcile_page_size,
+        concurrency=config.reconcile_concurrency
+    )
+
+async def reconcile_payments(db: Database) -> None:
+    """Periodically update pending payments with their status in LNbits.
+    
+    Payments found paid are added to the rate-limit cache right away.
+    
+    Args:
+        db: Database holding the payments
+    """
+    config = get_config()
+    reconciler = await asyncio.to_thread(create_reconciler, db)
+    rate_limiter = get_rate_limiter()
+    
+    try:
+        while True:
+            await asyncio.sleep(config.reconcile_interval_seconds)
+            try:
+                result = await asyncio.to_thread(reconciler.reconcile)
+            except Exception as e:
+                logger.error(f"Error reconciling payments: {str(e)}")
+                continue
+            for status, count in result.changed.items():
+                metrics.PAYMENTS_RECONCILED.inc(status, amount=count)
+            for npub, note_id, created_at in result.paid:
+                rate_limiter.record(npub, note_id, created_at)
+    finally:
+        await asyncio.to_thread(reconciler.close)
+
+def register_queue_gauges() -> None:
+    """Report pipeline queue depths through the metrics registry."""
+    metrics.QUEUE_DEPTH.set_function(lambda: bot_status.relay_pool.queue.qsize(), "relay")
+    metrics.QUEUE_DEPTH.set_function(lambda: bot_status.verifier.queue.qsize(), "verify")
+    metrics.QUEUE_DEPTH.set_function(lambda: bot_status.payment_pool.depth, "payment")
+
+def start_metrics_server():
+    """Serve metrics over HTTP if a port is configured.
+    
+    Returns:
+        The metrics server, or None when metrics are disabled
+    """
+    config = get_config()
+    if not config.metrics_port:
+        return None
+    return metrics.start_http_server(config.metrics_port, config.metrics_host)
+
+def pipeline_stats() -> Dict[str, Any]:
+    """Collect relay and pipeline statistics on the bot's event loop.
+    
+    Returns:
+        Statistics per pipeline stage
+    """
+    return {
+        "running": True,
+        "ready": bot_status.ready,
+        "relays": bot_status.relay_pool.stats(),
+        "relay_health": bot_status.relay_pool.health_report(),
+        "verifier": bot_status.verifier.stats(),
+        "payments": bot_status.payment_pool.stats(),
+        "rate_limiter": get_rate_limiter().stats(),
+        "budget": get_budget_ledger().stats(),
+        "profiles": bot_status.profiles.stats() if bot_status.profiles else None,
+    }
 
-def run_bot(note_id: str) -> None:
+def pipeline_health() -> Dict[str, Any]:
+    """Collect relay and pipeline statistics for the stats API.
+    
+    Called from API threads; the statistics are read on the bot's event
+    loop, which owns the relay pool and worker queues.
+    
+    Returns:
+        Statistics per pipeline stage, or {"running": False} when stopped
+    """
+    task = bot_status.task
+    if task is None or task.done() or not bot_status.relay_pool:
+        return {"running": False}
+    
+    async def collect() -> Dict[str, Any]:
+        return pipeline_stats()
+    
+    future = asyncio.run_coroutine_threadsafe(collect(), task.get_loop())
+    return future.result(timeout=5)
+
+async def report_stats(stats_queue) -> None:
+    """Periodically send this shard's metrics and statistics to the supervisor.
+    
+    Args:
+        stats_queue: multiprocessing queue read by the supervisor
+    """
+    while True:
+        await asyncio.sleep(STATS_REPORT_SECONDS)
+        try:
+            stats_queue.put_nowait((bot_status.shard.index, metrics.REGISTRY.snapshot(), pipeline_stats()))
+        except Exception as e:
+            logger.error(f"Error reporting shard stats: {str(e)}")
+
+def start_stats_api():
+    """Serve the read-only stats API if a port is configured.
+    
+    Returns:
+        (server, API), or (None, None) when the API is disabled
+    """
+    config = get_config()
+    if not config.api_port:
+        return None, None
+    from backend.api.server import StatsAPI, start_api_server
+    
+    api_db = Database(config.db_path, read_only=True)
+    api = StatsAPI(api_db, health=pipeline_health, cache_seconds=config.api_cache_seconds)
+    return start_api_server(api, config.api_port, config.api_host), api
+
+async def _run(db: Database, note_ids: List[str], stats_queue=None) -> None:
+    """Connect to relays and monitor reposts until cancelled.
+    
+    Args:
+        db: Database holding campaign definitions
+        note_ids: Note IDs configured through the environment
+        stats_queue: Queue to report statistics to when running as a shard
+    """
+    loop = asyncio.get_running_loop()
+    bot_status.task = asyncio.current_task()
+    bot_status.started_at = time.monotonic()
+    
+    # Set up signal handlers
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, signal_handler, signum)
+    
+    config = get_config()
+    
+    try:
+        # Relays connect first; the rest of startup runs while they do
+        bot_status.relay_pool = setup_relays(db, bot_status.campaigns)
+        
+        # Recipients' lightning addresses are looked up as reposts arrive
+        bot_status.profiles = setup_profiles(db)
+        
+        # Payments run on their own workers, decoupled from event intake;
+        # reposts verified before the workers start wait in their queue.
+        # Only the lightning_address payout mode sends sats to the addresses.
+        payout_profiles = bot_status.profiles if config.payout_mode == "lightning_address" else None
+        bot_status.payment_pool = PaymentWorkerPool(
+            functools.partial(handle_repost_event, profiles=payout_profiles),
+            workers=config.payment_workers,
+            queue_size=config.payment_queue_size,
+            key=attrgetter("npub"),
+            job_id=attrgetter("id")
+        )
+        
+        # Reposts are paid only after their ID and signature check out
+        bot_status.verifier = EventVerifier(
+            functools.partial(
+                accept_repost,
+                relay_pool=bot_status.relay_pool,
+                payment_pool=bot_status.payment_pool,
+                profiles=bot_status.profiles
+            ),
+            workers=config.verify_workers,
+            batch_size=config.verify_batch_size
+        )
+        bot_status.verifier.start()
+        
+        register_queue_gauges()
+        
+        # Subscriptions go out to each relay as soon as it connects
+        tasks = [
+            subscribe_to_reposts(
+                bot_status.campaigns, bot_status.relay_pool, bot_status.verifier
+            ),
+            wait_for_relays(bot_status.relay_pool),
+            start_payments(db, bot_status.payment_pool),
+            redrive_payments(db, bot_status.payment_pool),
+            refresh_campaigns(db, note_ids, bot_status.campaigns, bot_status.relay_pool),
+            snapshot_dedup(bot_status.relay_pool.dedup),
+            persist_cursors(db, bot_status.relay_pool.cursors),
+            manage_relays(bot_status.relay_pool)
+        ]
+        # Pending payments are reconciled by one process only
+        if config.reconcile_interval_seconds and (bot_status.shard is None or bot_status.shard.index == 0):
+            tasks.append(reconcile_payments(db))
+        if stats_queue is not None:
+            tasks.append(report_stats(stats_queue))
+        
+        # Monitor reposts; returns only when cancelled or on fatal errors
+        await asyncio.gather(*tasks)
+        
+    except asyncio.CancelledError:
+        logger.info("Bot stopped")
+        
+    finally:
+        if bot_status.relay_pool:
+            await bot_status.relay_pool.close()
+            logger.info(f"Closed relay connections ({bot_status.relay_pool.stats()})")
+            save_dedup_snapshot(bot_status.relay_pool.dedup)
+            save_relay_cursors(db, bot_status.relay_pool.cursors.take_dirty())
+            
+        if bot_status.verifier:
+            await bot_status.verifier.close()
+            logger.info(f"Stopped event verifier ({bot_status.verifier.stats()})")
+            
+        if bot_status.payment_pool:
+            await bot_status.payment_pool.close()
+            logger.info(f"Stopped payment workers ({bot_status.payment_pool.stats()})")
+            
+        if bot_status.profiles:
+            await bot_status.profiles.close()
+            logger.info(f"Stopped profile lookups ({bot_status.profiles.stats()})")
+
+def run_bot(
+    note_ids: Optional[List[str]] = None,
+    shard: Optional[Shard] = None,
+    stats_queue=None
+) -> None:
     """Run the main bot loop.
     
     Args:
-        note_id: The ID of the note to monitor for reposts
+        note_ids: IDs of notes to monitor for reposts in addition to the
+            active campaigns stored in the database
+        shard: When running as one of several processes, the share of the
+            notes this process handles; the supervisor serves metrics and
+            the stats API instead
+        stats_queue: Queue the shard reports statistics to
     """
-    logger.info(f"Starting AutoZap bot (monitoring note: {note_id[:8]}...)")
+    config = get_config()
+    if note_ids is None:
+        note_ids = config.watch_note_ids
     
     # Initialize database
-    db = Database(config.db_path)
+    db = get_database(config.db_path)
     logger.info(f"Initialized database at {config.db_path}")
     
+    bot_status.shard = shard
+    bot_status.campaigns = CampaignRegistry(
+        load_campaigns(db, note_ids, shard),
+        chunk_size=config.relay_filter_chunk_size
+    )
+    # A shard may start with no notes and pick some up when campaigns change
+    if not bot_status.campaigns and shard is None:
+        raise RuntimeError("No campaigns to watch (set WATCH_NOTE_IDS or add campaigns)")
+    
+    if shard is None:
+        logger.info(f"Starting AutoZap bot (monitoring {len(bot_status.campaigns)} notes)")
+        metrics_server = start_metrics_server()
+        api_server, api = start_stats_api()
+    else:
+        logger.info(f"Starting AutoZap shard {shard.index} (monitoring {len(bot_status.campaigns)} notes)")
+        if config.metrics_port:
+            metrics.enable()
+        metrics_server = api_server = None
+    
     try:
-        # Set up relay connections
-        bot_status.relay_manager = setup_relays()
-        bot_status.note_id = note_id
-        
-        # Set up signal handlers
-        signal.signal(signal.SIGINT, signal_handler)
-        signal.signal(signal.SIGTERM, signal_handler)
+        asyncio.run(_run(db, note_ids, stats_queue))
         
-        # Start monitoring reposts
-        subscribe_to_reposts(note_id, bot_status.relay_manager)
-        
-        # Main bot loop
-        while bot_status.running:
-            try:
-                bot_status.relay_manager.run_sync()
-                time.sleep(1)  # Prevent CPU thrashing
-            except Exception as e:
-                logger.error(f"Error in main loop: {str(e)}")
-                time.sleep(5)  # Back off on error
-                
     except NostrEventError as e:
         logger.error(f"Fatal Nostr event error: {str(e)}")
         sys.exit(1)
@@ -109,17 +679,22 @@ def run_bot(note_id: str) -> None:
         sys.exit(1)
         
     finally:
-        if bot_status.relay_manager:
-            bot_status.relay_manager.close_connections()
-            logger.info("Closed relay connections")
+        if metrics_server:
+            metrics_server.shutdown()
+        if api_server:
+            api_server.shutdown()
+            api.close()
+            api.db.close()
+        db.close()
 
 def main() -> None:
     """Main entry point for the bot."""
-    # Default note ID to monitor
-    note_id = "0987e3bd97d23819c65b50361b17c9a6ba693e2b72665802a12765836301bf94"
-    
     try:
-        run_bot(note_id)
+        if get_config().shards > 1:
+            from backend.nostr_bot.supervisor import run_supervisor
+            run_supervisor(get_config().shards)
+        else:
+            run_bot()
     except KeyboardInterrupt:
         logger.info("Bot shutdown requested")
     except Exception as e:
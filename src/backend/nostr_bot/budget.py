@@ -0,0 +1,183 @@
+"""Spend budgets for AutoZap.
+
+This module checks campaign budgets and per UTC hour and day spend limits
+before each payment. The amount is reserved in the database before LNbits
+is called: one write transaction adds up what was paid and what every
+process holds in flight, and records the reservation only if every
+applicable limit allows it. Bot shards and backfills sharing a database
+therefore never overspend together, and each can use the full limits. An
+in-memory ledger would be faster but cannot see other processes' spend;
+the check is one short write transaction on indexed totals, small next to
+the LNbits call it guards, and is skipped when no limit applies. Failed and
+expired payments do not count.
+
+A reservation belongs to an outbox entry. It is dropped in the same
+transaction that records the entry's payment or finishes it unpaid, so
+spend is never counted twice or lost. An entry interrupted by a crash keeps
+its reservation until a takeover finishes it, which errs on the side of
+not paying.
+"""
+
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from backend.db.models import Campaign, Database
+
+logger = logging.getLogger(__name__)
+
+# A spend limit applies to a scope (kind, key): ("note", note_id),
+# ("hour", start) or ("day", YYYY-MM-DD)
+Scope = Tuple[str, str]
+
+@dataclass(frozen=True)
+class Reservation:
+    """Amount held against every limit that applied to one payment."""
+
+    entry_id: int
+    amount: int
+    scopes: Tuple[Scope, ...]
+
+class BudgetLedger:
+    """Checks payments against spend limits shared through the database."""
+
+    def __init__(
+        self,
+        db: Database,
+        hourly_limit: int = 0,
+        daily_limit: int = 0,
+        clock: Callable[[], float] = time.time
+    ):
+        """Initialize a ledger without campaign budgets.
+
+        Args:
+            db: Database holding payment history and reservations
+            hourly_limit: Satoshis that may be paid per UTC hour (0 for no limit)
+            daily_limit: Satoshis that may be paid per UTC day (0 for no limit)
+            clock: Source of the current Unix time
+        """
+        if hourly_limit < 0 or daily_limit < 0:
+            raise ValueError("limits must not be negative")
+
+        self.db = db
+        self.hourly_limit = hourly_limit
+        self.daily_limit = daily_limit
+        self.clock = clock
+        self.reservations = 0
+        self.rejections = 0
+        self.in_flight = 0  # Satoshis this process reserved and has not finished
+        self._budgets: Dict[str, int] = {}  # note_id -> campaign budget
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _hour(now: float) -> Scope:
+        return ("hour", str(int(now) // 3600 * 3600))
+
+    @staticmethod
+    def _day(now: float) -> Scope:
+        return ("day", datetime.fromtimestamp(now, timezone.utc).date().isoformat())
+
+    def _limits(self, note_id: str, now: float) -> List[Tuple[Scope, int]]:
+        limits = []
+        budget = self._budgets.get(note_id)
+        if budget is not None:
+            limits.append((("note", note_id), budget))
+        if self.hourly_limit:
+            limits.append((self._hour(now), self.hourly_limit))
+        if self.daily_limit:
+            limits.append((self._day(now), self.daily_limit))
+        return limits
+
+    def reserve(self, note_id: str, amount: int, entry_id: int) -> Optional[Reservation]:
+        """Hold an amount for a payment if every applicable limit allows it.
+
+        Args:
+            note_id: The note the payment is for
+            amount: Payment amount in satoshis
+            entry_id: The outbox entry being paid; reserving again for the
+                same entry replaces its earlier reservation
+
+        Returns:
+            The Reservation, or None if a budget or window limit would be
+            exceeded
+        """
+        now = self.clock()
+        limits = self._limits(note_id, now)
+        # Without limits there is nothing to hold, so the database is skipped
+        if limits and not self.db.reserve_budget(
+            entry_id, note_id, amount,
+            [(kind, key, limit) for (kind, key), limit in limits],
+            int(now)
+        ):
+            with self._lock:
+                self.rejections += 1
+            return None
+        with self._lock:
+            self.reservations += 1
+            self.in_flight += amount
+        return Reservation(entry_id, amount, tuple(scope for scope, _ in limits))
+
+    def commit(self, reservation: Reservation) -> None:
+        """Stop tracking a reservation whose payment was made.
+
+        Call this after the payment has been written; writing it through
+        Database.complete_outbox_entry() already turned the held amount
+        into spend.
+
+        Args:
+            reservation: The reservation returned by reserve()
+        """
+        with self._lock:
+            self.in_flight -= reservation.amount
+
+    def release(self, reservation: Reservation) -> None:
+        """Return a reservation whose payment was not made.
+
+        Args:
+            reservation: The reservation returned by reserve()
+        """
+        if reservation.scopes:
+            self.db.release_budget(reservation.entry_id)
+        with self._lock:
+            self.in_flight -= reservation.amount
+
+    def set_budgets(self, campaigns: Iterable[Campaign]) -> None:
+        """Track the budgets of the given campaigns.
+
+        Args:
+            campaigns: All watched campaigns; those without a budget are
+                only subject to the hourly and daily limits
+        """
+        budgets = {c.note_id: c.budget for c in campaigns if c.budget is not None}
+        with self._lock:
+            self._budgets = budgets
+
+    def remaining(self, note_id: str) -> Optional[int]:
+        """Return how much more can be paid for a note right now.
+
+        Args:
+            note_id: The note to check
+
+        Returns:
+            Satoshis left under the tightest applicable limit, or None if
+            no limit applies
+        """
+        limits = self._limits(note_id, self.clock())
+        left = [limit - self.db.get_budget_spent(kind, key) for (kind, key), limit in limits]
+        return max(0, min(left)) if left else None
+
+    def stats(self) -> Dict[str, int]:
+        """Return ledger counters.
+
+        Returns:
+            Dictionary with reservations, rejections, satoshis reserved by
+            this process and budgeted campaigns
+        """
+        return {
+            "reservations": self.reservations,
+            "rejections": self.rejections,
+            "reserved": self.in_flight,
+            "budgeted_campaigns": len(self._budgets),
+        }
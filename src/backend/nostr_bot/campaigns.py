@@ -0,0 +1,129 @@
+"""Campaign registry for AutoZap.
+
+This module keeps the set of watched notes in a hash index so matching an
+event costs O(tags) regardless of how many notes are watched, and splits the
+notes into stable, size-limited chunks for relay subscriptions.
+"""
+
+import logging
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+from backend.db.models import Campaign
+
+logger = logging.getLogger(__name__)
+
+class CampaignRegistry:
+    """Index of active campaigns keyed by note ID."""
+
+    def __init__(self, campaigns: Iterable[Campaign] = (), chunk_size: int = 256):
+        """Initialize the registry.
+
+        Args:
+            campaigns: Campaigns to start with
+            chunk_size: Maximum number of note IDs per relay filter
+        """
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1")
+
+        self.chunk_size = chunk_size
+        self._campaigns: Dict[str, Campaign] = {}
+        # Stable chunk assignment so one change only resubscribes one chunk
+        self._chunks: List[Set[str]] = []
+        self._chunk_of: Dict[str, int] = {}
+        self._dirty: Set[int] = set()
+
+        for campaign in campaigns:
+            self.add(campaign)
+
+    def __contains__(self, note_id: str) -> bool:
+        return note_id in self._campaigns
+
+    def __len__(self) -> int:
+        return len(self._campaigns)
+
+    def __iter__(self) -> Iterator[Campaign]:
+        return iter(list(self._campaigns.values()))
+
+    @property
+    def note_ids(self) -> List[str]:
+        """IDs of all watched notes."""
+        return list(self._campaigns)
+
+    def get(self, note_id: str) -> Optional[Campaign]:
+        """Look up the campaign for a note.
+
+        Args:
+            note_id: The note ID to look up
+
+        Returns:
+            The Campaign, or None if the note is not watched
+        """
+        return self._campaigns.get(note_id)
+
+    def add(self, campaign: Campaign) -> None:
+        """Add or update a campaign.
+
+        Args:
+            campaign: The campaign to watch
+        """
+        note_id = campaign.note_id
+        self._campaigns[note_id] = campaign
+        if note_id in self._chunk_of:
+            return
+
+        for index, chunk in enumerate(self._chunks):
+            if len(chunk) < self.chunk_size:
+                break
+        else:
+            index = len(self._chunks)
+            self._chunks.append(set())
+
+        self._chunks[index].add(note_id)
+        self._chunk_of[note_id] = index
+        self._dirty.add(index)
+
+    def remove(self, note_id: str) -> Optional[Campaign]:
+        """Stop watching a note.
+
+        Args:
+            note_id: The note ID to remove
+
+        Returns:
+            The removed Campaign, or None if it was not watched
+        """
+        campaign = self._campaigns.pop(note_id, None)
+        index = self._chunk_of.pop(note_id, None)
+        if index is not None:
+            self._chunks[index].discard(note_id)
+            self._dirty.add(index)
+        return campaign
+
+    def replace(self, campaigns: Iterable[Campaign]) -> None:
+        """Make the registry match the given set of campaigns.
+
+        Args:
+            campaigns: The complete set of campaigns that should be watched
+        """
+        wanted = {campaign.note_id: campaign for campaign in campaigns}
+        for note_id in [n for n in self._campaigns if n not in wanted]:
+            self.remove(note_id)
+        for campaign in wanted.values():
+            self.add(campaign)
+
+    def take_dirty_chunks(self) -> Dict[int, List[str]]:
+        """Return chunks changed since the last call and mark them clean.
+
+        Returns:
+            Mapping of chunk index to its sorted note IDs (empty if the
+            chunk no longer holds any notes)
+        """
+        dirty = {index: sorted(self._chunks[index]) for index in sorted(self._dirty)}
+        self._dirty.clear()
+        return dirty
+
+    def chunks(self) -> Dict[int, List[str]]:
+        """Return all non-empty chunks.
+
+        Returns:
+            Mapping of chunk index to its sorted note IDs
+        """
+        return {index: sorted(chunk) for index, chunk in enumerate(self._chunks) if chunk}
@@ -0,0 +1,159 @@
+"""Relay subscription cursors for AutoZap.
+
+This module remembers, per relay and watched note, the newest event time
+the bot has received, so subscriptions can resume with ``since`` instead of
+asking relays for their whole stored history after every restart or
+reconnect. Events a relay sends before its EOSE are catch-up; cursor
+advances from catch-up are only kept once the relay signals that it has
+sent everything stored, so an interrupted catch-up is repeated in full.
+"""
+
+import logging
+import time
+from typing import Callable, Dict, Iterable, List, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+class RelayCursors:
+    """Newest received event time per relay and note."""
+
+    def __init__(self, overlap_seconds: int = 600, clock: Callable[[], float] = time.time):
+        """Initialize empty cursors.
+
+        Args:
+            overlap_seconds: How far before a cursor subscriptions resume,
+                covering events still in flight when the cursor was saved
+                and relays with skewed clocks
+            clock: Source of the current Unix time
+        """
+        self.overlap_seconds = overlap_seconds
+        self.clock = clock
+        # url -> note_id -> newest created_at
+        self._cursors: Dict[str, Dict[str, int]] = {}
+        # Advances held back until the relay's catch-up finishes
+        self._pending: Dict[str, Dict[str, int]] = {}
+        # url -> subscriptions still sending stored events
+        self._catching_up: Dict[str, Set[str]] = {}
+        self._dirty: Set[Tuple[str, str]] = set()
+
+    def load(self, rows: Iterable[Tuple[str, str, int]]) -> None:
+        """Load saved cursors.
+
+        Args:
+            rows: (relay URL, note ID, created_at) tuples
+        """
+        for url, note_id, created_at in rows:
+            notes = self._cursors.setdefault(url, {})
+            notes[note_id] = max(created_at, notes.get(note_id, 0))
+
+    def since(self, url: str, note_ids: Iterable[str], default: int) -> int:
+        """Return where a subscription on a relay should resume.
+
+        Args:
+            url: The relay URL
+            note_ids: Notes covered by the subscription
+            default: Start time used when any note has no cursor; also the
+                earliest time ever returned
+
+        Returns:
+            Unix timestamp for the subscription's since filter
+        """
+        notes = self._cursors.get(url, {})
+        cursors = [notes.get(note_id) for note_id in note_ids]
+        if not cursors or None in cursors:
+            return default
+        return max(default, min(cursors) - self.overlap_seconds)
+
+    def start_catch_up(self, url: str, subscription_id: str) -> None:
+        """Record that a relay was sent a subscription request.
+
+        Args:
+            url: The relay URL
+            subscription_id: The requested subscription
+        """
+        self._catching_up.setdefault(url, set()).add(subscription_id)
+
+    def end_catch_up(self, url: str, subscription_id: str) -> None:
+        """Record a relay's EOSE (or CLOSED) for a subscription.
+
+        Once no subscription on the relay is catching up, held back
+        advances are applied and the relay is live.
+
+        Args:
+            url: The relay URL
+            subscription_id: The subscription that finished
+        """
+        catching_up = self._catching_up.get(url)
+        if not catching_up:
+            return
+        catching_up.discard(subscription_id)
+        if catching_up:
+            return
+
+        del self._catching_up[url]
+        for note_id, created_at in self._pending.pop(url, {}).items():
+            self._apply(url, note_id, created_at)
+        logger.debug(f"Relay {url} caught up")
+
+    def disconnected(self, url: str) -> None:
+        """Discard an unfinished catch-up after a relay disconnects.
+
+        Args:
+            url: The relay URL
+        """
+        self._catching_up.pop(url, None)
+        self._pending.pop(url, None)
+
+    def is_live(self, url: str) -> bool:
+        """Whether a relay has delivered all stored events it was asked for."""
+        return not self._catching_up.get(url)
+
+    def advance(self, url: str, note_ids: Iterable[str], created_at: int) -> None:
+        """Record an event from a relay that mentions watched notes.
+
+        Args:
+            url: The relay the event came from
+            note_ids: Watched notes the event mentions
+            created_at: The event's created_at
+        """
+        # A relay cannot move its cursor past now with future-dated events
+        created_at = min(created_at, int(self.clock()))
+
+        if self._catching_up.get(url):
+            pending = self._pending.setdefault(url, {})
+            for note_id in note_ids:
+                if created_at > pending.get(note_id, 0):
+                    pending[note_id] = created_at
+            return
+
+        for note_id in note_ids:
+            self._apply(url, note_id, created_at)
+
+    def _apply(self, url: str, note_id: str, created_at: int) -> None:
+        notes = self._cursors.setdefault(url, {})
+        if created_at > notes.get(note_id, 0):
+            notes[note_id] = created_at
+            self._dirty.add((url, note_id))
+
+    def take_dirty(self) -> List[Tuple[str, str, int]]:
+        """Return cursors changed since the last call and mark them clean.
+
+        Returns:
+            (relay URL, note ID, created_at) tuples to save
+        """
+        dirty = [(url, note_id, self._cursors[url][note_id]) for url, note_id in self._dirty]
+        self._dirty.clear()
+        return dirty
+
+    def stats(self) -> Dict[str, int]:
+        """Return cursor counters.
+
+        Returns:
+            Dictionary with stored cursors, relays still catching up and
+            unsaved changes
+        """
+        return {
+            "cursors": sum(len(notes) for notes in self._cursors.values()),
+            "relays_catching_up": len(self._catching_up),
+            "unsaved": len(self._dirty),
+        }
@@ -0,0 +1,201 @@
+"""Bounded event deduplication for AutoZap.
+
+Relays resend the same events to every subscriber and again after each
+reconnect. This module remembers recently seen event IDs in a rotating set
+of time buckets, so memory stays bounded by the window and an entry cap
+instead of growing with every event the bot has ever seen.
+"""
+
+import logging
+import os
+import struct
+import time
+from array import array
+from collections import deque
+from typing import Callable, Deque, Dict, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Snapshot layout: magic, then per bucket a start time and entry count
+_SNAPSHOT_MAGIC = b"AZDEDUP1"
+_BUCKET_HEADER = struct.Struct("<dI")
+
+class EventDeduplicator:
+    """Time-windowed set of recently seen event IDs."""
+
+    def __init__(
+        self,
+        window_seconds: float = 86400,
+        bucket_count: int = 24,
+        max_entries: int = 200000,
+        clock: Callable[[], float] = time.time
+    ):
+        """Initialize an empty deduplicator.
+
+        Args:
+            window_seconds: How long an event ID is remembered
+            bucket_count: Number of buckets the window is split into; expiry
+                happens one bucket at a time
+            max_entries: Hard cap on remembered IDs; the oldest bucket is
+                dropped early when it is exceeded
+            clock: Source of the current Unix time
+        """
+        if window_seconds <= 0:
+            raise ValueError("window_seconds must be positive")
+        if bucket_count < 1:
+            raise ValueError("bucket_count must be at least 1")
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+
+        self.window_seconds = window_seconds
+        self.bucket_seconds = window_seconds / bucket_count
+        self.max_entries = max_entries
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._size = 0
+        # Oldest bucket first; each holds (start time, ID keys)
+        self._buckets: Deque[Tuple[float, Set[int]]] = deque()
+
+    def __len__(self) -> int:
+        return self._size
+
+    @staticmethod
+    def _key(event_id: str) -> int:
+        # The first 64 bits of a SHA-256 ID are unique enough and take a
+        # fraction of the memory of the hex string
+        try:
+            return int(event_id[:16], 16)
+        except ValueError:
+            return hash(event_id) & 0xFFFFFFFFFFFFFFFF
+
+    def _rotate(self, now: float) -> None:
+        while self._buckets and self._buckets[0][0] <= now - self.window_seconds:
+            self._drop_oldest()
+
+        if not self._buckets or now >= self._buckets[-1][0] + self.bucket_seconds:
+            self._buckets.append((now, set()))
+
+    def _drop_oldest(self) -> None:
+        _, keys = self._buckets.popleft()
+        self._size -= len(keys)
+        self.evictions += len(keys)
+
+    def contains(self, event_id: str) -> bool:
+        """Check whether an event was already seen without remembering it.
+
+        Args:
+            event_id: The hex event ID
+
+        Returns:
+            True if the event is a duplicate
+        """
+        key = self._key(event_id)
+        self._rotate(self.clock())
+
+        for _, keys in self._buckets:
+            if key in keys:
+                self.hits += 1
+                return True
+        return False
+
+    def seen(self, event_id: str) -> bool:
+        """Check whether an event was already seen, remembering it if not.
+
+        Args:
+            event_id: The hex event ID
+
+        Returns:
+            True if the event is a duplicate, False if it is new
+        """
+        key = self._key(event_id)
+        self._rotate(self.clock())
+
+        for _, keys in self._buckets:
+            if key in keys:
+                self.hits += 1
+                return True
+
+        self.misses += 1
+        self._buckets[-1][1].add(key)
+        self._size += 1
+
+        while self._size > self.max_entries:
+            if len(self._buckets) == 1:
+                # Keep the bucket the new ID went into, minus older entries
+                keys = self._buckets[0][1]
+                self.evictions += len(keys) - 1
+                self._size = 1
+                self._buckets[0] = (self._buckets[0][0], {key})
+                break
+            self._drop_oldest()
+
+        return False
+
+    def stats(self) -> Dict[str, int]:
+        """Return dedup counters.
+
+        Returns:
+            Dictionary with hits, misses, evictions and current entries
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": self._size,
+        }
+
+    def save(self, path: str) -> None:
+        """Write a compact snapshot of the remembered IDs.
+
+        The file is replaced atomically, so a crash mid-write leaves the
+        previous snapshot intact.
+
+        Args:
+            path: Snapshot file path
+        """
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_SNAPSHOT_MAGIC)
+            for start, keys in self._buckets:
+                packed = array("Q", keys)
+                f.write(_BUCKET_HEADER.pack(start, len(packed)))
+                packed.tofile(f)
+        os.replace(tmp_path, path)
+
+    def load(self, path: str) -> bool:
+        """Restore IDs from a snapshot, skipping buckets outside the window.
+
+        Args:
+            path: Snapshot file path
+
+        Returns:
+            True if a snapshot was loaded, False if none was usable
+        """
+        if not os.path.exists(path):
+            return False
+
+        cutoff = self.clock() - self.window_seconds
+        try:
+            with open(path, "rb") as f:
+                if f.read(len(_SNAPSHOT_MAGIC)) != _SNAPSHOT_MAGIC:
+                    raise ValueError("not a dedup snapshot")
+                while header := f.read(_BUCKET_HEADER.size):
+                    start, count = _BUCKET_HEADER.unpack(header)
+                    packed = array("Q")
+                    packed.fromfile(f, count)
+                    if start > cutoff:
+                        self._buckets.append((start, set(packed)))
+                        self._size += count
+        except (OSError, ValueError, EOFError, struct.error) as e:
+            logger.warning(f"Ignoring unreadable dedup snapshot {path}: {str(e)}")
+            self._buckets.clear()
+            self._size = 0
+            return False
+
+        while self._size > self.max_entries and len(self._buckets) > 1:
+            self._drop_oldest()
+
+        logger.info(f"Loaded {self._size} recent event IDs from {path}")
+        return True
@@ -3,19 +3,45 @@
 This module handles subscription to and processing of Nostr events.
 """
 
+import asyncio
 import logging
-import uuid
 import time
-from typing import Optional
+from typing import Callable, Iterable, List, Optional, Tuple
 from dataclasses import dataclass
 from nostr.filter import Filter, Filters
-from nostr.event import Event, EventKind
-from nostr.relay_manager import RelayManager
-from nostr.message_pool import EventMessage
-from backend.nostr_bot.transactions import process_payment
+from nostr.event import EventKind
+from backend import metrics
+from backend.config import get_config
+from backend.nostr_bot.campaigns import CampaignRegistry
+from backend.nostr_bot.cursors import RelayCursors
+from backend.nostr_bot.profiles import ProfileResolver
+from backend.nostr_bot.relay_pool import RelayPool, RelayEvent
+from backend.nostr_bot.verify import EventVerifier
+from backend.nostr_bot.wire import WireEvent
+from backend.nostr_bot.workers import PaymentWorkerPool
+from backend.db.models import OutboxEntry
+from backend.nostr_bot.transactions import enqueue_payment, process_payment
 
 logger = logging.getLogger(__name__)
 
+# NIP-18 repost kinds: 6 reposts a text note, 16 is the generic repost
+REPOST_KIND = 6
+GENERIC_REPOST_KIND = 16
+
+# Event kinds that repost a note by tagging it with "e"
+REPOST_KINDS = frozenset({REPOST_KIND, GENERIC_REPOST_KIND})
+
+# Tags that reference the reposted note, by event kind. Text notes only count
+# through the NIP-18 "q" quote tag; an "e" tag on a text note is a reply.
+REPOST_TAGS = {
+    REPOST_KIND: frozenset({"e"}),
+    GENERIC_REPOST_KIND: frozenset({"e"}),
+    EventKind.TEXT_NOTE: frozenset({"q"}),
+}
+
+# Repost subscriptions are named after the registry chunk they cover
+SUBSCRIPTION_PREFIX = "autozap_reposts_"
+
 @dataclass
 class RepostEvent:
     """Container for repost event information."""
@@ -25,116 +51,264 @@ class RepostEvent:
     comment: str
     event_id: str
     created_at: int
+    amount: Optional[int] = None
 
 class NostrEventError(Exception):
     """Base exception for Nostr event handling errors."""
     pass
 
-def extract_repost_info(event: Event, target_note_id: str) -> Optional[RepostEvent]:
+def build_repost_filters(note_ids: Iterable[str], since: Optional[int] = None) -> Filters:
+    """Build relay-side filters matching reposts and quotes of the given notes.
+    
+    Relays only send events whose kind and tags already reference one of the
+    watched notes, instead of every text note on the network.
+    
+    Args:
+        note_ids: IDs of the notes to watch
+        since: Optional Unix timestamp; older events are not requested
+        
+    Returns:
+        Filters for reposts tagging the notes with "e", plus quotes tagging them with "q"
+    """
+    note_ids = list(note_ids)
+    
+    reposts = Filter(
+        kinds=sorted(REPOST_KINDS),
+        event_refs=note_ids,
+        since=since
+    )
+    
+    quotes = Filter(kinds=[EventKind.TEXT_NOTE], since=since)
+    quotes.add_arbitrary_tag("q", note_ids)
+    
+    return Filters([reposts, quotes])
+
+def extract_repost_info(event: WireEvent, campaigns: CampaignRegistry) -> Optional[RepostEvent]:
     """Extract repost information from a Nostr event.
     
+    Relays already filter by kind and tag, so this is only a safety check
+    against relays that ignore or loosely apply subscription filters. Each
+    tag is looked up in the campaign index, so the cost does not depend on
+    how many notes are watched.
+    
     Args:
         event: The Nostr event to analyze
-        target_note_id: The ID of the note we're tracking reposts for
+        campaigns: Registry of the notes we're tracking reposts for
         
     Returns:
-        RepostEvent if the event is a valid repost, None otherwise
+        RepostEvent for the first watched note the event reposts, None otherwise
     """
     try:
-        # Check if this is a repost of our target note
-        is_repost = any(
-            tag[0] == "e" and tag[1] == target_note_id 
-            for tag in event.tags
-        )
-        
-        if not is_repost:
+        tags = REPOST_TAGS.get(event.kind)
+        if tags is None:
             return None
             
-        return RepostEvent(
-            pubkey=event.public_key,
-            note_id=target_note_id,
-            comment=event.content,
-            event_id=event.id,
-            created_at=event.created_at
-        )
+        # Check if this is a repost of one of our watched notes
+        for tag in event.tags:
+            if len(tag) < 2 or tag[0] not in tags:
+                continue
+                
+            campaign = campaigns.get(tag[1])
+            if campaign is None:
+                continue
+                
+            return RepostEvent(
+                pubkey=event.public_key,
+                note_id=campaign.note_id,
+                comment=event.content,
+                event_id=event.id,
+                created_at=event.created_at,
+                amount=campaign.amount
+            )
+            
+        return None
         
     except Exception as e:
         logger.error(f"Error processing event {event.id}: {str(e)}")
         return None
 
-def handle_repost_event(repost: RepostEvent) -> None:
-    """Process a repost event and trigger payment if appropriate.
+def handle_repost_event(entry: OutboxEntry, profiles: Optional[ProfileResolver] = None) -> None:
+    """Process a queued repost and trigger payment if appropriate.
     
     Args:
-        repost: The repost event information
+        entry: The payment outbox entry for the repost
+        profiles: Resolver for the reposter's lightning address; without
+            one, an LNbits invoice is created instead
     """
     try:
         logger.info(
-            f"Processing repost from {repost.pubkey[:8]}... "
-            f"of note {repost.note_id[:8]}..."
+            f"Processing repost from {entry.npub[:8]}... "
+            f"of note {entry.note_id[:8]}..."
         )
         
         # Attempt to process payment
-        result = process_payment(repost.pubkey, repost.note_id)
+        result = process_payment(entry, profiles)
         
         if result is None:
             logger.info("Payment skipped due to rate limiting")
         elif result.success:
             logger.info(
-                f"Successfully initiated payment to {repost.pubkey[:8]}... "
+                f"Successfully initiated payment to {entry.npub[:8]}... "
                 f"(BOLT11: {result.bolt11[:30]}...)"
             )
         else:
             logger.error(
-                f"Payment failed for {repost.pubkey[:8]}...: "
+                f"Payment failed for {entry.npub[:8]}...: "
                 f"{result.error_message}"
             )
             
     except Exception as e:
         logger.error(f"Error handling repost event: {str(e)}")
 
-def subscribe_to_reposts(note_id: str, relay_manager: RelayManager) -> None:
-    """Subscribe to and monitor repost events for a specific note.
+def resume_filters(
+    note_ids: List[str],
+    cursors: RelayCursors,
+    lookback_seconds: int
+) -> Callable[[str], Filters]:
+    """Build a per-relay filter factory that resumes from saved cursors.
     
     Args:
-        note_id: The ID of the note to monitor reposts for
-        relay_manager: The Nostr relay manager instance
+        note_ids: IDs of the notes in the subscription
+        cursors: Per-relay cursors
+        lookback_seconds: How far back to ask relays without a cursor
+        
+    Returns:
+        Function returning the filters for a relay URL, evaluated each
+        time the subscription is sent
     """
-    subscription_id = f"autozap_reposts_{uuid.uuid4().hex}"
+    def filters_for(url: str) -> Filters:
+        default = int(time.time()) - lookback_seconds
+        return build_repost_filters(note_ids, since=cursors.since(url, note_ids, default))
+    return filters_for
+
+async def update_subscriptions(
+    campaigns: CampaignRegistry,
+    relay_pool: RelayPool,
+    since: Optional[int] = None
+) -> None:
+    """Bring relay subscriptions in line with the campaign registry.
     
-    try:
-        # Set up filters for text notes
-        filters = Filters([
-            Filter(kinds=[EventKind.TEXT_NOTE])
-        ])
+    Watched notes are split into chunks that fit relay filter limits, with
+    one subscription per chunk. Only chunks that changed since the last
+    call are resubscribed. If the relay pool keeps cursors and no since is
+    given, each relay resumes from its own cursor.
+    
+    Args:
+        campaigns: Registry of watched notes
+        relay_pool: The relay pool to subscribe on
+        since: Optional Unix timestamp to start from (defaults to the
+            configured repost lookback window)
+    """
+    lookback_seconds = get_config().repost_lookback_hours * 3600
+        
+    for index, note_ids in campaigns.take_dirty_chunks().items():
+        subscription_id = f"{SUBSCRIPTION_PREFIX}{index}"
         
-        # Subscribe to events
-        relay_manager.add_subscription_on_all_relays(subscription_id, filters)
+        if not note_ids:
+            await relay_pool.unsubscribe(subscription_id)
+            continue
+            
+        if since is None and relay_pool.cursors is not None:
+            filters = resume_filters(note_ids, relay_pool.cursors, lookback_seconds)
+        else:
+            start = since if since is not None else int(time.time()) - lookback_seconds
+            filters = build_repost_filters(note_ids, since=start)
+            
+        await relay_pool.subscribe(subscription_id, filters)
         logger.info(
-            f"Monitoring reposts of note {note_id[:8]}... "
+            f"Monitoring reposts of {len(note_ids)} notes "
             f"(Subscription: {subscription_id})"
         )
-        
-        # Allow time for subscription setup
-        time.sleep(1.25)
+
+async def queue_payment(
+    repost: RepostEvent,
+    payment_pool: PaymentWorkerPool,
+    profiles: Optional[ProfileResolver] = None
+) -> None:
+    """Write a verified repost to the payment outbox and hand it to the workers.
+    
+    Reposts already in the outbox are skipped.
+    
+    Args:
+        repost: The verified repost
+        payment_pool: Worker pool that runs handle_repost_event
+        profiles: Resolver to start looking up the reposter's profile on
+    """
+    if profiles is not None:
+        profiles.prefetch(repost.pubkey)
+    start = time.perf_counter()
+    entry = await asyncio.to_thread(
+        enqueue_payment,
+        repost.event_id, repost.pubkey, repost.note_id, repost.amount
+    )
+    metrics.STAGE_SECONDS.observe(time.perf_counter() - start, "outbox_write")
+    if entry:
+        await payment_pool.submit(entry)
+
+async def accept_repost(
+    item: Tuple[RelayEvent, RepostEvent],
+    relay_pool: RelayPool,
+    payment_pool: PaymentWorkerPool,
+    profiles: Optional[ProfileResolver] = None
+) -> None:
+    """Record a verified repost with the relay pool and queue it for payment.
+    
+    Copies that several relays delivered before the first was verified are
+    dropped here.
+    
+    Args:
+        item: The delivered event and the repost matched in it
+        relay_pool: The pool that delivered the event
+        payment_pool: Worker pool that runs handle_repost_event
+        profiles: Resolver to start looking up the reposter's profile on
+    """
+    relay_event, repost = item
+    if relay_pool.accept(relay_event):
+        await queue_payment(repost, payment_pool, profiles)
+
+async def subscribe_to_reposts(
+    campaigns: CampaignRegistry,
+    relay_pool: RelayPool,
+    verifier: EventVerifier,
+    since: Optional[int] = None
+) -> None:
+    """Subscribe to and monitor repost events for all watched notes.
+    
+    Events that match a watched note are handed to the verifier as soon as
+    the relay pool delivers them; only the cheap tag match runs here, and
+    signature checks happen in worker processes. This coroutine runs until
+    it is cancelled. When the verifier or payment queue is full, intake
+    waits, which in turn pauses reading from the relays.
+    
+    Args:
+        campaigns: Registry of the notes to monitor reposts for
+        relay_pool: The relay pool to subscribe on
+        verifier: Verifier whose handler (accept_repost) queues genuine
+            reposts for payment
+        since: Optional Unix timestamp to start from (defaults to the
+            configured repost lookback window)
+    """
+    try:
+        # Only ask relays for reposts and quotes of the watched notes
+        await update_subscriptions(campaigns, relay_pool, since)
         
         # Event monitoring loop
         while True:
+            relay_event: RelayEvent = await relay_pool.queue.get()
             try:
-                # Process events from the message pool
-                while relay_manager.message_pool.has_events():
-                    event_msg: EventMessage = relay_manager.message_pool.get_event()
+                start = time.perf_counter()
+                repost = extract_repost_info(relay_event.event, campaigns)
+                metrics.STAGE_SECONDS.observe(time.perf_counter() - start, "match")
+                if repost:
+                    metrics.REPOSTS_MATCHED.inc()
+                    await verifier.submit(relay_event.event, (relay_event, repost))
                     
-                    if repost := extract_repost_info(event_msg.event, note_id):
-                        handle_repost_event(repost)
-                        
-                # Brief sleep to prevent CPU thrashing
-                time.sleep(0.5)
-                
             except Exception as e:
                 logger.error(f"Error in event processing loop: {str(e)}")
-                time.sleep(1)  # Back off on error
                 
+    except asyncio.CancelledError:
+        raise
+        
     except Exception as e:
         logger.error(f"Fatal error in repost subscription: {str(e)}")
         raise NostrEventError(f"Failed to monitor reposts: {str(e)}") from e
@@ -0,0 +1,272 @@
+"""Relay health tracking for AutoZap.
+
+This module records how each relay behaves once connected: how long it
+takes to connect, deliver its first event and finish sending stored
+events, how often it fails, and how many of its events another relay had
+already delivered. A scorer uses those numbers to drop relays that are
+unreliable, slow or fully redundant and to bring in configured backups.
+"""
+
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class RelayHealth:
+    """Connection and delivery statistics for one relay."""
+
+    url: str
+    added_at: float
+    connects: int = 0
+    connect_failures: int = 0
+    disconnects: int = 0
+    errors: int = 0
+    events: int = 0
+    duplicates: int = 0
+    connect_latency: Optional[float] = None
+    first_event_latency: Optional[float] = None
+    eose_latency: Optional[float] = None
+    # Per-connection timing state
+    attempt_started: Optional[float] = field(default=None, repr=False)
+    connected_at: Optional[float] = field(default=None, repr=False)
+    awaiting_first_event: bool = field(default=False, repr=False)
+    awaiting_eose: bool = field(default=False, repr=False)
+
+    @property
+    def unique_events(self) -> int:
+        """Events this relay delivered before any other relay."""
+        return self.events - self.duplicates
+
+    @property
+    def duplicate_ratio(self) -> float:
+        """Share of this relay's events another relay delivered first."""
+        return self.duplicates / self.events if self.events else 0.0
+
+    @property
+    def failure_rate(self) -> float:
+        """Failed connects and dropped connections per connection attempt."""
+        attempts = self.connects + self.connect_failures
+        return (self.connect_failures + self.disconnects) / attempts if attempts else 0.0
+
+    def to_dict(self) -> Dict[str, object]:
+        """Return the statistics as a plain dictionary."""
+        return {
+            "connected": self.connected_at is not None,
+            "connects": self.connects,
+            "connect_failures": self.connect_failures,
+            "disconnects": self.disconnects,
+            "errors": self.errors,
+            "events": self.events,
+            "unique_events": self.unique_events,
+            "duplicate_ratio": round(self.duplicate_ratio, 4),
+            "failure_rate": round(self.failure_rate, 4),
+            "connect_latency": self.connect_latency,
+            "first_event_latency": self.first_event_latency,
+            "eose_latency": self.eose_latency,
+        }
+
+class RelayHealthTracker:
+    """Collects RelayHealth for every relay in a pool."""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        """Initialize an empty tracker.
+
+        Args:
+            clock: Monotonic time source
+        """
+        self.clock = clock
+        self.relays: Dict[str, RelayHealth] = {}
+
+    def get(self, url: str) -> RelayHealth:
+        """Return a relay's statistics, creating them on first use.
+
+        Args:
+            url: The relay URL
+
+        Returns:
+            The relay's RelayHealth
+        """
+        health = self.relays.get(url)
+        if health is None:
+            health = self.relays[url] = RelayHealth(url, added_at=self.clock())
+        return health
+
+    def forget(self, url: str) -> None:
+        """Drop a relay's statistics.
+
+        Args:
+            url: The relay URL
+        """
+        self.relays.pop(url, None)
+
+    def connecting(self, url: str) -> None:
+        """Record the start of a connection attempt."""
+        self.get(url).attempt_started = self.clock()
+
+    def connected(self, url: str) -> None:
+        """Record a successful connection."""
+        health = self.get(url)
+        now = self.clock()
+        health.connects += 1
+        health.connected_at = now
+        if health.attempt_started is not None:
+            health.connect_latency = now - health.attempt_started
+        health.awaiting_first_event = True
+        health.awaiting_eose = True
+
+    def closed(self, url: str) -> None:
+        """Record the end of a connection attempt, successful or not."""
+        health = self.get(url)
+        if health.connected_at is None:
+            health.connect_failures += 1
+        else:
+            health.disconnects += 1
+        health.connected_at = None
+        health.attempt_started = None
+
+    def event(self, url: str, duplicate: bool) -> None:
+        """Record an event frame for a watched note.
+
+        Args:
+            url: The relay that sent it
+            duplicate: Whether another relay had already delivered it
+        """
+        health = self.get(url)
+        health.events += 1
+        health.duplicates += duplicate
+        if health.awaiting_first_event and health.connected_at is not None:
+            health.first_event_latency = self.clock() - health.connected_at
+            health.awaiting_first_event = False
+
+    def eose(self, url: str) -> None:
+        """Record the relay's first EOSE on the current connection."""
+        health = self.get(url)
+        if health.awaiting_eose and health.connected_at is not None:
+            health.eose_latency = self.clock() - health.connected_at
+            health.awaiting_eose = False
+
+    def error(self, url: str) -> None:
+        """Record a malformed frame or protocol error."""
+        self.get(url).errors += 1
+
+    def report(self) -> Dict[str, Dict[str, object]]:
+        """Return every relay's statistics.
+
+        Returns:
+            Mapping of relay URL to its statistics
+        """
+        return {url: health.to_dict() for url, health in self.relays.items()}
+
+class RelayScorer:
+    """Decides which relays to drop and which backups to bring in."""
+
+    def __init__(
+        self,
+        min_active: int = 2,
+        min_age: float = 300.0,
+        min_events: int = 50,
+        max_failure_rate: float = 0.5,
+        max_connect_latency: float = 5.0,
+        max_eose_latency: float = 30.0
+    ):
+        """Initialize the scorer.
+
+        Args:
+            min_active: Relays never dropped below this count
+            min_age: Seconds a relay is observed before it can be dropped
+            min_events: Events needed before a relay can be judged redundant
+            max_failure_rate: Failures per connection attempt tolerated
+            max_connect_latency: Slowest tolerated connect in seconds
+            max_eose_latency: Slowest tolerated catch-up in seconds
+        """
+        self.min_active = min_active
+        self.min_age = min_age
+        self.min_events = min_events
+        self.max_failure_rate = max_failure_rate
+        self.max_connect_latency = max_connect_latency
+        self.max_eose_latency = max_eose_latency
+
+    def problems(self, health: RelayHealth) -> List[str]:
+        """List the reasons a relay should be dropped.
+
+        Args:
+            health: The relay's statistics
+
+        Returns:
+            Human-readable reasons (empty if the relay is healthy)
+        """
+        reasons = []
+        if health.connects + health.connect_failures >= 3 and health.failure_rate > self.max_failure_rate:
+            reasons.append(f"failure rate {health.failure_rate:.0%}")
+        if health.connect_latency is not None and health.connect_latency > self.max_connect_latency:
+            reasons.append(f"connect latency {health.connect_latency:.1f}s")
+        if health.eose_latency is not None and health.eose_latency > self.max_eose_latency:
+            reasons.append(f"EOSE latency {health.eose_latency:.1f}s")
+        if health.events >= self.min_events and health.unique_events == 0:
+            reasons.append("fully redundant")
+        return reasons
+
+    def score(self, health: RelayHealth) -> float:
+        """Rank a relay; higher is better.
+
+        Unique deliveries count most, and failures and slowness count
+        against a relay.
+
+        Args:
+            health: The relay's statistics
+
+        Returns:
+            The relay's score
+        """
+        score = health.unique_events - 10 * len(self.problems(health))
+        score -= health.failure_rate * 5
+        if health.connect_latency is not None:
+            score -= health.connect_latency
+        return score
+
+    def evaluate(
+        self,
+        tracker: RelayHealthTracker,
+        active: Iterable[str],
+        backups: List[str],
+        now: float
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """Pick at most one relay to drop and one backup to add.
+
+        Args:
+            tracker: Statistics of the active relays
+            active: URLs of the relays in use
+            backups: Standby relay URLs in order of preference
+            now: Current time from the tracker's clock
+
+        Returns:
+            (relay to drop, backup to add); either may be None
+        """
+        active = list(active)
+        candidates = []
+        for url in active:
+            health = tracker.get(url)
+            if now - health.added_at < self.min_age:
+                continue
+            problems = self.problems(health)
+            if problems:
+                candidates.append((self.score(health), url, problems))
+
+        drop = None
+        if candidates:
+            score, url, problems = min(candidates)
+            # Keep a bad relay rather than fall below the minimum
+            if len(active) > self.min_active or backups:
+                drop = url
+                logger.info(f"Dropping relay {url}: {', '.join(problems)}")
+
+        remaining = len(active) - (drop is not None)
+        add = None
+        if backups and (drop is not None or remaining < self.min_active):
+            add = backups[0]
+            logger.info(f"Promoting backup relay {add}")
+
+        return drop, add
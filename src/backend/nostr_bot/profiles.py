@@ -0,0 +1,399 @@
+"""Recipient profile lookup for AutoZap.
+
+Zapping a reposter needs the lightning address (lud16) or LNURL (lud06)
+from their kind-0 metadata. This module resolves those in batches: pubkeys
+requested within a short window are fetched from relays with one
+authors=[...] subscription, so a burst of reposts costs a few round-trips
+instead of one per user. Results, including pubkeys without an address,
+are kept in an LRU cache with a TTL and persisted to SQLite so restarts
+start warm.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Set
+from nostr.event import EventKind
+from nostr.filter import Filter, Filters
+from backend import metrics
+from backend.db.models import Database, Profile
+from backend.nostr_bot.relay_pool import RelayEvent, RelayPool
+from backend.nostr_bot.verify import event_fields, verify_batch
+from backend.nostr_bot.wire import WireEvent
+
+logger = logging.getLogger(__name__)
+
+# Prefix for the per-batch profile subscriptions
+SUBSCRIPTION_PREFIX = "autozap_profiles_"
+
+def parse_profile(event: WireEvent, fetched_at: int) -> Profile:
+    """Read the lightning addresses from a kind-0 event.
+
+    Args:
+        event: A verified kind-0 metadata event
+        fetched_at: Unix time of the lookup
+
+    Returns:
+        Profile, without addresses if the content has none or is not JSON
+    """
+    try:
+        content = json.loads(event.content)
+    except ValueError:
+        content = None
+    if not isinstance(content, dict):
+        content = {}
+
+    def address(key: str) -> Optional[str]:
+        value = content.get(key)
+        return value.strip() if isinstance(value, str) and value.strip() else None
+
+    return Profile(event.public_key, address("lud16"), address("lud06"), event.created_at, fetched_at)
+
+class ProfileCache:
+    """LRU cache of profiles with separate TTLs for found and missing addresses."""
+
+    def __init__(
+        self,
+        ttl: float = 86400,
+        negative_ttl: float = 3600,
+        max_entries: int = 100000,
+        clock: Callable[[], float] = time.time
+    ):
+        """Initialize an empty cache.
+
+        Args:
+            ttl: Seconds a profile with an address is kept
+            negative_ttl: Seconds a profile without an address is kept
+            max_entries: Maximum cached profiles; least recently used are
+                evicted first
+            clock: Source of the current Unix time
+        """
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._profiles: "OrderedDict[str, Profile]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._profiles)
+
+    def is_fresh(self, profile: Profile) -> bool:
+        """Check whether a profile lookup is recent enough to reuse.
+
+        Args:
+            profile: The profile to check
+
+        Returns:
+            True if the profile is within its TTL
+        """
+        ttl = self.ttl if profile.has_address else self.negative_ttl
+        return profile.fetched_at + ttl > self.clock()
+
+    def get(self, pubkey: str) -> Optional[Profile]:
+        """Return a fresh cached profile.
+
+        Args:
+            pubkey: The user's public key
+
+        Returns:
+            The Profile, or None if it is not cached or has expired
+        """
+        profile = self._profiles.get(pubkey)
+        if profile is not None:
+            if self.is_fresh(profile):
+                self._profiles.move_to_end(pubkey)
+                self.hits += 1
+                return profile
+            del self._profiles[pubkey]
+        self.misses += 1
+        return None
+
+    def put(self, profile: Profile) -> None:
+        """Cache a profile.
+
+        Args:
+            profile: The resolved profile
+        """
+        self._profiles[profile.pubkey] = profile
+        self._profiles.move_to_end(profile.pubkey)
+        while len(self._profiles) > self.max_entries:
+            self._profiles.popitem(last=False)
+            self.evictions += 1
+
+@dataclass
+class _Batch:
+    """Relay responses for one profile subscription."""
+
+    waiting: Set[str]  # Relays that have not sent EOSE yet
+    done: asyncio.Event = field(default_factory=asyncio.Event)
+    events: List[RelayEvent] = field(default_factory=list)
+
+class ProfileResolver:
+    """Resolves pubkeys to profiles in batched relay lookups."""
+
+    def __init__(
+        self,
+        relay_pool: RelayPool,
+        db: Database,
+        cache: Optional[ProfileCache] = None,
+        batch_seconds: float = 0.1,
+        max_batch: int = 500,
+        fetch_timeout: float = 5.0
+    ):
+        """Initialize the resolver.
+
+        Args:
+            relay_pool: Relay pool reserved for profile lookups; its
+                on_eose callback is taken over
+            db: Database the profiles are persisted to
+            cache: Cache of resolved profiles (a default one is created if
+                omitted)
+            batch_seconds: How long requests are gathered before a batch
+                is fetched
+            max_batch: Pubkeys per batch; a full batch is fetched at once
+            fetch_timeout: Seconds to wait for relays to finish a batch
+        """
+        if max_batch < 1:
+            raise ValueError("max_batch must be at least 1")
+
+        self.relay_pool = relay_pool
+        self.relay_pool.on_eose = self._eose
+        self.db = db
+        self.cache = cache if cache is not None else ProfileCache()
+        self.batch_seconds = batch_seconds
+        self.max_batch = max_batch
+        self.fetch_timeout = fetch_timeout
+        self.batches = 0
+        self.fetched = 0
+        self.failed_batches = 0
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._batches: Dict[str, _Batch] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._reader: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def start(self) -> None:
+        """Connect to the relays and start reading. Must be called from a running loop."""
+        self._loop = asyncio.get_running_loop()
+        self.relay_pool.start()
+        self._reader = asyncio.create_task(self._read_events(), name="profile-reader")
+
+    async def close(self) -> None:
+        """Stop lookups and disconnect; waiting callers get a CancelledError."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        tasks = list(self._tasks) + ([self._reader] if self._reader else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for future in self._pending.values():
+            future.cancel()
+        self._pending.clear()
+        await self.relay_pool.close()
+
+    def prefetch(self, pubkey: str) -> None:
+        """Start resolving a pubkey without waiting for the result.
+
+        Args:
+            pubkey: The user's public key
+        """
+        if self.cache.get(pubkey) is None:
+            self._request(pubkey)
+
+    async def resolve(self, pubkey: str) -> Profile:
+        """Return a user's profile, fetching it with the next batch if needed.
+
+        Args:
+            pubkey: The user's public key
+
+        Returns:
+            The Profile; check has_address before zapping
+        """
+        profile = self.cache.get(pubkey)
+        if profile is not None:
+            metrics.PROFILE_LOOKUPS.inc("memory")
+            return profile
+        # Shielded so one caller giving up does not fail the others
+        return await asyncio.shield(self._request(pubkey))
+
+    def resolve_threadsafe(self, pubkey: str, timeout: float) -> Profile:
+        """Resolve a profile from a thread other than the event loop.
+
+        Args:
+            pubkey: The user's public key
+            timeout: Seconds to wait for the lookup
+
+        Returns:
+            The Profile
+
+        Raises:
+            concurrent.futures.TimeoutError: If the lookup takes longer
+        """
+        return asyncio.run_coroutine_threadsafe(self.resolve(pubkey), self._loop).result(timeout)
+
+    def _request(self, pubkey: str) -> asyncio.Future:
+        future = self._pending.get(pubkey)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._pending[pubkey] = future
+            if len(self._pending) >= self.max_batch:
+                self._flush()
+            elif self._flush_handle is None:
+                self._flush_handle = asyncio.get_running_loop().call_later(self.batch_seconds, self._flush)
+        return future
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        while self._pending:
+            batch = dict(list(self._pending.items())[:self.max_batch])
+            for pubkey in batch:
+                del self._pending[pubkey]
+            task = asyncio.create_task(self._resolve_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _resolve_batch(self, batch: Dict[str, asyncio.Future]) -> None:
+        try:
+            profiles = await self._lookup(list(batch))
+        except Exception as e:
+            logger.error(f"Error resolving {len(batch)} profiles: {str(e)}")
+            profiles = {}
+        for pubkey, future in batch.items():
+            if not future.done():
+                future.set_result(profiles.get(pubkey) or Profile(pubkey))
+
+    async def _lookup(self, pubkeys: List[str]) -> Dict[str, Profile]:
+        # Profiles stored by an earlier run may still be fresh
+        profiles = {
+            profile.pubkey: profile
+            for profile in await asyncio.to_thread(self.db.get_profiles, pubkeys)
+        }
+        stored = {pubkey: p for pubkey, p in profiles.items() if self.cache.is_fresh(p)}
+        for profile in stored.values():
+            self.cache.put(profile)
+        metrics.PROFILE_LOOKUPS.inc("database", amount=len(stored))
+
+        missing = [pubkey for pubkey in pubkeys if pubkey not in stored]
+        if not missing:
+            return profiles
+
+        start = time.perf_counter()
+        events = await self._fetch(missing)
+        metrics.STAGE_SECONDS.observe(time.perf_counter() - start, "profile_fetch")
+        if events is None:
+            # No relay answered; fall back to stale profiles and cache nothing
+            self.failed_batches += 1
+            return profiles
+
+        fetched_at = int(self.cache.clock())
+        found = {}
+        for event in events:
+            profile = parse_profile(event, fetched_at)
+            if profile.pubkey not in found or profile.created_at > found[profile.pubkey].created_at:
+                found[profile.pubkey] = profile
+
+        resolved = []
+        for pubkey in missing:
+            profile = found.get(pubkey)
+            if profile is None:
+                # The relays may have sent an unchanged event that the pool's
+                # dedup dropped, so an expired stored address is kept
+                stale = profiles.get(pubkey)
+                profile = Profile(pubkey, fetched_at=fetched_at)
+                if stale is not None and stale.has_address:
+                    profile = Profile(pubkey, stale.lud16, stale.lud06, stale.created_at, fetched_at)
+            resolved.append(profile)
+        for profile in resolved:
+            self.cache.put(profile)
+            profiles[profile.pubkey] = profile
+        self.fetched += len(found)
+        metrics.PROFILE_LOOKUPS.inc("relay", amount=len(found))
+        metrics.PROFILE_LOOKUPS.inc("none", amount=len(missing) - len(found))
+        await asyncio.to_thread(self.db.save_profiles, resolved)
+        return profiles
+
+    async def _fetch(self, pubkeys: List[str]) -> Optional[List[WireEvent]]:
+        """Fetch and verify the kind-0 events of some pubkeys.
+
+        Returns:
+            Events with valid signatures, or None if no relay is connected
+        """
+        connected = self.relay_pool.connected_relays
+        if not connected:
+            return None
+
+        self.batches += 1
+        subscription_id = f"{SUBSCRIPTION_PREFIX}{self.batches}"
+        batch = self._batches[subscription_id] = _Batch(set(connected))
+        wanted = set(pubkeys)
+        try:
+            await self.relay_pool.subscribe(subscription_id, Filters([
+                Filter(authors=pubkeys, kinds=[EventKind.SET_METADATA])
+            ]))
+            try:
+                await asyncio.wait_for(batch.done.wait(), self.fetch_timeout)
+            except asyncio.TimeoutError:
+                logger.debug(f"Profile batch timed out waiting for {len(batch.waiting)} relays")
+        finally:
+            await self.relay_pool.unsubscribe(subscription_id)
+            del self._batches[subscription_id]
+
+        # Only the newest event per pubkey matters, but a relay could send a
+        # forged newer one, so every candidate is checked. Copies from several
+        # relays are all checked too; a forged copy must not stand in for the
+        # genuine event in the pool's dedup.
+        candidates = [
+            relay_event for relay_event in batch.events
+            if relay_event.event.kind == EventKind.SET_METADATA and relay_event.event.public_key in wanted
+        ]
+        valid = await asyncio.to_thread(
+            verify_batch, [event_fields(relay_event.event) for relay_event in candidates]
+        )
+        return [
+            relay_event.event for relay_event, ok in zip(candidates, valid)
+            if ok and self.relay_pool.accept(relay_event)
+        ]
+
+    def _eose(self, url: str, subscription_id: str) -> None:
+        batch = self._batches.get(subscription_id)
+        if batch is not None:
+            batch.waiting.discard(url)
+            if not batch.waiting:
+                batch.done.set()
+
+    async def _read_events(self) -> None:
+        while True:
+            relay_event: RelayEvent = await self.relay_pool.queue.get()
+            batch = self._batches.get(relay_event.subscription_id)
+            if batch is not None:
+                batch.events.append(relay_event)
+
+    def stats(self) -> Dict[str, int]:
+        """Return lookup counters.
+
+        Returns:
+            Dictionary with batches, profiles fetched, failed batches and
+            cache counters
+        """
+        return {
+            "batches": self.batches,
+            "fetched": self.fetched,
+            "failed_batches": self.failed_batches,
+            "pending": len(self._pending),
+            "cache_entries": len(self.cache),
+            "cache_hits": self.cache.hits,
+            "cache_misses": self.cache.misses,
+        }
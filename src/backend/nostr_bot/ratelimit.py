@@ -0,0 +1,138 @@
+"""Rate-limit cache for AutoZap.
+
+This module keeps recent payouts in memory so repeated reposts from users
+who were already paid are rejected with a dict lookup instead of a
+database query. Entries expire exactly when the rate-limit window ends.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+from backend.db.models import Database
+
+logger = logging.getLogger(__name__)
+
+class RateLimitCache:
+    """Write-through TTL cache in front of the payments rate-limit check."""
+
+    def __init__(
+        self,
+        db: Database,
+        window_seconds: int,
+        max_entries: int = 100000,
+        clock: Callable[[], float] = time.time
+    ):
+        """Initialize an empty cache.
+
+        Args:
+            db: Database holding payment history
+            window_seconds: Length of the rate-limit window
+            max_entries: Maximum cached users; least recently used are
+                evicted first
+            clock: Source of the current Unix time
+        """
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+
+        self.db = db
+        self.window_seconds = window_seconds
+        self.max_entries = max_entries
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # (npub, note_id) -> time the rate limit ends
+        self._expires: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._expires)
+
+    def warm(self, owns: Optional[Callable[[str], bool]] = None) -> int:
+        """Load payments that are still inside the window.
+
+        Args:
+            owns: Only load payments for notes this returns True for
+
+        Returns:
+            Number of entries loaded
+        """
+        since = int(self.clock()) - self.window_seconds
+        rows = self.db.get_recent_paid(since)
+        if owns is not None:
+            rows = [row for row in rows if owns(row[1])]
+        for npub, note_id, paid_at in rows:
+            self.record(npub, note_id, paid_at)
+        logger.info(f"Loaded {len(self)} rate-limit entries from payment history")
+        return len(rows)
+
+    def record(self, npub: str, note_id: str, paid_at: Optional[float] = None) -> None:
+        """Remember that a user was paid for a note.
+
+        Call this whenever a payment becomes paid, after writing it to the
+        database.
+
+        Args:
+            npub: The user's public key
+            note_id: The ID of the note that was reposted
+            paid_at: Unix time of the payment (defaults to now)
+        """
+        if paid_at is None:
+            paid_at = self.clock()
+        expires_at = paid_at + self.window_seconds
+        if expires_at < self.clock():
+            return
+
+        key = (npub, note_id)
+        with self._lock:
+            self._expires[key] = max(expires_at, self._expires.get(key, 0))
+            self._expires.move_to_end(key)
+            while len(self._expires) > self.max_entries:
+                self._expires.popitem(last=False)
+                self.evictions += 1
+
+    def is_limited(self, npub: str, note_id: str) -> bool:
+        """Check whether a user was already paid for a note in the window.
+
+        Args:
+            npub: The user's public key
+            note_id: The ID of the note being reposted
+
+        Returns:
+            True if the user must not be paid again yet
+        """
+        now = self.clock()
+        key = (npub, note_id)
+
+        with self._lock:
+            expires_at = self._expires.get(key)
+            if expires_at is not None:
+                if expires_at >= now:
+                    self._expires.move_to_end(key)
+                    self.hits += 1
+                    return True
+                del self._expires[key]
+            self.misses += 1
+
+        # Not cached: the entry may have been evicted or written elsewhere
+        paid_at = self.db.latest_paid_at(npub, note_id, int(now) - self.window_seconds)
+        if paid_at is None:
+            return False
+
+        self.record(npub, note_id, paid_at)
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        """Return cache counters.
+
+        Returns:
+            Dictionary with hits, misses, evictions and current entries
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._expires),
+        }
@@ -0,0 +1,449 @@
+"""Asyncio relay client for AutoZap.
+
+This module keeps every relay websocket on a single event loop and delivers
+incoming events to consumers through an asyncio.Queue as soon as a frame
+arrives. Dropped connections are retried with jittered exponential backoff.
+"""
+
+import asyncio
+import json
+import logging
+import random
+import time
+from dataclasses import dataclass
+from typing import Callable, Container, Dict, Iterable, List, Optional, Tuple, Union
+import websockets
+from nostr.filter import Filters
+from backend import metrics
+from backend.nostr_bot.cursors import RelayCursors
+from backend.nostr_bot.dedup import EventDeduplicator
+from backend.nostr_bot.health import RelayHealthTracker, RelayScorer
+from backend.nostr_bot.wire import (
+    WireEvent, frame_created_at, frame_event_id, is_event_frame, mentioned_ids
+)
+
+logger = logging.getLogger(__name__)
+
+# Subscription filters, either shared by all relays or built per relay URL
+SubscriptionFilters = Union[Filters, Callable[[str], Filters]]
+
+@dataclass
+class RelayEvent:
+    """Container for an event delivered by a relay."""
+
+    url: str
+    subscription_id: str
+    event: WireEvent
+    mentioned: Tuple[str, ...] = ()  # Watched notes the event references
+
+class RelayConnection:
+    """A single relay websocket with automatic reconnection."""
+
+    def __init__(self, url: str, pool: "RelayPool"):
+        """Initialize the connection.
+
+        Args:
+            url: The relay websocket URL
+            pool: The pool this connection delivers events to
+        """
+        self.url = url
+        self.pool = pool
+        self.websocket = None
+        self.task: Optional[asyncio.Task] = None
+        self.attempts = 0
+
+    @property
+    def is_open(self) -> bool:
+        """Whether the websocket is currently connected."""
+        return self.websocket is not None
+
+    async def send(self, message: list) -> None:
+        """Send a client message if the relay is connected.
+
+        Args:
+            message: JSON-serializable NIP-01 client message
+        """
+        if self.websocket is None:
+            return
+        try:
+            await self.websocket.send(json.dumps(message))
+        except websockets.exceptions.ConnectionClosed:
+            # The reader loop notices the closed socket and reconnects
+            pass
+
+    async def request(self, subscription_id: str, filters: SubscriptionFilters) -> None:
+        """Send a subscription request built for this relay.
+
+        Args:
+            subscription_id: Client-chosen subscription ID
+            filters: Filters, or a function building them from the relay URL
+        """
+        if self.websocket is None:
+            return
+        if callable(filters):
+            filters = filters(self.url)
+        if self.pool.cursors is not None:
+            self.pool.cursors.start_catch_up(self.url, subscription_id)
+        await self.send(["REQ", subscription_id, *filters.to_json_array()])
+
+    async def run(self) -> None:
+        """Connect, resubscribe and read frames until the pool closes."""
+        health = self.pool.health
+        while not self.pool.closing:
+            health.connecting(self.url)
+            try:
+                async with websockets.connect(
+                    self.url,
+                    open_timeout=self.pool.connect_timeout,
+                    ping_interval=self.pool.ping_interval,
+                    max_size=None
+                ) as websocket:
+                    self.websocket = websocket
+                    self.attempts = 0
+                    health.connected(self.url)
+                    self.pool._connected.set()
+                    logger.info(f"Connected to relay: {self.url}")
+
+                    for subscription_id, filters in list(self.pool.subscriptions.items()):
+                        await self.request(subscription_id, filters)
+
+                    async for frame in websocket:
+                        await self.pool.handle_frame(self.url, frame)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Relay {self.url} connection error: {str(e)}")
+            finally:
+                self.websocket = None
+                health.closed(self.url)
+                if self.pool.cursors is not None:
+                    self.pool.cursors.disconnected(self.url)
+
+            if self.pool.closing:
+                break
+
+            delay = self.pool.backoff_delay(self.attempts)
+            self.attempts += 1
+            logger.info(f"Reconnecting to relay {self.url} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+class RelayPool:
+    """Manages connections to many relays on one event loop."""
+
+    def __init__(
+        self,
+        urls: Iterable[str] = (),
+        queue_size: int = 10000,
+        base_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        connect_timeout: float = 10.0,
+        ping_interval: Optional[float] = 30.0,
+        dedup: Optional[EventDeduplicator] = None,
+        watched: Optional[Container[str]] = None,
+        cursors: Optional[RelayCursors] = None,
+        backups: Iterable[str] = (),
+        on_eose: Optional[Callable[[str, str], None]] = None
+    ):
+        """Initialize the pool without connecting.
+
+        Args:
+            urls: Relay websocket URLs to connect to
+            queue_size: Maximum number of undelivered events before relay
+                reads pause (0 for unbounded)
+            base_backoff: First reconnect delay ceiling in seconds
+            max_backoff: Maximum reconnect delay ceiling in seconds
+            connect_timeout: Seconds to wait for a websocket handshake
+            ping_interval: Seconds between keepalive pings (None to disable)
+            dedup: Deduplicator for events sent by several relays, filled
+                by accept() (a default one is created if omitted)
+            watched: Note IDs of interest; events whose frames mention none
+                of them are dropped before decoding (None keeps all events)
+            cursors: Cursors advanced by events mentioning watched notes;
+                requires watched
+            backups: Standby relay URLs, connected when rebalance() drops
+                a relay or too few are left
+            on_eose: Called with (relay URL, subscription ID) when a relay
+                has sent all stored events for a subscription
+        """
+        urls = list(urls)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.relays: Dict[str, RelayConnection] = {}
+        self.subscriptions: Dict[str, SubscriptionFilters] = {}
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.connect_timeout = connect_timeout
+        self.ping_interval = ping_interval
+        self.closing = False
+        # Accepted events are not delivered again when other relays send them
+        self.dedup = dedup if dedup is not None else EventDeduplicator()
+        self.watched = watched
+        self.cursors = cursors
+        self.on_eose = on_eose
+        self.health = RelayHealthTracker()
+        # Set whenever a relay connects; wait_connected() clears it
+        self._connected = asyncio.Event()
+        self.standby: List[str] = [url for url in backups if url not in urls]
+        self.events_received = 0
+        self.events_skipped = 0
+        self.events_duplicate = 0
+
+        for url in urls:
+            self.add_relay(url)
+
+    @property
+    def connected_relays(self) -> List[str]:
+        """URLs of relays with an open websocket."""
+        return [url for url, relay in self.relays.items() if relay.is_open]
+
+    async def wait_connected(self, quorum: int, timeout: float) -> int:
+        """Wait until enough relays are connected or a deadline passes.
+
+        Args:
+            quorum: Relays that must be connected; capped at the number of
+                relays in the pool
+            timeout: Maximum seconds to wait
+
+        Returns:
+            Number of relays connected when the wait ended
+        """
+        quorum = min(quorum, len(self.relays))
+        deadline = asyncio.get_running_loop().time() + timeout
+        while len(self.connected_relays) < quorum:
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                break
+            self._connected.clear()
+            try:
+                await asyncio.wait_for(self._connected.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+        return len(self.connected_relays)
+
+    def backoff_delay(self, attempt: int) -> float:
+        """Return a full-jitter exponential backoff delay.
+
+        Args:
+            attempt: Number of consecutive failed attempts so far
+
+        Returns:
+            Delay in seconds
+        """
+        ceiling = min(self.max_backoff, self.base_backoff * (2 ** attempt))
+        return random.uniform(0, ceiling)
+
+    def add_relay(self, url: str) -> None:
+        """Add a relay, connecting right away if the pool is running.
+
+        Args:
+            url: The relay websocket URL
+        """
+        if url in self.relays:
+            return
+        relay = RelayConnection(url, self)
+        self.relays[url] = relay
+        self.health.get(url)
+        if self._running():
+            relay.task = asyncio.create_task(relay.run(), name=f"relay:{url}")
+
+    async def remove_relay(self, url: str) -> None:
+        """Disconnect and forget a relay.
+
+        Args:
+            url: The relay websocket URL
+        """
+        relay = self.relays.pop(url, None)
+        if relay and relay.task:
+            relay.task.cancel()
+            await asyncio.gather(relay.task, return_exceptions=True)
+        self.health.forget(url)
+
+    async def rebalance(self, scorer: RelayScorer) -> None:
+        """Drop an unhealthy or redundant relay and bring in a backup.
+
+        Dropped relays join the end of the standby list, so they can be
+        tried again once the backups ahead of them have been used.
+
+        Args:
+            scorer: Decides which relay to drop and when to add a backup
+        """
+        drop, add = scorer.evaluate(self.health, self.relays, self.standby, self.health.clock())
+        if drop is not None:
+            await self.remove_relay(drop)
+            self.standby.append(drop)
+        if add is not None:
+            # Subscriptions are sent once the new relay connects
+            self.standby.remove(add)
+            self.add_relay(add)
+
+    def start(self) -> None:
+        """Start connecting to all relays. Must be called from a running loop."""
+        self.closing = False
+        for url, relay in self.relays.items():
+            if relay.task is None or relay.task.done():
+                relay.task = asyncio.create_task(relay.run(), name=f"relay:{url}")
+
+    async def subscribe(self, subscription_id: str, filters: SubscriptionFilters) -> None:
+        """Subscribe on all relays, including ones that connect later.
+
+        Args:
+            subscription_id: Client-chosen subscription ID
+            filters: NIP-01 filters for the subscription, or a function
+                building them from a relay URL; it is called again on
+                every reconnect
+        """
+        self.subscriptions[subscription_id] = filters
+        await asyncio.gather(*(
+            relay.request(subscription_id, filters) for relay in self.relays.values()
+        ))
+
+    async def unsubscribe(self, subscription_id: str) -> None:
+        """Close a subscription on all relays.
+
+        Args:
+            subscription_id: The subscription to close
+        """
+        if self.subscriptions.pop(subscription_id, None) is None:
+            return
+        if self.cursors is not None:
+            for url in self.relays:
+                self.cursors.end_catch_up(url, subscription_id)
+        message = ["CLOSE", subscription_id]
+        await asyncio.gather(*(relay.send(message) for relay in self.relays.values()))
+
+    async def handle_frame(self, url: str, frame: str) -> None:
+        """Decode a relay frame and deliver new events to the queue.
+
+        Event frames that mention no watched note or repeat an event
+        already accepted are dropped before they are decoded. Event IDs are
+        only remembered once the consumer has verified the event and called
+        accept(), so until then copies from other relays are delivered too.
+
+        Args:
+            url: The relay the frame came from
+            frame: Raw websocket text frame
+        """
+        try:
+            if is_event_frame(frame):
+                start = time.perf_counter()
+                self.events_received += 1
+                metrics.EVENTS_RECEIVED.inc(url)
+                mentioned: List[str] = []
+                if self.watched is not None:
+                    mentioned = mentioned_ids(frame, self.watched)
+                    if not mentioned:
+                        self.events_skipped += 1
+                        metrics.EVENTS_SKIPPED.inc()
+                        return
+
+                event_id = frame_event_id(frame)
+                if event_id is not None and self.dedup.contains(event_id):
+                    self._duplicate(url, mentioned, frame_created_at(frame))
+                    return
+
+                message = json.loads(frame)
+                subscription_id, data = message[1], message[2]
+                # IDs the scan could not read are deduplicated after decoding
+                if event_id is None and self.dedup.contains(data["id"]):
+                    self._duplicate(url, mentioned, data.get("created_at"))
+                    return
+
+                event = WireEvent.from_json(data)
+                self.health.event(url, duplicate=False)
+                metrics.STAGE_SECONDS.observe(time.perf_counter() - start, "receive")
+                await self.queue.put(RelayEvent(url, subscription_id, event, tuple(mentioned)))
+                return
+
+            message = json.loads(frame)
+            message_type = message[0]
+
+            if message_type == "EOSE":
+                logger.debug(f"End of stored events from {url} ({message[1]})")
+                self.health.eose(url)
+                if self.cursors is not None:
+                    self.cursors.end_catch_up(url, message[1])
+                if self.on_eose is not None:
+                    self.on_eose(url, message[1])
+
+            elif message_type == "NOTICE":
+                logger.info(f"Notice from {url}: {message[1]}")
+
+            elif message_type == "CLOSED":
+                logger.warning(f"Relay {url} closed subscription {message[1]}: {message[2:]}")
+                if self.cursors is not None:
+                    self.cursors.end_catch_up(url, message[1])
+
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            logger.debug(f"Ignoring malformed frame from {url}: {str(e)}")
+            self.health.error(url)
+
+    async def close(self) -> None:
+        """Close all relay connections."""
+        self.closing = True
+        tasks = [relay.task for relay in self.relays.values() if relay.task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for relay in self.relays.values():
+            relay.task = None
+
+    def _duplicate(self, url: str, mentioned: List[str], created_at: Optional[int]) -> None:
+        self.events_duplicate += 1
+        metrics.DEDUP_HITS.inc()
+        self.health.event(url, duplicate=True)
+        # The ID was verified when it was accepted, and a relay misreporting
+        # its time only moves its own cursor
+        if self.cursors is not None and mentioned and isinstance(created_at, int):
+            self.cursors.advance(url, mentioned, created_at)
+
+    def accept(self, relay_event: RelayEvent) -> bool:
+        """Record a delivered event once its ID and signature are verified.
+
+        Only then is its ID remembered and the delivering relay's cursor
+        advanced, so a forged frame can neither suppress the genuine event
+        nor move a cursor past it.
+
+        Args:
+            relay_event: The verified event
+
+        Returns:
+            False if a copy from another relay was accepted first
+        """
+        if self.dedup.seen(relay_event.event.id):
+            self.events_duplicate += 1
+            metrics.DEDUP_HITS.inc()
+            return False
+        if self.cursors is not None and relay_event.mentioned:
+            self.cursors.advance(relay_event.url, relay_event.mentioned, relay_event.event.created_at)
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        """Return event intake counters.
+
+        Returns:
+            Dictionary with events received, skipped by the pre-filter,
+            dropped as duplicates and connected relays
+        """
+        return {
+            "events_received": self.events_received,
+            "events_skipped": self.events_skipped,
+            "events_duplicate": self.events_duplicate,
+            "connected_relays": len(self.connected_relays),
+            "standby_relays": len(self.standby),
+        }
+
+    def health_report(self) -> Dict[str, Dict[str, object]]:
+        """Return per-relay health statistics.
+
+        Returns:
+            Mapping of relay URL to connection and delivery statistics
+        """
+        return self.health.report()
+
+    @staticmethod
+    def _running() -> bool:
+        try:
+            asyncio.get_running_loop()
+            return True
+        except RuntimeError:
+            return False
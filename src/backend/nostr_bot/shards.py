@@ -0,0 +1,70 @@
+"""Note sharding for AutoZap.
+
+This module assigns watched notes to bot processes with a consistent hash
+ring. Each note belongs to exactly one shard, so its rate-limit state,
+relay subscriptions and dedup state live in one process, and changing the
+number of shards moves only about 1/N of the notes.
+"""
+
+import bisect
+import hashlib
+from dataclasses import dataclass
+from typing import List
+
+# Points per shard on the ring; more points spread notes more evenly
+RING_REPLICAS = 128
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+class ShardRing:
+    """Consistent hash ring mapping note IDs to shard indexes."""
+
+    def __init__(self, shards: int, replicas: int = RING_REPLICAS):
+        """Build the ring.
+
+        Args:
+            shards: Number of shards
+            replicas: Points per shard on the ring
+        """
+        if shards < 1 or replicas < 1:
+            raise ValueError("shards and replicas must be at least 1")
+
+        self.shards = shards
+        points = sorted(
+            (_hash(f"shard-{shard}-{replica}"), shard)
+            for shard in range(shards)
+            for replica in range(replicas)
+        )
+        self._points: List[int] = [point for point, _ in points]
+        self._owners: List[int] = [shard for _, shard in points]
+
+    def shard_of(self, note_id: str) -> int:
+        """Return the shard a note belongs to.
+
+        Args:
+            note_id: Hex ID of the note
+
+        Returns:
+            Shard index between 0 and shards - 1
+        """
+        index = bisect.bisect(self._points, _hash(note_id)) % len(self._points)
+        return self._owners[index]
+
+@dataclass
+class Shard:
+    """One bot process's share of the watched notes."""
+
+    index: int
+    ring: ShardRing
+
+    def owns(self, note_id: str) -> bool:
+        """Check whether this shard handles a note.
+
+        Args:
+            note_id: Hex ID of the note
+
+        Returns:
+            True if the note hashes to this shard
+        """
+        return self.ring.shard_of(note_id) == self.index
@@ -0,0 +1,223 @@
+"""Multi-process supervisor for AutoZap.
+
+This module runs the bot as several processes so event decoding, matching
+and payment work use more than one core. A consistent hash assigns each
+watched note to one shard process, which keeps its own relay subscriptions,
+dedup state and payment workers; all shards share the payments database,
+where SQLite's WAL mode serializes their writes. The supervisor merges the
+shards' metrics and statistics for the metrics endpoint and stats API,
+restarts shards that exit, and stops them cleanly on SIGINT or SIGTERM.
+"""
+
+import logging
+import multiprocessing
+import queue
+import signal
+import time
+from typing import Any, Callable, Dict, List, Optional
+from backend import metrics
+from backend.api.server import StatsAPI, start_api_server
+from backend.config import get_config
+from backend.db.models import Database
+from backend.nostr_bot.bot import load_campaigns, run_bot, start_metrics_server
+from backend.nostr_bot.shards import Shard, ShardRing
+
+logger = logging.getLogger(__name__)
+
+# Seconds before a shard that exited is started again
+RESTART_DELAY_SECONDS = 5
+
+# Seconds a stopping shard gets to close its relays and payment workers
+SHUTDOWN_TIMEOUT_SECONDS = 30
+
+def run_shard(index: int, shards: int, note_ids: Optional[List[str]], stats_queue) -> None:
+    """Run the bot for one shard; the entry point of each shard process.
+
+    Args:
+        index: This shard's index
+        shards: Total number of shards
+        note_ids: Note IDs configured through the environment
+        stats_queue: Queue the supervisor reads statistics from
+    """
+    # Reports are superseded every few seconds; never block exit flushing them
+    stats_queue.cancel_join_thread()
+    run_bot(note_ids, Shard(index, ShardRing(shards)), stats_queue)
+
+class Supervisor:
+    """Starts, watches and stops the shard processes."""
+
+    def __init__(
+        self,
+        shards: int,
+        note_ids: Optional[List[str]] = None,
+        target: Callable[..., None] = run_shard,
+        registry: Optional[metrics.Registry] = None,
+        restart_delay: float = RESTART_DELAY_SECONDS
+    ):
+        """Initialize the supervisor.
+
+        Args:
+            shards: Number of shard processes
+            note_ids: Note IDs configured through the environment
+            target: Shard process entry point, called as
+                target(index, shards, note_ids, stats_queue)
+            registry: Registry the shards' metrics are merged into
+            restart_delay: Seconds before a shard that exited is restarted
+        """
+        if shards < 1:
+            raise ValueError("shards must be at least 1")
+
+        self.shards = shards
+        self.note_ids = note_ids
+        self.target = target
+        self.registry = registry or metrics.REGISTRY
+        self.restart_delay = restart_delay
+        self.running = False
+        self.restarts = 0
+        self.processes: Dict[int, multiprocessing.process.BaseProcess] = {}
+        # Shards are spawned so they never inherit the parent's threads or sockets
+        self._context = multiprocessing.get_context("spawn")
+        self.stats_queue = self._context.Queue()
+        self._restart_at: Dict[int, float] = {}
+        self._metrics: Dict[int, Dict[str, Any]] = {}
+        self._stats: Dict[int, Dict[str, Any]] = {}
+
+    def _start_shard(self, index: int) -> None:
+        process = self._context.Process(
+            target=self.target,
+            args=(index, self.shards, self.note_ids, self.stats_queue),
+            name=f"autozap-shard-{index}"
+        )
+        process.start()
+        self.processes[index] = process
+        logger.info(f"Started shard {index} (pid {process.pid})")
+
+    def start(self) -> None:
+        """Start every shard process."""
+        self.running = True
+        for index in range(self.shards):
+            self._start_shard(index)
+
+    def poll(self, timeout: float = 1.0) -> None:
+        """Collect shard reports and restart shards that exited.
+
+        Args:
+            timeout: Seconds to wait for a report
+        """
+        reports = []
+        try:
+            reports.append(self.stats_queue.get(timeout=timeout))
+            while True:
+                reports.append(self.stats_queue.get_nowait())
+        except queue.Empty:
+            pass
+
+        for index, snapshot, stats in reports:
+            self._metrics[index] = snapshot
+            self._stats[index] = stats
+        if reports:
+            self.registry.merge(self._metrics.values())
+
+        now = time.monotonic()
+        for index, process in list(self.processes.items()):
+            if process.is_alive() or not self.running:
+                continue
+            if index not in self._restart_at:
+                logger.error(
+                    f"Shard {index} exited with code {process.exitcode}; "
+                    f"restarting in {self.restart_delay}s"
+                )
+                self._stats.pop(index, None)
+                self._restart_at[index] = now + self.restart_delay
+            elif now >= self._restart_at[index]:
+                del self._restart_at[index]
+                self.restarts += 1
+                self._start_shard(index)
+
+    def health(self) -> Dict[str, Any]:
+        """Return the latest statistics of every shard.
+
+        Returns:
+            Statistics per shard index, plus the number of restarts
+        """
+        stats = dict(self._stats)
+        return {
+            "running": self.running,
+            "restarts": self.restarts,
+            "shards": {str(index): stats.get(index, {"running": False}) for index in range(self.shards)},
+        }
+
+    def stop(self, timeout: float = SHUTDOWN_TIMEOUT_SECONDS) -> None:
+        """Stop every shard, giving each time to shut down cleanly.
+
+        Args:
+            timeout: Seconds to wait before shards are killed
+        """
+        self.running = False
+        processes = list(self.processes.values())
+        for process in processes:
+            if process.is_alive():
+                # Shards handle SIGTERM like the single-process bot
+                process.terminate()
+
+        deadline = time.monotonic() + timeout
+        for process in processes:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning(f"Shard {process.name} did not stop in {timeout}s; killing it")
+                process.kill()
+                process.join()
+        logger.info(f"Stopped {len(processes)} shards")
+
+def run_supervisor(shards: int, note_ids: Optional[List[str]] = None) -> None:
+    """Run the bot as several shard processes until SIGINT or SIGTERM.
+
+    Args:
+        shards: Number of shard processes
+        note_ids: IDs of notes to monitor for reposts in addition to the
+            active campaigns stored in the database
+    """
+    config = get_config()
+    if note_ids is None:
+        note_ids = config.watch_note_ids
+
+    # Migrate the schema once before the shards open the database
+    db = Database(config.db_path)
+    try:
+        if not load_campaigns(db, note_ids):
+            raise RuntimeError("No campaigns to watch (set WATCH_NOTE_IDS or add campaigns)")
+    finally:
+        db.close()
+
+    supervisor = Supervisor(shards, note_ids)
+
+    def stop(signum: int, frame=None) -> None:
+        logger.info(f"Received signal {signum}, stopping shards...")
+        supervisor.running = False
+
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, stop)
+
+    logger.info(f"Starting AutoZap supervisor with {shards} shards")
+    supervisor.start()
+    metrics_server = start_metrics_server()
+    api_server = api = None
+    if config.api_port:
+        api = StatsAPI(
+            Database(config.db_path, read_only=True),
+            health=supervisor.health,
+            cache_seconds=config.api_cache_seconds
+        )
+        api_server = start_api_server(api, config.api_port, config.api_host)
+
+    try:
+        while supervisor.running:
+            supervisor.poll()
+    finally:
+        supervisor.stop()
+        if metrics_server:
+            metrics_server.shutdown()
+        if api_server:
+            api_server.shutdown()
+            api.close()
+            api.db.close()
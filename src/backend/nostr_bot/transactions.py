@@ -1,54 +1,310 @@
 """Transaction processing module for AutoZap.
 
 This module handles payment processing logic, including rate limiting and payment tracking.
+Reposts are written to the payment outbox before LNbits is called, so each
+repost event is paid at most once even across crashes and restarts.
 """
 
 import logging
-from typing import Optional
-from backend.config import config
-from backend.db.models import Database
-from backend.ln_wallet.wallet import create_invoice, PaymentResult, LNbitsError
+import threading
+import time
+from datetime import datetime
+from concurrent.futures import TimeoutError as LookupTimeout
+from typing import TYPE_CHECKING, Optional
+from backend import metrics
+from backend.config import get_config
+from backend.db.models import OutboxEntry, Payment, get_database
+from backend.nostr_bot.budget import BudgetLedger
+from backend.nostr_bot.ratelimit import RateLimitCache
+
+# The wallet pulls in requests, so it is imported when payments start rather
+# than delaying relay connections at startup
+if TYPE_CHECKING:
+    from backend.ln_wallet.wallet import PaymentResult
+    from backend.nostr_bot.profiles import ProfileResolver
 
 logger = logging.getLogger(__name__)
 
-def process_payment(npub: str, note_id: str) -> Optional[PaymentResult]:
-    """Process a payment for a repost, including rate limiting checks.
+# Shared rate-limit cache, created on first use
+_rate_limiter: Optional[RateLimitCache] = None
+_rate_limiter_lock = threading.Lock()
+
+# Shared spend ledger, created on first use
+_budget_ledger: Optional[BudgetLedger] = None
+_budget_ledger_lock = threading.Lock()
+
+def get_rate_limiter() -> RateLimitCache:
+    """Return the process-wide rate-limit cache.
+    
+    Returns:
+        RateLimitCache backed by the configured database
+    """
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            config = get_config()
+            _rate_limiter = RateLimitCache(
+                get_database(config.db_path),
+                config.rate_limit_hours * 3600,
+                max_entries=config.rate_limit_cache_size
+            )
+        return _rate_limiter
+
+def get_budget_ledger() -> BudgetLedger:
+    """Return the process-wide spend ledger.
+    
+    Every shard and backfill gets the full hourly and daily limits; their
+    reservations are checked together in the shared database, so together
+    they never exceed them.
+    
+    Returns:
+        BudgetLedger backed by the configured database
+    """
+    global _budget_ledger
+    with _budget_ledger_lock:
+        if _budget_ledger is None:
+            config = get_config()
+            _budget_ledger = BudgetLedger(
+                get_database(config.db_path),
+                hourly_limit=config.budget_hourly_sats,
+                daily_limit=config.budget_daily_sats
+            )
+        return _budget_ledger
+
+def request_invoice_parked(npub: str, note_id: str, amount: int, park_seconds: float) -> "PaymentResult":
+    """Create an invoice, waiting for LNbits to recover if its circuit is open.
+    
+    The calling worker is parked while LNbits is unhealthy, so the payment
+    queue fills up and applies backpressure instead of failing every repost.
     
     Args:
         npub: The public key of the user to pay
         note_id: The ID of the note being reposted
+        amount: Payment amount in satoshis
+        park_seconds: Maximum time to wait for LNbits
         
     Returns:
-        PaymentResult object if payment was attempted, None if rate limited
+        PaymentResult from request_invoice
+        
+    Raises:
+        CircuitOpenError: If LNbits is still unhealthy after park_seconds
     """
-    db = Database(config.db_path)
+    from backend.ln_wallet.wallet import CircuitOpenError, request_invoice
     
-    # Check for recent payments to this user for this note
-    if db.has_recent_payment(npub, note_id, config.rate_limit_hours):
-        logger.info(
-            f"Rate limit: User {npub[:8]}... already received payment for "
-            f"note {note_id[:8]}... in the last {config.rate_limit_hours} hours"
+    deadline = time.monotonic() + park_seconds
+    while True:
+        try:
+            return request_invoice(npub, note_id, amount)
+        except CircuitOpenError as e:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise
+            logger.info(f"LNbits unavailable, parking payment for {npub[:8]}... for {e.retry_after:.1f}s")
+            time.sleep(min(e.retry_after, remaining))
+
+def zap_recipient(entry_id: int, npub: str, amount: int, profiles: "ProfileResolver") -> "PaymentResult":
+    """Pay a recipient's lightning address from the LNbits wallet.
+    
+    The invoice's payment hash is saved on the outbox entry before LNbits
+    pays it, so a takeover after a crash looks the payment up instead of
+    paying again.
+    
+    Args:
+        entry_id: ID of the submitted outbox entry
+        npub: The public key of the user to pay
+        amount: Payment amount in satoshis
+        profiles: Resolver for the recipient's lightning address
+        
+    Returns:
+        PaymentResult for the paid invoice
+        
+    Raises:
+        LNURLError: If the recipient has no usable lightning address
+        concurrent.futures.TimeoutError: If the profile lookup takes too long
+        CircuitOpenError: If LNbits is currently considered unhealthy
+    """
+    from backend.ln_wallet.lnurl import LNURLError, get_resolver, pay_address
+    from backend.ln_wallet.wallet import get_client
+    
+    config = get_config()
+    db = get_database(config.db_path)
+    
+    def save_hash(payment_hash: str) -> None:
+        if not db.set_outbox_payment_hash(entry_id, payment_hash):
+            raise RuntimeError(f"Outbox entry {entry_id} was taken over, not paying")
+    
+    with metrics.STAGE_SECONDS.time("profile_lookup"):
+        profile = profiles.resolve_threadsafe(
+            npub, config.profile_fetch_timeout + config.profile_batch_ms / 1000
         )
+    if not profile.has_address:
+        raise LNURLError(f"{npub[:8]}... has no lightning address")
+    with metrics.STAGE_SECONDS.time("lnbits"):
+        return pay_address(
+            get_resolver(), get_client(), profile.lud16 or profile.lud06, amount, on_invoice=save_hash
+        )
+
+def enqueue_payment(event_id: str, npub: str, note_id: str, amount: Optional[int] = None) -> Optional[OutboxEntry]:
+    """Durably queue a repost for payment.
+    
+    Args:
+        event_id: ID of the repost event; each event is queued only once
+        npub: The public key of the user to pay
+        note_id: The ID of the note being reposted
+        amount: Optional payment amount in satoshis (defaults to config value)
+        
+    Returns:
+        The new OutboxEntry, or None if the event was already queued
+    """
+    db = get_database(get_config().db_path)
+    return db.enqueue_outbox_entry(OutboxEntry(
+        id=None, event_id=event_id, npub=npub, note_id=note_id, amount=amount
+    ))
+
+def process_payment(entry: OutboxEntry, profiles: Optional["ProfileResolver"] = None) -> Optional["PaymentResult"]:
+    """Drive an outbox entry to paid or failed, including rate limiting checks.
+    
+    The entry is marked submitted before LNbits is called and the payment
+    row is written in the same transaction that marks it paid. An entry
+    interrupted in between stays submitted until its lease runs out; if it
+    got as far as an LNbits payment hash, that payment is looked up instead
+    of calling LNbits again: it is recorded once settled, fails the entry if
+    it failed and leaves the entry submitted while still in flight. The amount is reserved in the
+    database before LNbits is called, so entries that would exceed a budget
+    or spend limit are failed without paying, whichever process runs them.
+    An entry attempted more than OUTBOX_MAX_ATTEMPTS times is failed.
+    
+    With a profile resolver, the recipient's lightning address is paid;
+    without one, an LNbits invoice is created for the repost.
+    
+    Args:
+        entry: The outbox entry to process
+        profiles: Resolver for recipients' lightning addresses, or None
+        
+    Returns:
+        PaymentResult object if payment was attempted, None if rate limited
+        or already finished
+    """
+    from backend.ln_wallet.lnurl import LNURLError, LNURLUnavailable
+    from backend.ln_wallet.wallet import CircuitOpenError, LNbitsError, PaymentResult, find_payment
+    
+    config = get_config()
+    amount = entry.amount if entry.amount is not None else config.payment_amount
+    npub, note_id = entry.npub, entry.note_id
+    
+    db = get_database(config.db_path)
+    rate_limiter = get_rate_limiter()
+    ledger = get_budget_ledger()
+    reservation = None
+    result = None
+    
+    claimed = db.claim_outbox_entry(entry.id, config.outbox_lease_seconds)
+    if claimed is None:
+        logger.info(f"Outbox entry {entry.id} already finished or in flight, skipping")
         return None
     
     try:
-        # Generate and process the payment
-        result = create_invoice(npub, note_id, config.payment_amount)
+        if claimed.payment_hash:
+            # An earlier attempt reached LNbits; record its payment rather
+            # than making another one
+            with metrics.STAGE_SECONDS.time("lnbits"):
+                result = find_payment(claimed.payment_hash)
+            if result is not None and result.status == "pending":
+                # Still in flight; the entry stays submitted and is looked up
+                # again once its renewed lease runs out
+                logger.info(f"Payment {claimed.payment_hash[:8]}... for outbox entry {entry.id} still in flight")
+                return result
+            if result is not None and result.status == "failed":
+                metrics.PAYMENTS.inc("failed")
+                db.release_outbox_entry(entry.id, result.error_message)
+                return result
+            if result is not None:
+                logger.info(f"Recovered payment {claimed.payment_hash[:8]}... for outbox entry {entry.id}")
         
-        if result.success:
-            logger.info(
-                f"Payment of {config.payment_amount} sat initiated for "
-                f"{npub[:8]}... (Note: {note_id[:8]}...)"
-            )
-        else:
-            logger.error(
-                f"Payment failed for {npub[:8]}...: {result.error_message}"
-            )
+        if result is None and claimed.attempts > config.outbox_max_attempts:
+            error = f"gave up after {claimed.attempts - 1} attempts"
+            logger.error(f"Outbox entry {entry.id} {error}")
+            metrics.PAYMENTS.inc("failed")
+            db.release_outbox_entry(entry.id, error)
+            return PaymentResult(success=False, status="failed", error_message=error)
+        
+        if result is None:
+            # Check for recent payments to this user for this note
+            with metrics.STAGE_SECONDS.time("db_check"):
+                limited = rate_limiter.is_limited(npub, note_id)
+            if limited:
+                metrics.RATE_LIMITED.inc()
+                metrics.PAYMENTS.inc("rate_limited")
+                logger.info(
+                    f"Rate limit: User {npub[:8]}... already received payment for "
+                    f"note {note_id[:8]}... in the last {config.rate_limit_hours} hours"
+                )
+                db.release_outbox_entry(entry.id, "rate limited")
+                return None
             
+            # Hold the amount against the campaign budget and spend windows
+            reservation = ledger.reserve(note_id, amount, entry.id)
+            if reservation is None:
+                metrics.PAYMENTS.inc("over_budget")
+                logger.info(
+                    f"Budget exhausted: not paying {npub[:8]}... for note {note_id[:8]}..."
+                )
+                db.release_outbox_entry(entry.id, "over budget")
+                return None
+            
+            # Generate and process the payment
+            if profiles is not None:
+                result = zap_recipient(entry.id, npub, amount, profiles)
+            else:
+                with metrics.STAGE_SECONDS.time("lnbits"):
+                    result = request_invoice_parked(npub, note_id, amount, config.lnbits_park_seconds)
+        
+        # Anything not yet settled, created invoices included, is recorded
+        # as pending for the reconciler to follow up
+        with metrics.STAGE_SECONDS.time("db_write"):
+            db.complete_outbox_entry(entry.id, Payment(
+                id=None,
+                npub=npub,
+                amount=amount,
+                bolt11=result.bolt11,
+                status="paid" if result.status == "paid" else "pending",
+                created_at=datetime.now(),
+                note_id=note_id,
+                payment_hash=result.payment_hash
+            ))
+        if reservation is not None:
+            ledger.commit(reservation)
+            reservation = None
+        metrics.PAYMENTS.inc(result.status)
+        if result.status == "paid":
+            rate_limiter.record(npub, note_id)
+        logger.info(
+            f"Payment of {amount} sat initiated for "
+            f"{npub[:8]}... (Note: {note_id[:8]}...)"
+        )
         return result
         
-    except LNbitsError as e:
+    except (CircuitOpenError, LNURLUnavailable, LookupTimeout) as e:
+        # LNbits never saw the request; the entry is driven again once the
+        # circuit has had time to close, the recipient's provider is out of
+        # its backoff or relays answer the profile lookup
+        logger.error(f"Lightning payment postponed: {str(e)}")
+        if reservation is not None:
+            ledger.release(reservation)
+        metrics.PAYMENTS.inc("postponed")
+        db.release_outbox_entry(entry.id, str(e), retry=True)
+        return PaymentResult(
+            success=False,
+            status="pending",
+            error_message=str(e)
+        )
+        
+    except (LNbitsError, LNURLError) as e:
         logger.error(f"Lightning payment error: {str(e)}")
+        if reservation is not None:
+            ledger.release(reservation)
+        metrics.PAYMENTS.inc("failed")
+        db.release_outbox_entry(entry.id, str(e))
         return PaymentResult(
             success=False,
             status="failed",
@@ -56,7 +312,18 @@ def process_payment(npub: str, note_id: str) -> Optional[PaymentResult]:
         )
         
     except Exception as e:
+        # The entry stays submitted and is taken over once its lease runs
+        # out. LNbits may have paid, so the reservation stays held until the
+        # entry is finished, and a known payment hash is kept for the takeover.
+        if reservation is not None:
+            ledger.commit(reservation)
+        if result is not None and result.payment_hash and not claimed.payment_hash:
+            try:
+                db.set_outbox_payment_hash(entry.id, result.payment_hash)
+            except Exception as save_error:
+                logger.error(f"Could not save payment hash for outbox entry {entry.id}: {str(save_error)}")
         logger.error(f"Unexpected error processing payment: {str(e)}")
+        metrics.PAYMENTS.inc("error")
         return PaymentResult(
             success=False,
             status="failed",
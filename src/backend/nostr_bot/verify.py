@@ -0,0 +1,209 @@
+"""Event verification for AutoZap.
+
+This module checks that candidate reposts are genuine before they are paid:
+the event ID must match the event's content and the BIP-340 signature must
+be valid for the claimed pubkey. Verification is CPU-bound, so candidates
+are batched and verified on a pool of worker processes instead of on the
+event loop.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+from nostr.event import Event
+from secp256k1 import PublicKey
+from backend import metrics
+from backend.nostr_bot.wire import WireEvent
+
+logger = logging.getLogger(__name__)
+
+# Fields sent to worker processes: id, pubkey, created_at, kind, tags, content, sig
+EventFields = Tuple[str, str, int, int, list, str, str]
+
+def event_fields(event: WireEvent) -> EventFields:
+    """Return the fields of an event needed to verify it.
+
+    Args:
+        event: The event to verify
+
+    Returns:
+        Tuple of the event's signed fields, ID and signature
+    """
+    return (
+        event.id, event.public_key, event.created_at, event.kind,
+        event.tags, event.content, event.signature
+    )
+
+def verify_event(fields: EventFields) -> bool:
+    """Check an event's ID and signature.
+
+    Args:
+        fields: Event fields as returned by event_fields
+
+    Returns:
+        True if the ID matches the content and the signature is valid
+    """
+    event_id, pubkey, created_at, kind, tags, content, signature = fields
+    try:
+        if Event.compute_id(pubkey, created_at, kind, tags, content) != event_id:
+            return False
+        key = PublicKey(bytes.fromhex("02" + pubkey), True)  # x-only key (BIP-340)
+        return key.schnorr_verify(bytes.fromhex(event_id), bytes.fromhex(signature), None, raw=True)
+    except Exception:
+        return False
+
+def verify_batch(batch: Sequence[EventFields]) -> List[bool]:
+    """Verify a batch of events in a worker process.
+
+    Args:
+        batch: Event fields to verify
+
+    Returns:
+        Verification result for each event, in order
+    """
+    return [verify_event(fields) for fields in batch]
+
+class EventVerifier:
+    """Verifies candidate events in batches on a process pool."""
+
+    def __init__(
+        self,
+        handler: Callable[[Any], Awaitable[None]],
+        workers: int = 0,
+        batch_size: int = 64,
+        queue_size: int = 10000
+    ):
+        """Initialize the verifier without starting it.
+
+        Args:
+            handler: Coroutine function called with the item of every event
+                that passes verification
+            workers: Worker processes (0 for one per CPU core)
+            batch_size: Maximum events sent to a worker at once
+            queue_size: Maximum candidates waiting before submit() waits
+        """
+        if workers < 0:
+            raise ValueError("workers must not be negative")
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+
+        self.handler = handler
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.verified = 0
+        self.rejected = 0
+        self.batches = 0
+        self.batch_latency_total = 0.0
+        self.batch_latency_max = 0.0
+        self.last_batch_latency = 0.0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        """Start the worker processes and batchers. Must be called from a running loop."""
+        if self._tasks:
+            return
+        # Forking a process that runs an event loop and threads is unsafe
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+        # One batcher per process keeps every worker busy under load
+        self._tasks = [
+            asyncio.create_task(self._batch(), name=f"event-verifier-{n}")
+            for n in range(self.workers)
+        ]
+
+    async def submit(self, event: WireEvent, item: Any) -> None:
+        """Queue an event for verification, waiting while the queue is full.
+
+        Args:
+            event: The event to verify
+            item: Passed to the handler if the event is genuine
+        """
+        await self.queue.put((event_fields(event), item))
+
+    async def _batch(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            # Take whatever has queued up, so batches grow with load
+            batch = [await self.queue.get()]
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            try:
+                start = time.perf_counter()
+                try:
+                    results = await loop.run_in_executor(
+                        self._executor, verify_batch, [fields for fields, _ in batch]
+                    )
+                except Exception as e:
+                    logger.error(f"Verification of {len(batch)} events failed: {str(e)}")
+                    results = [False] * len(batch)
+                self._record_batch(time.perf_counter() - start)
+                metrics.STAGE_SECONDS.observe(self.last_batch_latency, "verify")
+
+                for (fields, item), valid in zip(batch, results):
+                    if not valid:
+                        self.rejected += 1
+                        metrics.REPOSTS_REJECTED.inc()
+                        logger.warning(f"Rejected event {fields[0][:8]}... with invalid ID or signature")
+                        continue
+                    self.verified += 1
+                    try:
+                        await self.handler(item)
+                    except Exception as e:
+                        logger.error(f"Error handling verified event {fields[0][:8]}...: {str(e)}")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def _record_batch(self, latency: float) -> None:
+        self.batches += 1
+        self.batch_latency_total += latency
+        self.batch_latency_max = max(self.batch_latency_max, latency)
+        self.last_batch_latency = latency
+
+    async def close(self, timeout: float = 10.0) -> None:
+        """Stop verifying, first waiting up to timeout for queued events.
+
+        Args:
+            timeout: Seconds to wait for the queue to drain
+        """
+        if not self._tasks:
+            return
+
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Stopping verifier with {self.queue.qsize()} events unverified")
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        executor, self._executor = self._executor, None
+        await asyncio.get_running_loop().run_in_executor(None, executor.shutdown)
+
+    def stats(self) -> Dict[str, float]:
+        """Return verification counters and batch latency.
+
+        Returns:
+            Dictionary with verified and rejected counts, batches, queue
+            depth and batch latency in seconds
+        """
+        return {
+            "verified": self.verified,
+            "rejected": self.rejected,
+            "batches": self.batches,
+            "queue_depth": self.queue.qsize(),
+            "batch_latency_avg": self.batch_latency_total / self.batches if self.batches else 0.0,
+            "batch_latency_max": self.batch_latency_max,
+            "batch_latency_last": self.last_batch_latency,
+        }
@@ -0,0 +1,143 @@
+"""Relay frame decoding for AutoZap.
+
+Most frames relays send are events we end up discarding, either because
+another relay already delivered them or because they do not mention a
+watched note. This module lets the relay pool make those decisions on the
+raw frame text, before paying for json.loads, and decodes the remaining
+events into a compact record that keeps the ID exactly as sent. The ID is
+only recomputed during verification.
+"""
+
+import re
+from typing import Any, Container, Dict, List, Optional
+
+# Relay-to-client EVENT message, allowing for whitespace between tokens
+EVENT_FRAME = re.compile(r'\s*\[\s*"EVENT"')
+
+# Quoted 64-hex strings: event IDs, pubkeys and tag references. Signatures
+# are 128 hex characters and never match.
+QUOTED_HEX_ID = re.compile(r'"([0-9a-f]{64})"')
+
+# The event's "id" member. Quotes inside content and tags are escaped, so
+# only the event object itself can produce this.
+EVENT_ID_FIELD = re.compile(r'"id"\s*:\s*"([0-9a-f]{64})"')
+
+# The event's "created_at" member
+CREATED_AT_FIELD = re.compile(r'"created_at"\s*:\s*(\d+)')
+
+class WireEvent:
+    """An event as received from a relay.
+
+    Attribute names match nostr.event.Event so either can be passed to
+    the repost matcher and the verifier.
+    """
+
+    __slots__ = ("id", "public_key", "created_at", "kind", "tags", "content", "signature")
+
+    def __init__(
+        self,
+        id: str,
+        public_key: str,
+        created_at: int,
+        kind: int,
+        tags: List[List[str]],
+        content: str,
+        signature: str
+    ):
+        self.id = id
+        self.public_key = public_key
+        self.created_at = created_at
+        self.kind = kind
+        self.tags = tags
+        self.content = content
+        self.signature = signature
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "WireEvent":
+        """Build an event from its decoded NIP-01 JSON object.
+
+        Args:
+            data: The event object from an EVENT message
+
+        Returns:
+            WireEvent with the ID taken from the message
+
+        Raises:
+            KeyError: If a required member is missing
+            TypeError: If the content is not a string
+        """
+        content = data["content"]
+        if not isinstance(content, str):
+            raise TypeError("Event content must be a string")
+        return cls(
+            data["id"], data["pubkey"], data["created_at"],
+            data["kind"], data["tags"], content, data["sig"]
+        )
+
+    def __repr__(self) -> str:
+        return f"WireEvent(id={self.id!r}, kind={self.kind!r})"
+
+def is_event_frame(frame: str) -> bool:
+    """Check whether a raw frame is an EVENT message.
+
+    Args:
+        frame: Raw websocket text frame
+
+    Returns:
+        True if the frame starts like an EVENT message
+    """
+    return EVENT_FRAME.match(frame) is not None
+
+def frame_event_id(frame: str) -> Optional[str]:
+    """Read the event ID from a raw EVENT frame without decoding it.
+
+    Args:
+        frame: Raw EVENT frame
+
+    Returns:
+        The event ID, or None if it could not be found
+    """
+    match = EVENT_ID_FIELD.search(frame)
+    return match.group(1) if match else None
+
+def frame_created_at(frame: str) -> Optional[int]:
+    """Read the event's created_at from a raw EVENT frame without decoding it.
+
+    Args:
+        frame: Raw EVENT frame
+
+    Returns:
+        The created_at timestamp, or None if it could not be found
+    """
+    match = CREATED_AT_FIELD.search(frame)
+    return int(match.group(1)) if match else None
+
+def mentioned_ids(frame: str, note_ids: Container[str]) -> List[str]:
+    """Return the given note IDs that a raw frame references.
+
+    Like mentions_any, but collects every match.
+
+    Args:
+        frame: Raw EVENT frame
+        note_ids: Watched note IDs (any container with fast membership)
+
+    Returns:
+        Watched IDs found in the frame, without duplicates
+    """
+    return list(dict.fromkeys(m for m in QUOTED_HEX_ID.findall(frame) if m in note_ids))
+
+def mentions_any(frame: str, note_ids: Container[str]) -> bool:
+    """Check whether a raw frame references any of the given note IDs.
+
+    The scan costs one pass over the frame regardless of how many notes
+    are watched. It may match an event's own ID or pubkey, so callers
+    still check tags after decoding, but it never misses a reference.
+
+    Args:
+        frame: Raw EVENT frame
+        note_ids: Watched note IDs (any container with fast membership)
+
+    Returns:
+        True if some quoted 64-hex string in the frame is a watched ID
+    """
+    return any(match in note_ids for match in QUOTED_HEX_ID.findall(frame))
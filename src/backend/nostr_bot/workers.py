@@ -0,0 +1,176 @@
+"""Payment worker pool for AutoZap.
+
+This module decouples payment processing from event intake. Matched reposts
+go into a bounded queue that a configurable number of workers drain
+concurrently, so one slow LNbits call no longer holds up every repost
+behind it. Work for the same recipient is serialized so nobody is paid
+twice in parallel, and a job already queued or running is not queued again.
+"""
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from operator import attrgetter
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+class PaymentWorkerPool:
+    """Bounded queue of payment jobs drained by concurrent workers."""
+
+    def __init__(
+        self,
+        handler: Callable[[Any], None],
+        workers: int = 4,
+        queue_size: int = 1000,
+        key: Callable[[Any], str] = attrgetter("pubkey"),
+        job_id: Optional[Callable[[Any], Any]] = None
+    ):
+        """Initialize the pool without starting workers.
+
+        Args:
+            handler: Blocking function that processes one job; it runs in a
+                dedicated thread pool
+            workers: Number of jobs processed concurrently
+            queue_size: Maximum queued jobs before submit() waits
+            key: Returns the serialization key of a job (the recipient)
+            job_id: Returns the identity of a job; a job whose identity is
+                already queued or running is dropped (None to queue every job)
+        """
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+
+        self.handler = handler
+        self.workers = workers
+        self.key = key
+        self.job_id = job_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.processed = 0
+        self.failed = 0
+        self.in_flight = 0
+        self.max_depth = 0
+        self.duplicates = 0
+        self._active_ids: Set[Any] = set()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._tasks: List[asyncio.Task] = []
+        # Per-key locks with reference counts so idle keys are dropped
+        self._locks: Dict[str, Tuple[asyncio.Lock, int]] = {}
+
+    @property
+    def depth(self) -> int:
+        """Number of jobs waiting in the queue."""
+        return self.queue.qsize()
+
+    def start(self) -> None:
+        """Start the workers. Must be called from a running loop."""
+        if self._tasks:
+            return
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers,
+            thread_name_prefix="payment-worker"
+        )
+        self._tasks = [
+            asyncio.create_task(self._work(), name=f"payment-worker-{n}")
+            for n in range(self.workers)
+        ]
+
+    async def submit(self, job: Any) -> bool:
+        """Queue a job, waiting while the queue is full.
+
+        Args:
+            job: The job passed to the handler
+
+        Returns:
+            False if the same job is already queued or running
+        """
+        if self.job_id is not None:
+            job_id = self.job_id(job)
+            if job_id in self._active_ids:
+                self.duplicates += 1
+                return False
+            self._active_ids.add(job_id)
+            try:
+                await self.queue.put(job)
+            except BaseException:
+                self._active_ids.discard(job_id)
+                raise
+        else:
+            await self.queue.put(job)
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+        return True
+
+    async def _work(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self.queue.get()
+            key = self.key(job)
+            lock = self._acquire_lock(key)
+            try:
+                async with lock:
+                    self.in_flight += 1
+                    try:
+                        await loop.run_in_executor(self._executor, self.handler, job)
+                        self.processed += 1
+                    except Exception as e:
+                        self.failed += 1
+                        logger.error(f"Payment job for {key[:8]}... failed: {str(e)}")
+                    finally:
+                        self.in_flight -= 1
+            finally:
+                self._release_lock(key)
+                if self.job_id is not None:
+                    self._active_ids.discard(self.job_id(job))
+                self.queue.task_done()
+
+    def _acquire_lock(self, key: str) -> asyncio.Lock:
+        lock, users = self._locks.get(key, (None, 0))
+        if lock is None:
+            lock = asyncio.Lock()
+        self._locks[key] = (lock, users + 1)
+        return lock
+
+    def _release_lock(self, key: str) -> None:
+        lock, users = self._locks[key]
+        if users == 1:
+            del self._locks[key]
+        else:
+            self._locks[key] = (lock, users - 1)
+
+    async def close(self, timeout: float = 10.0) -> None:
+        """Stop the workers, first waiting up to timeout for queued jobs.
+
+        Args:
+            timeout: Seconds to wait for the queue to drain
+        """
+        if not self._tasks:
+            return
+
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Stopping payment workers with {self.depth} jobs still queued")
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        # Running handlers cannot be interrupted; wait for them off the loop
+        executor, self._executor = self._executor, None
+        await asyncio.get_running_loop().run_in_executor(None, executor.shutdown)
+
+    def stats(self) -> Dict[str, int]:
+        """Return queue and throughput counters.
+
+        Returns:
+            Dictionary with queue depth, high-water mark, in-flight,
+            processed, failed and dropped duplicate job counts
+        """
+        return {
+            "queue_depth": self.depth,
+            "max_queue_depth": self.max_depth,
+            "in_flight": self.in_flight,
+            "processed": self.processed,
+            "failed": self.failed,
+            "duplicates": self.duplicates,
+        }
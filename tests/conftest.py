@@ -0,0 +1,7 @@
+"""Shared test configuration."""
+
+import os
+import sys
+
+# The bot modules import each other as ``backend.*`` (run with PYTHONPATH=src)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
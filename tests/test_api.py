@@ -0,0 +1,113 @@
+"""Test the read-only stats API."""
+
+import json
+import sqlite3
+import urllib.error
+import urllib.request
+from datetime import datetime, timezone
+import pytest
+from backend.api.server import NotFound, ResponseCache, StatsAPI, start_api_server
+from backend.db.models import Campaign, Database, Payment
+
+NOTE = "a" * 64
+
+@pytest.fixture
+def api(tmp_path):
+    """A stats API reading a database another Database writes."""
+    path = str(tmp_path / "payments.db")
+    writer = Database(path)
+    writer.add_campaign(Campaign(NOTE, amount=100))
+    now = datetime.now()
+    for n in range(3):
+        writer.add_payment(Payment(None, f"npub{n}", 100, "bolt11", "paid" if n else "pending", now, NOTE))
+
+    api = StatsAPI(Database(path, read_only=True), health=lambda: {"running": True}, cache_seconds=60)
+    yield api, writer
+    api.close()
+    api.db.close()
+    writer.close()
+
+def test_response_cache_expires():
+    """Test that responses are reused until their TTL passes."""
+    now = [0.0]
+    cache = ResponseCache(ttl=5, clock=lambda: now[0])
+    calls = []
+    build = lambda: calls.append(1) or {"n": len(calls)}
+
+    body, etag = cache.get("key", build)
+    assert cache.get("key", build) == (body, etag)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    now[0] = 6
+    assert cache.get("key", build)[0] == b'{"n":2}'
+    assert len(calls) == 2
+
+def test_response_cache_is_bounded():
+    """Test that the oldest responses are dropped beyond max_entries."""
+    cache = ResponseCache(ttl=60, max_entries=2)
+    for key in ("a", "b", "c"):
+        cache.get(key, dict)
+    assert list(cache._entries) == ["b", "c"]
+
+def test_routes(api):
+    """Test each route against the read-only database."""
+    api, writer = api
+    campaigns = json.loads(api.respond("/api/campaigns")[0])["campaigns"]
+    assert campaigns == [{"note_id": NOTE, "amount": 100, "budget": None, "totals": {
+        "payments": 3, "amount": 300, "paid_payments": 2, "paid_amount": 200
+    }}]
+
+    payouts = json.loads(api.respond("/api/payouts?limit=2")[0])["payouts"]
+    assert [p["npub"] for p in payouts] == ["npub2", "npub1"]
+
+    note = json.loads(api.respond(f"/api/notes/{NOTE}")[0])
+    assert note["totals"]["paid_amount"] == 200
+
+    days = json.loads(api.respond("/api/totals/daily?days=7")[0])["days"]
+    assert days == [{
+        "day": datetime.now(timezone.utc).date().isoformat(),
+        "payments": 3, "amount": 300, "paid_payments": 2, "paid_amount": 200
+    }]
+    assert json.loads(api.respond("/api/health")[0]) == {"running": True}
+
+    for target in ("/api/other", "/api/notes/not-a-note-id"):
+        with pytest.raises(NotFound):
+            api.respond(target)
+
+    # The read-only connections cannot write
+    with pytest.raises(sqlite3.OperationalError):
+        api.db.add_campaign(Campaign("b" * 64))
+
+def test_cache_keys_use_parsed_parameters(api):
+    """Test that equivalent query strings share one cache entry."""
+    api, writer = api
+    api.respond("/api/payouts?limit=10")
+    api.respond("/api/payouts?limit=10&x=1")
+    api.respond("/api/payouts?limit=99999")
+    api.respond("/api/payouts?limit=500")
+    assert api.cache.misses == 2
+
+def test_http_etags(api):
+    """Test ETag and 304 handling over HTTP."""
+    api, writer = api
+    server = start_api_server(api, 0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/api/campaigns"
+        with urllib.request.urlopen(url) as response:
+            assert response.headers["Content-Type"] == "application/json"
+            assert response.headers["Cache-Control"] == "max-age=60"
+            etag = response.headers["ETag"]
+            body = response.read()
+        assert json.loads(body)["campaigns"][0]["note_id"] == NOTE
+
+        request = urllib.request.Request(url, headers={"If-None-Match": etag})
+        with pytest.raises(urllib.error.HTTPError) as e:
+            urllib.request.urlopen(request)
+        assert e.value.code == 304
+
+        with pytest.raises(urllib.error.HTTPError) as e:
+            urllib.request.urlopen(url.replace("campaigns", "missing"))
+        assert e.value.code == 404
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,100 @@
+"""Test the offline backfill from event dumps."""
+
+import asyncio
+import json
+import pytest
+from nostr.event import Event
+from nostr.key import PrivateKey
+from backend.db.models import Campaign, get_database
+from backend.ln_wallet.wallet import PaymentResult
+from backend.nostr_bot.campaigns import CampaignRegistry
+
+NOTE_ID = "b" * 64
+
+def event_line(kind=6, note_id=NOTE_ID, forged=False, wrap=False, tag="e"):
+    """Serialize a signed event referencing a note as one dump line."""
+    private_key = PrivateKey()
+    event = Event(private_key.public_key.hex(), "", kind=kind, tags=[[tag, note_id]])
+    private_key.sign_event(event)
+    data = {
+        "id": event.id, "pubkey": event.public_key, "created_at": event.created_at,
+        "kind": event.kind, "tags": event.tags, "content": event.content,
+        "sig": "0" * 128 if forged else event.signature,
+    }
+    return json.dumps(["EVENT", "export", data] if wrap else data) + "\n"
+
+@pytest.fixture
+def backfill(monkeypatch, tmp_path):
+    """Load the backfill module against a fresh database and fake LNbits."""
+    import backend.config
+    import backend.nostr_bot.backfill as backfill
+    import backend.nostr_bot.transactions as transactions
+
+    monkeypatch.setenv("LNBITS_API_KEY", "test_key")
+    monkeypatch.setenv("LNBITS_URL", "https://test.lnbits.com")
+    monkeypatch.setenv("NOSTR_RELAY_URLS", "wss://relay1.com")
+    monkeypatch.setenv("DB_PATH", str(tmp_path / "payments.db"))
+    monkeypatch.setattr(backend.config, "config", None)
+    monkeypatch.setattr(transactions, "_rate_limiter", None)
+
+    def fake_invoice(npub, note_id, amount, park_seconds):
+        return PaymentResult(success=True, status="invoice_generated", bolt11=f"bolt11-{npub}")
+
+    monkeypatch.setattr(transactions, "request_invoice_parked", fake_invoice)
+    yield backfill
+    get_database(str(tmp_path / "payments.db")).close()
+
+def test_scan_lines(backfill):
+    """Test that only genuine reposts of watched notes are returned."""
+    backfill._init_worker([Campaign(note_id=NOTE_ID)])
+    lines = [
+        event_line().encode(),
+        event_line(wrap=True).encode(),
+        event_line(forged=True).encode(),
+        event_line(note_id="c" * 64).encode(),
+        f'{{"id": "{NOTE_ID}", broken\n'.encode(),
+        b"\n",
+    ]
+    result = backfill.scan_lines(lines)
+    assert (result.lines, result.matched, result.rejected, result.malformed) == (6, 3, 1, 1)
+    assert [repost.note_id for repost in result.reposts] == [NOTE_ID, NOTE_ID]
+
+def test_backfill_pays_once_and_resumes(backfill, tmp_path):
+    """Test that reposts are paid once and checkpoints skip finished lines."""
+    dump = tmp_path / "reposts.jsonl"
+    dump.write_text("".join([event_line(), event_line(), event_line(forged=True), event_line(kind=1, tag="q")]))
+    campaigns = CampaignRegistry([Campaign(note_id=NOTE_ID)])
+    db = get_database(backfill.get_config().db_path)
+
+    dry = asyncio.run(backfill.backfill([str(dump)], campaigns, db, dry_run=True, workers=1, chunk_lines=2))
+    assert (dry.lines, dry.queued, dry.rejected) == (4, 3, 1)
+    assert db.get_backfill_checkpoint(str(dump)) == 0
+    assert db.get_payment_history() == []
+
+    stats = asyncio.run(backfill.backfill([str(dump)], campaigns, db, workers=1, chunk_lines=2))
+    assert (stats.lines, stats.queued, stats.rejected) == (4, 3, 1)
+    assert db.get_backfill_checkpoint(str(dump)) == dump.stat().st_size
+    assert len(db.get_payment_history()) == 3
+
+    # Resumed runs skip the processed lines; restarted ones find the outbox rows
+    assert asyncio.run(backfill.backfill([str(dump)], campaigns, db, workers=1)).lines == 0
+    again = asyncio.run(backfill.backfill([str(dump)], campaigns, db, workers=1, resume=False))
+    assert (again.queued, again.already_queued) == (0, 3)
+    assert len(db.get_payment_history()) == 3
+
+def test_backfill_leaves_live_entries_alone(backfill, tmp_path):
+    """Test that only outbox entries untouched for a lease are taken over."""
+    from backend.db.models import OutboxEntry
+
+    dump = tmp_path / "empty.jsonl"
+    dump.write_text("")
+    campaigns = CampaignRegistry([Campaign(note_id=NOTE_ID)])
+    db = get_database(backfill.get_config().db_path)
+    live = db.enqueue_outbox_entry(OutboxEntry(None, "live", "npub1", NOTE_ID))
+    abandoned = db.enqueue_outbox_entry(OutboxEntry(None, "abandoned", "npub2", NOTE_ID))
+    with db._get_connection() as conn:
+        conn.execute("UPDATE payment_outbox SET updated_at = updated_at - 1000 WHERE id = ?", (abandoned.id,))
+
+    asyncio.run(backfill.backfill([str(dump)], campaigns, db, workers=1))
+    assert db.get_outbox_entry(live.id).status == "pending"
+    assert db.get_outbox_entry(abandoned.id).status == "paid"
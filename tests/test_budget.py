@@ -0,0 +1,147 @@
+"""Test the spend budget ledger."""
+
+import itertools
+import threading
+from datetime import datetime
+import pytest
+from backend.db.models import Campaign, Database, OutboxEntry, Payment
+from backend.nostr_bot.budget import BudgetLedger
+
+# 2024-01-01 12:30 UTC
+NOW = 1704112200
+
+_events = itertools.count()
+
+@pytest.fixture
+def db(tmp_path):
+    """Create a database file that several connections can share."""
+    db = Database(str(tmp_path / "payments.db"))
+    yield db
+    db.close()
+
+def add_payment(db, note_id, amount, timestamp, status="pending"):
+    db.add_payment(Payment(None, "npub1", amount, "bolt11", status, datetime.fromtimestamp(timestamp), note_id))
+
+def claim(db, note_id):
+    entry = db.enqueue_outbox_entry(OutboxEntry(None, f"event{next(_events)}", "npub1", note_id))
+    return db.claim_outbox_entry(entry.id)
+
+def pay(db, ledger, note_id, amount):
+    """Reserve and record a payment the way process_payment does."""
+    entry = claim(db, note_id)
+    reservation = ledger.reserve(note_id, amount, entry.id)
+    if reservation is not None:
+        db.complete_outbox_entry(entry.id, Payment(
+            None, "npub1", amount, "bolt11", "pending", datetime.fromtimestamp(ledger.clock()), note_id
+        ))
+        ledger.commit(reservation)
+    return reservation
+
+def test_campaign_budget(db):
+    """Test reserving, paying and releasing against a campaign budget."""
+    ledger = BudgetLedger(db, clock=lambda: NOW)
+    ledger.set_budgets([Campaign("note1", budget=1000), Campaign("note2")])
+
+    first = ledger.reserve("note1", 600, 1)
+    assert first is not None
+    # Reserved amounts count until they are released
+    assert ledger.reserve("note1", 600, 2) is None
+    ledger.release(first)
+    assert pay(db, ledger, "note1", 600) is not None
+    assert ledger.remaining("note1") == 400
+    assert ledger.reserve("note1", 500, 3) is None
+    assert ledger.stats()["reserved"] == 0
+
+    # Campaigns without a budget are not limited
+    assert ledger.remaining("note2") is None
+    assert ledger.reserve("note2", 10 ** 9, 4) is not None
+    assert ledger.stats()["rejections"] == 2
+
+def test_windows_roll_over(db):
+    """Test hourly and daily limits with a moving clock."""
+    now = [NOW]
+    ledger = BudgetLedger(db, hourly_limit=100, daily_limit=150, clock=lambda: now[0])
+    pay(db, ledger, "note1", 100)
+    assert pay(db, ledger, "note1", 1) is None
+
+    now[0] += 3600
+    pay(db, ledger, "note1", 50)
+    # The hour has room but the day is spent
+    assert pay(db, ledger, "note1", 10) is None
+
+    now[0] += 86400
+    assert ledger.remaining("note1") == 100
+
+def test_counts_payment_totals(db):
+    """Test that spend is read from the payments in the database."""
+    add_payment(db, "note1", 300, NOW - 86400)  # Yesterday
+    add_payment(db, "note1", 200, NOW - 3600)  # Earlier today
+    add_payment(db, "note2", 100, NOW - 60)  # This hour
+
+    ledger = BudgetLedger(db, hourly_limit=1000, daily_limit=1000, clock=lambda: NOW)
+    ledger.set_budgets([Campaign("note1", budget=600)])
+    assert ledger.remaining("note1") == 100
+    assert ledger.remaining("note2") == 700
+
+    # Payments written elsewhere count straight away
+    held = ledger.reserve("note2", 100, 1)
+    add_payment(db, "note2", 400, NOW)
+    # The day now has 700 paid and 100 held
+    assert ledger.remaining("note2") == 200
+    ledger.release(held)
+    assert ledger.remaining("note2") == 300
+
+    # Payments that end unpaid stop counting
+    db.update_payment_statuses([("expired", db.get_payment_history()[0].id)])
+    assert ledger.remaining("note2") == 700
+    add_payment(db, "note2", 100, NOW, status="failed")
+    assert ledger.remaining("note2") == 700
+
+def test_reservations_belong_to_outbox_entries(db):
+    """Test that a reservation is replaced on takeover and dropped when its entry finishes."""
+    ledger = BudgetLedger(db, daily_limit=1000, clock=lambda: NOW)
+    entry = claim(db, "note1")
+    assert ledger.reserve("note1", 600, entry.id) is not None
+    # A takeover of the same entry replaces the stalled attempt's reservation
+    assert ledger.reserve("note1", 600, entry.id) is not None
+    assert ledger.remaining("note1") == 400
+
+    db.release_outbox_entry(entry.id, "over budget")
+    assert ledger.remaining("note1") == 1000
+
+def test_processes_share_the_limits(db):
+    """Test that ledgers in separate processes never overspend together."""
+    other = Database(db.db_path)
+    first = BudgetLedger(db, daily_limit=1000, clock=lambda: NOW)
+    second = BudgetLedger(other, daily_limit=1000, clock=lambda: NOW)
+
+    # Each ledger may use the full limit, but not on top of the other's spend
+    assert pay(db, first, "note1", 600) is not None
+    assert second.reserve("note2", 600, 100) is None
+    held = second.reserve("note2", 400, 100)
+    assert held is not None
+    assert first.reserve("note1", 1, 101) is None
+    second.release(held)
+    assert first.remaining("note1") == 400
+    other.close()
+
+def test_concurrent_reservations_never_overspend(db):
+    """Test that racing workers reserve exactly the budget."""
+    ledger = BudgetLedger(db)
+    ledger.set_budgets([Campaign("note1", budget=300)])
+    granted = []
+
+    def worker():
+        for _ in range(50):
+            reservation = pay(db, ledger, "note1", 1)
+            if reservation:
+                granted.append(reservation)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(granted) == 300
+    assert ledger.remaining("note1") == 0
+    assert ledger.stats()["reserved"] == 0
@@ -0,0 +1,54 @@
+"""Test the campaign registry."""
+
+from src.backend.db.models import Campaign
+from src.backend.nostr_bot.campaigns import CampaignRegistry
+
+def note(n):
+    """Create a distinct 64-character note ID."""
+    return f"{n:064x}"
+
+def test_lookup():
+    """Test note ID lookups against the index."""
+    registry = CampaignRegistry([Campaign(note(1), amount=10), Campaign(note(2))])
+    
+    assert note(1) in registry
+    assert note(3) not in registry
+    assert registry.get(note(1)).amount == 10
+    assert registry.get(note(3)) is None
+    assert len(registry) == 2
+
+def test_chunks_respect_size_limit():
+    """Test that notes are split into chunks no larger than the limit."""
+    registry = CampaignRegistry([Campaign(note(n)) for n in range(10)], chunk_size=4)
+    
+    chunks = registry.take_dirty_chunks()
+    assert [len(c) for c in chunks.values()] == [4, 4, 2]
+    assert sorted(n for c in chunks.values() for n in c) == sorted(registry.note_ids)
+    assert registry.take_dirty_chunks() == {}
+
+def test_changes_only_dirty_affected_chunks():
+    """Test that adding or removing a note only marks its own chunk."""
+    registry = CampaignRegistry([Campaign(note(n)) for n in range(8)], chunk_size=4)
+    registry.take_dirty_chunks()
+    
+    registry.remove(note(1))
+    assert registry.take_dirty_chunks() == {0: [note(0), note(2), note(3)]}
+    
+    # The freed slot is reused before a new chunk is opened
+    registry.add(Campaign(note(20)))
+    assert list(registry.take_dirty_chunks()) == [0]
+    
+    registry.add(Campaign(note(21)))
+    assert registry.take_dirty_chunks() == {2: [note(21)]}
+
+def test_replace():
+    """Test syncing the registry to a new set of campaigns."""
+    registry = CampaignRegistry([Campaign(note(1)), Campaign(note(2))], chunk_size=1)
+    registry.take_dirty_chunks()
+    
+    registry.replace([Campaign(note(2), amount=5), Campaign(note(3))])
+    
+    assert sorted(registry.note_ids) == [note(2), note(3)]
+    assert registry.get(note(2)).amount == 5
+    # Chunk 0 emptied out and was refilled with the new note
+    assert registry.take_dirty_chunks() == {0: [note(3)]}
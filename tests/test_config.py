@@ -78,4 +78,32 @@ def test_invalid_urls(monkeypatch):
         monkeypatch.setenv(key, value)
     
     with pytest.raises(ValueError, match="Invalid relay URL"):
-        validate_config()
\ No newline at end of file
+        validate_config()
+
+
+def test_watch_note_ids(mock_env, monkeypatch):
+    """Test parsing and validation of watched note IDs."""
+    note_id = "0987e3bd97d23819c65b50361b17c9a6ba693e2b72665802a12765836301bf94"
+    monkeypatch.setenv("WATCH_NOTE_IDS", f" {note_id.upper()} ,")
+    
+    config = validate_config()
+    assert config.watch_note_ids == [note_id]
+    
+    monkeypatch.setenv("WATCH_NOTE_IDS", "not_a_note_id")
+    with pytest.raises(ValueError, match="Invalid note ID"):
+        validate_config()
+
+
+def test_payout_mode(mock_env, monkeypatch):
+    """Test that paying lightning addresses must be chosen explicitly."""
+    assert validate_config().payout_mode == "invoice"
+    
+    monkeypatch.setenv("PAYOUT_MODE", "lightning_address")
+    with pytest.raises(ValueError, match="requires PROFILE_CACHE_HOURS"):
+        validate_config()
+    monkeypatch.setenv("PROFILE_CACHE_HOURS", "24")
+    assert validate_config().payout_mode == "lightning_address"
+    
+    monkeypatch.setenv("PAYOUT_MODE", "zap")
+    with pytest.raises(ValueError, match="PAYOUT_MODE must be"):
+        validate_config()
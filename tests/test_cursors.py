@@ -0,0 +1,54 @@
+"""Test per-relay subscription cursors."""
+
+from src.backend.nostr_bot.cursors import RelayCursors
+
+NOW = 1700000000
+
+def make_cursors():
+    """Create cursors with a fixed clock and a 60 second overlap."""
+    return RelayCursors(overlap_seconds=60, clock=lambda: NOW)
+
+def test_since_resumes_from_oldest_cursor():
+    """Test resume points per relay, bounded by the lookback default."""
+    cursors = make_cursors()
+    cursors.load([("ws://a", "note1", NOW - 100), ("ws://a", "note2", NOW - 500)])
+    default = NOW - 86400
+    
+    assert cursors.since("ws://a", ["note1", "note2"], default) == NOW - 560
+    assert cursors.since("ws://a", ["note1"], default) == NOW - 160
+    # A note or relay without a cursor needs the full lookback
+    assert cursors.since("ws://a", ["note1", "note3"], default) == default
+    assert cursors.since("ws://b", ["note1"], default) == default
+    # Never further back than the lookback window
+    assert cursors.since("ws://a", ["note2"], NOW - 200) == NOW - 200
+
+def test_catch_up_is_applied_on_eose():
+    """Test that stored events only advance cursors once the relay sends EOSE."""
+    cursors = make_cursors()
+    cursors.start_catch_up("ws://a", "sub0")
+    cursors.start_catch_up("ws://a", "sub1")
+    cursors.advance("ws://a", ["note1"], NOW - 10)
+    assert not cursors.is_live("ws://a")
+    assert cursors.take_dirty() == []
+    
+    cursors.end_catch_up("ws://a", "sub0")
+    assert cursors.take_dirty() == []
+    cursors.end_catch_up("ws://a", "sub1")
+    assert cursors.is_live("ws://a")
+    assert cursors.take_dirty() == [("ws://a", "note1", NOW - 10)]
+    
+    # Live events advance directly, but never past now
+    cursors.advance("ws://a", ["note1"], NOW + 3600)
+    assert cursors.take_dirty() == [("ws://a", "note1", NOW)]
+
+def test_disconnect_discards_unfinished_catch_up():
+    """Test that an interrupted catch-up leaves the cursor where it was."""
+    cursors = make_cursors()
+    cursors.load([("ws://a", "note1", NOW - 1000)])
+    cursors.start_catch_up("ws://a", "sub0")
+    cursors.advance("ws://a", ["note1"], NOW - 10)
+    cursors.disconnected("ws://a")
+    
+    assert cursors.is_live("ws://a")
+    assert cursors.since("ws://a", ["note1"], 0) == NOW - 1060
+    assert cursors.stats() == {"cursors": 1, "relays_catching_up": 0, "unsaved": 0}
@@ -3,7 +3,7 @@
 import pytest
 import sqlite3
 from datetime import datetime, timedelta
-from src.backend.db.models import Database, Payment
+from src.backend.db.models import Campaign, Database, OutboxEntry, Payment, PaymentTotals, Profile
 
 @pytest.fixture
 def test_db():
@@ -70,4 +70,259 @@ def test_get_payment_history(test_db):
     
     # Test getting payments for specific user
     user_history = test_db.get_payment_history("npub1")
-    assert len(user_history) == 2
\ No newline at end of file
+    assert len(user_history) == 2
+
+
+def test_campaigns(test_db):
+    """Test adding, listing and deactivating campaigns."""
+    test_db.add_campaign(Campaign("note1"))
+    test_db.add_campaign(Campaign("note2", amount=500, budget=10000))
+    
+    active = {c.note_id: c for c in test_db.get_active_campaigns()}
+    assert set(active) == {"note1", "note2"}
+    assert (active["note2"].amount, active["note2"].budget) == (500, 10000)
+    
+    assert test_db.deactivate_campaign("note1")
+    assert not test_db.deactivate_campaign("note1")
+    assert [c.note_id for c in test_db.get_active_campaigns()] == ["note2"]
+    
+    # Re-adding reactivates the campaign
+    test_db.add_campaign(Campaign("note1", amount=100))
+    assert len(test_db.get_active_campaigns()) == 2
+
+def test_persistent_connections(tmp_path):
+    """Test that file databases use WAL and reuse one connection per thread."""
+    import threading
+    
+    db = Database(str(tmp_path / "payments.db"))
+    try:
+        conn = db._get_connection()
+        assert conn is db._get_connection()
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        
+        # Other threads get their own connection to the same database
+        other = []
+        thread = threading.Thread(target=lambda: other.append(db._get_connection()))
+        thread.start()
+        thread.join()
+        assert other[0] is not conn
+        
+        db.add_payment(Payment(None, "npub1", 1000, "bolt11", "paid", datetime.now(), "note1"))
+        assert other[0].execute("SELECT COUNT(*) FROM payments").fetchone()[0] == 1
+    finally:
+        db.close()
+
+def test_get_database_is_shared(tmp_path):
+    """Test that the same path returns the same Database instance."""
+    from src.backend.db.models import get_database
+    
+    path = str(tmp_path / "shared.db")
+    db = get_database(path)
+    try:
+        assert get_database(path) is db
+    finally:
+        db.close()
+    
+    # A closed Database is not handed out again
+    reopened = get_database(path)
+    try:
+        assert reopened is not db
+        assert reopened.get_payment_history() == []
+    finally:
+        reopened.close()
+
+def test_migrates_legacy_schema(tmp_path):
+    """Test upgrading a database with text timestamps to the current schema."""
+    from src.backend.db.models import SCHEMA_VERSION
+    
+    path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(path)
+    conn.execute("""
+    CREATE TABLE payments (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        npub TEXT NOT NULL,
+        amount INTEGER NOT NULL,
+        bolt11 TEXT NOT NULL,
+        status TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        note_id TEXT NOT NULL
+    )
+    """)
+    conn.execute("""
+    INSERT INTO payments (npub, amount, bolt11, status, created_at, note_id)
+    VALUES ('npub1', 1000, 'bolt11', 'paid', '2024-01-01 12:00:00.123456', 'note1')
+    """)
+    conn.commit()
+    conn.close()
+    
+    db = Database(path)
+    try:
+        conn = db._get_connection()
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+        assert conn.execute("SELECT created_at FROM payments").fetchone()[0] == 1704110400
+        assert db.get_payment_history()[0].created_at == datetime.fromtimestamp(1704110400)
+        # Totals are built from the existing rows
+        assert db.get_note_totals("note1") == PaymentTotals(1, 1000, 1, 1000)
+        assert db.get_daily_totals() == [("2024-01-01", PaymentTotals(1, 1000, 1, 1000))]
+    finally:
+        db.close()
+
+def test_rate_limit_window_uses_index(test_db):
+    """Test the rate-limit lookup boundaries and that it is served by the index."""
+    old = datetime.now() - timedelta(hours=30)
+    test_db.add_payment(Payment(None, "npub1", 1000, "bolt11", "paid", old, "note1"))
+    test_db.add_payment(Payment(None, "npub2", 1000, "bolt11", "pending", datetime.now(), "note1"))
+    
+    assert not test_db.has_recent_payment("npub1", "note1", 24)
+    assert test_db.has_recent_payment("npub1", "note1", 48)
+    # Only paid rows count
+    assert not test_db.has_recent_payment("npub2", "note1", 24)
+    
+    plan = test_db.connection.execute(
+        "EXPLAIN QUERY PLAN SELECT 1 FROM payments "
+        "WHERE npub = ? AND note_id = ? AND status = 'paid' AND created_at >= ?",
+        ("npub1", "note1", 0)
+    ).fetchall()
+    assert "idx_payments_rate_limit" in str(plan)
+
+def test_payment_outbox(test_db):
+    """Test the outbox state machine and event ID idempotency."""
+    from src.backend.db.models import OutboxEntry
+    
+    entry = test_db.enqueue_outbox_entry(OutboxEntry(None, "event1", "npub1", "note1", 500))
+    assert entry.id > 0 and entry.status == "pending"
+    # The same repost event is queued only once
+    assert test_db.enqueue_outbox_entry(OutboxEntry(None, "event1", "npub1", "note1")) is None
+    other = test_db.enqueue_outbox_entry(OutboxEntry(None, "event2", "npub2", "note1"))
+    
+    assert test_db.claim_outbox_entry(entry.id)
+    assert test_db.claim_outbox_entry(other.id)
+    assert [e.event_id for e in test_db.get_unfinished_outbox_entries()] == ["event1", "event2"]
+    # Entries in flight belong to their worker until the lease runs out
+    assert test_db.claim_outbox_entry(entry.id) is None
+    
+    payment = Payment(None, "npub1", 500, "bolt11", "pending", datetime.now(), "note1")
+    payment_id = test_db.complete_outbox_entry(entry.id, payment)
+    assert test_db.get_payment_history()[0].id == payment_id
+    assert test_db.get_outbox_entry(entry.id).status == "paid"
+    # Finished entries cannot be claimed or completed again
+    assert not test_db.claim_outbox_entry(entry.id)
+    with pytest.raises(sqlite3.IntegrityError):
+        test_db.complete_outbox_entry(entry.id, payment)
+    assert len(test_db.get_payment_history()) == 1
+    
+    test_db.release_outbox_entry(other.id, "circuit open", retry=True)
+    assert test_db.get_outbox_entry(other.id).status == "pending"
+    assert test_db.claim_outbox_entry(other.id)
+    test_db.release_outbox_entry(other.id, "bad request")
+    failed = test_db.get_outbox_entry(other.id)
+    # The postponed attempt does not count
+    assert (failed.status, failed.attempts, failed.error) == ("failed", 1, "bad request")
+    assert test_db.get_unfinished_outbox_entries() == []
+
+def test_outbox_lease(test_db):
+    """Test that stalled entries are taken over with their payment hash."""
+    postponed = test_db.enqueue_outbox_entry(OutboxEntry(None, "event1", "npub1", "note1"))
+    stalled = test_db.enqueue_outbox_entry(OutboxEntry(None, "event2", "npub2", "note1"))
+    test_db.enqueue_outbox_entry(OutboxEntry(None, "event3", "npub3", "note1"))
+    
+    test_db.claim_outbox_entry(postponed.id)
+    test_db.release_outbox_entry(postponed.id, "circuit open", retry=True)
+    test_db.claim_outbox_entry(stalled.id)
+    assert test_db.set_outbox_payment_hash(stalled.id, "hash2")
+    assert test_db.get_stale_outbox_entries(60, 900) == []
+    
+    with test_db._get_connection() as conn:
+        conn.execute("UPDATE payment_outbox SET updated_at = updated_at - 1000")
+    # Postponed entries are due after the retry delay, the rest after a lease
+    assert [e.event_id for e in test_db.get_stale_outbox_entries(60, 2000)] == ["event1"]
+    assert [e.event_id for e in test_db.get_stale_outbox_entries(60, 900)] == ["event1", "event2", "event3"]
+    assert test_db.claim_outbox_entry(stalled.id, lease_seconds=2000) is None
+    
+    taken = test_db.claim_outbox_entry(stalled.id, lease_seconds=900)
+    assert (taken.status, taken.attempts, taken.payment_hash) == ("submitted", 2, "hash2")
+    assert test_db.claim_outbox_entry(stalled.id) is None
+
+def test_relay_cursors(test_db):
+    """Test that saved relay cursors only move forward."""
+    test_db.save_relay_cursors([("ws://a", "note1", 100), ("ws://b", "note1", 50)])
+    test_db.save_relay_cursors([("ws://a", "note1", 90), ("ws://b", "note1", 60)])
+    assert sorted(test_db.get_relay_cursors()) == [("ws://a", "note1", 100), ("ws://b", "note1", 60)]
+
+def test_pending_payments_pages_and_updates(test_db):
+    """Test keyset pages of pending payments and batched status updates."""
+    ids = [
+        test_db.add_payment(Payment(
+            id=None, npub=f"npub{n}", amount=1, bolt11="bolt11", status="pending",
+            created_at=datetime.now(), note_id="note1", payment_hash=f"hash{n}" if n else None
+        ))
+        for n in range(4)
+    ]
+    
+    # Rows without a payment hash cannot be looked up and are skipped
+    first = test_db.get_pending_payments(0, limit=2)
+    assert [row[0] for row in first] == ids[1:3]
+    assert [row[0] for row in test_db.get_pending_payments(first[-1][0], limit=2)] == ids[3:]
+    
+    assert test_db.update_payment_statuses([("paid", ids[1]), ("expired", ids[2])]) == 2
+    # Only pending rows change
+    assert test_db.update_payment_statuses([("failed", ids[1])]) == 0
+    assert [row[0] for row in test_db.get_pending_payments()] == ids[3:]
+    assert test_db.has_recent_payment("npub1", "note1")
+
+def test_iter_payments_keyset_pages(test_db):
+    """Test that filtered history is read in stable pages in either order."""
+    base = datetime(2024, 1, 1)
+    for n in range(7):
+        # Pairs share a timestamp, so pages must break ties on the ID
+        test_db.add_payment(Payment(
+            None, f"npub{n % 2}", 10, "bolt11", "paid" if n % 3 else "pending",
+            base + timedelta(minutes=n // 2), "note1" if n < 5 else "note2"
+        ))
+    
+    newest = [p.id for p in test_db.iter_payments(page_size=2)]
+    assert newest == [p.id for p in test_db.get_payment_history()]
+    assert len(newest) == len(set(newest)) == 7
+    assert [p.id for p in test_db.iter_payments(newest_first=False, page_size=3)] == newest[::-1]
+    
+    since = int((base + timedelta(minutes=1)).timestamp())
+    until = int((base + timedelta(minutes=3)).timestamp())
+    selected = list(test_db.iter_payments(note_id="note1", status="paid", since=since, until=until, page_size=1))
+    assert [(p.note_id, p.status) for p in selected] == [("note1", "paid")] * 2
+    assert all(since <= p.created_at.timestamp() < until for p in selected)
+    assert {p.npub for p in test_db.iter_payments(npub="npub1")} == {"npub1"}
+
+def test_payment_totals_follow_writes(test_db):
+    """Test that totals change with inserts, outbox payments and status changes."""
+    day = datetime(2024, 1, 1, 12)
+    pending = test_db.add_payment(Payment(None, "npub1", 100, "bolt11", "pending", day, "note1"))
+    test_db.add_payment(Payment(None, "npub2", 50, "bolt11", "paid", day, "note1"))
+    entry = test_db.enqueue_outbox_entry(OutboxEntry(None, "event1", "npub1", "note2", 20))
+    test_db.claim_outbox_entry(entry.id)
+    test_db.complete_outbox_entry(entry.id, Payment(None, "npub1", 20, "bolt11", "pending", day, "note2"))
+    
+    assert test_db.get_note_totals("note1") == PaymentTotals(2, 150, 1, 50)
+    assert test_db.get_user_totals("npub1") == PaymentTotals(2, 120, 0, 0)
+    
+    test_db.update_payment_statuses([("paid", pending)])
+    assert test_db.get_note_totals("note1") == PaymentTotals(2, 150, 2, 150)
+    assert test_db.get_user_totals("npub1") == PaymentTotals(2, 120, 1, 100)
+    assert test_db.get_daily_totals("2024-01-01", "2024-01-01") == [("2024-01-01", PaymentTotals(3, 170, 2, 150))]
+    assert test_db.get_daily_totals("2024-01-02") == []
+    assert test_db.get_note_totals("missing") == PaymentTotals()
+
+def test_profiles_round_trip(test_db):
+    """Test storing, replacing and chunked lookup of profiles."""
+    test_db.save_profiles([
+        Profile("a" * 64, lud16="alice@example.com", created_at=10, fetched_at=100),
+        Profile("b" * 64, fetched_at=100),
+    ])
+    test_db.save_profiles([Profile("a" * 64, lud06="lnurl1xyz", created_at=20, fetched_at=200)])
+    
+    pubkeys = ["a" * 64, "b" * 64] + [f"{i:064x}" for i in range(1200)]
+    profiles = {p.pubkey: p for p in test_db.get_profiles(pubkeys)}
+    assert profiles == {
+        "a" * 64: Profile("a" * 64, None, "lnurl1xyz", 20, 200),
+        "b" * 64: Profile("b" * 64, None, None, 0, 100),
+    }
+    assert profiles["a" * 64].has_address and not profiles["b" * 64].has_address
@@ -0,0 +1,92 @@
+"""Test bounded event deduplication."""
+
+import pytest
+from src.backend.nostr_bot.dedup import EventDeduplicator
+
+class FakeClock:
+    """Manually advanced clock."""
+    
+    def __init__(self, now=1700000000.0):
+        self.now = now
+    
+    def __call__(self):
+        return self.now
+
+def event_id(n):
+    """Create a distinct 64-character event ID."""
+    return f"{n:064x}"[::-1]
+
+@pytest.fixture
+def clock():
+    """Create a fake clock."""
+    return FakeClock()
+
+def test_duplicates_are_detected(clock):
+    """Test that a repeated ID is reported as seen."""
+    dedup = EventDeduplicator(window_seconds=60, bucket_count=6, clock=clock)
+    
+    assert not dedup.seen(event_id(1))
+    assert dedup.seen(event_id(1))
+    assert not dedup.seen(event_id(2))
+    assert dedup.stats() == {"hits": 1, "misses": 2, "evictions": 0, "entries": 2}
+
+def test_ids_expire_after_window(clock):
+    """Test that IDs are forgotten once their bucket leaves the window."""
+    dedup = EventDeduplicator(window_seconds=60, bucket_count=6, clock=clock)
+    dedup.seen(event_id(1))
+    
+    clock.now += 30
+    dedup.seen(event_id(2))
+    assert dedup.seen(event_id(1))
+    
+    clock.now += 35
+    assert not dedup.seen(event_id(1))
+    assert dedup.seen(event_id(2))
+    assert dedup.stats()["evictions"] == 1
+
+def test_entry_cap_bounds_memory(clock):
+    """Test that the oldest buckets are dropped when the cap is exceeded."""
+    dedup = EventDeduplicator(window_seconds=60, bucket_count=6, max_entries=5, clock=clock)
+    for n in range(4):
+        dedup.seen(event_id(n))
+    clock.now += 10
+    for n in range(4, 8):
+        dedup.seen(event_id(n))
+    
+    assert len(dedup) <= 5
+    assert dedup.stats()["evictions"] == 4
+    assert dedup.seen(event_id(7))
+    assert not dedup.seen(event_id(0))
+    
+    # A single bucket is trimmed instead of growing past the cap
+    single = EventDeduplicator(window_seconds=60, bucket_count=1, max_entries=3, clock=clock)
+    for n in range(10):
+        single.seen(event_id(n))
+    assert len(single) <= 3
+    assert single.seen(event_id(9))
+
+def test_snapshot_round_trip(clock, tmp_path):
+    """Test that a snapshot restores IDs still inside the window."""
+    path = str(tmp_path / "dedup.snapshot")
+    dedup = EventDeduplicator(window_seconds=60, bucket_count=6, clock=clock)
+    dedup.seen(event_id(1))
+    clock.now += 30
+    dedup.seen(event_id(2))
+    dedup.save(path)
+    
+    clock.now += 40
+    restored = EventDeduplicator(window_seconds=60, bucket_count=6, clock=clock)
+    assert restored.load(path)
+    assert len(restored) == 1
+    assert restored.seen(event_id(2))
+    assert not restored.seen(event_id(1))
+
+def test_unreadable_snapshot_is_ignored(clock, tmp_path):
+    """Test that a corrupt or missing snapshot leaves an empty deduplicator."""
+    dedup = EventDeduplicator(clock=clock)
+    assert not dedup.load(str(tmp_path / "missing"))
+    
+    path = tmp_path / "corrupt"
+    path.write_bytes(b"garbage")
+    assert not dedup.load(str(path))
+    assert len(dedup) == 0
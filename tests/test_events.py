@@ -0,0 +1,74 @@
+"""Test repost subscription filters and event matching."""
+
+import pytest
+from nostr.event import Event
+from src.backend.db.models import Campaign
+from src.backend.nostr_bot.campaigns import CampaignRegistry
+from src.backend.nostr_bot.events import (
+    build_repost_filters,
+    extract_repost_info,
+    REPOST_KIND,
+    GENERIC_REPOST_KIND,
+)
+
+NOTE_ID = "0987e3bd97d23819c65b50361b17c9a6ba693e2b72665802a12765836301bf94"
+PUBKEY = "a" * 64
+
+@pytest.fixture
+def campaigns():
+    """Create a registry watching the test note."""
+    return CampaignRegistry([Campaign(NOTE_ID, amount=21), Campaign("d" * 64)])
+
+def make_event(kind, tags, content=""):
+    """Create an unsigned event for matching tests."""
+    return Event(PUBKEY, content, created_at=1700000000, kind=kind, tags=tags)
+
+def test_build_repost_filters():
+    """Test that filters constrain kinds, referenced notes and age."""
+    filters = build_repost_filters([NOTE_ID], since=1700000000).to_json_array()
+    
+    assert len(filters) == 2
+    reposts, quotes = filters
+    assert reposts["kinds"] == [REPOST_KIND, GENERIC_REPOST_KIND]
+    assert reposts["#e"] == [NOTE_ID]
+    assert reposts["since"] == 1700000000
+    assert quotes["kinds"] == [1]
+    assert quotes["#q"] == [NOTE_ID]
+    assert quotes["since"] == 1700000000
+
+def test_build_repost_filters_without_since():
+    """Test that no since bound is sent when none is given."""
+    filters = build_repost_filters([NOTE_ID]).to_json_array()
+    assert all("since" not in f for f in filters)
+
+@pytest.mark.parametrize("kind,tag", [
+    (REPOST_KIND, "e"),
+    (GENERIC_REPOST_KIND, "e"),
+    (1, "q"),
+])
+def test_extract_repost_info_match(campaigns, kind, tag):
+    """Test that reposts and quotes of a watched note are recognized."""
+    event = make_event(kind, [["p", PUBKEY], [tag, "b" * 64], [tag, NOTE_ID]], "nice")
+    repost = extract_repost_info(event, campaigns)
+    
+    assert repost is not None
+    assert repost.pubkey == PUBKEY
+    assert repost.note_id == NOTE_ID
+    assert repost.event_id == event.id
+    assert repost.amount == 21
+
+def test_extract_repost_info_rejects_unrelated_events(campaigns):
+    """Test the client-side safety check on kinds and tags."""
+    # Reaction (kind 7) to the note is not a repost
+    assert extract_repost_info(make_event(7, [["e", NOTE_ID]]), campaigns) is None
+    # Repost of some other note
+    assert extract_repost_info(make_event(REPOST_KIND, [["e", "b" * 64]]), campaigns) is None
+    # Malformed tags are ignored
+    assert extract_repost_info(make_event(REPOST_KIND, [["e"]]), campaigns) is None
+
+def test_extract_repost_info_ignores_replies(campaigns):
+    """Test that a text note replying to a watched note is not paid as a repost."""
+    reply = make_event(1, [["e", NOTE_ID, "", "root"], ["p", PUBKEY]], "great post")
+    assert extract_repost_info(reply, campaigns) is None
+    # Reposts only reference the note with "e"
+    assert extract_repost_info(make_event(REPOST_KIND, [["q", NOTE_ID]]), campaigns) is None
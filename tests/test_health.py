@@ -0,0 +1,81 @@
+"""Test relay health tracking and scoring."""
+
+import asyncio
+from src.backend.nostr_bot.health import RelayHealthTracker, RelayScorer
+from src.backend.nostr_bot.relay_pool import RelayPool
+
+class Clock:
+    """Manually advanced monotonic clock."""
+    
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+def test_tracker_records_latencies_and_ratios():
+    """Test connect, first event and EOSE timing plus delivery counters."""
+    clock = Clock()
+    tracker = RelayHealthTracker(clock)
+    
+    tracker.connecting("ws://a")
+    clock.now = 0.5
+    tracker.connected("ws://a")
+    clock.now = 0.75
+    tracker.event("ws://a", duplicate=False)
+    clock.now = 1.5
+    tracker.event("ws://a", duplicate=True)
+    tracker.eose("ws://a")
+    tracker.closed("ws://a")
+    tracker.connecting("ws://a")
+    tracker.closed("ws://a")
+    
+    report = tracker.report()["ws://a"]
+    assert report["connect_latency"] == 0.5
+    assert report["first_event_latency"] == 0.25
+    assert report["eose_latency"] == 1.0
+    assert (report["events"], report["unique_events"], report["duplicate_ratio"]) == (2, 1, 0.5)
+    assert (report["connect_failures"], report["disconnects"], report["failure_rate"]) == (1, 1, 1.0)
+    assert not report["connected"]
+
+def test_scorer_drops_redundant_relay_and_promotes_backup():
+    """Test that a fully redundant relay is swapped for a backup."""
+    clock = Clock()
+    tracker = RelayHealthTracker(clock)
+    for url in ("ws://a", "ws://b", "ws://c"):
+        tracker.get(url)
+    for _ in range(60):
+        tracker.event("ws://a", duplicate=False)
+        tracker.event("ws://b", duplicate=True)
+        tracker.event("ws://c", duplicate=True)
+    tracker.event("ws://c", duplicate=False)
+    
+    scorer = RelayScorer(min_active=2, min_age=300, min_events=50)
+    active = ["ws://a", "ws://b", "ws://c"]
+    
+    # Too new to judge
+    assert scorer.evaluate(tracker, active, ["ws://d"], now=10) == (None, None)
+    
+    clock.now = 400
+    assert scorer.evaluate(tracker, active, ["ws://d"], now=400) == ("ws://b", "ws://d")
+    # Without backups, relays are only dropped above the minimum
+    assert scorer.evaluate(tracker, active, [], now=400) == ("ws://b", None)
+    assert scorer.evaluate(tracker, ["ws://a", "ws://b"], [], now=400) == (None, None)
+
+def test_pool_rebalance_swaps_relays():
+    """Test that the pool demotes a dropped relay to the end of the standby list."""
+    async def scenario():
+        pool = RelayPool(["ws://a", "ws://b"], backups=["ws://c", "ws://a"])
+        assert pool.standby == ["ws://c"]
+        
+        for _ in range(60):
+            pool.health.event("ws://b", duplicate=True)
+        pool.health.relays["ws://b"].added_at -= 1000
+        
+        await pool.rebalance(RelayScorer(min_active=2, min_age=300))
+        assert sorted(pool.relays) == ["ws://a", "ws://c"]
+        assert pool.standby == ["ws://b"]
+        assert "ws://b" not in pool.health_report()
+        await pool.close()
+    
+    asyncio.run(scenario())
@@ -0,0 +1,252 @@
+"""Test LNURL-pay resolution against a local provider stand-in."""
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import pytest
+from nostr.bech32 import Encoding, bech32_encode, convertbits
+from backend.ln_wallet.lnurl import (
+    MAX_RESPONSE_BYTES, LNURLError, LNURLResolver, LNURLUnavailable, check_provider_url, decode_lnurl,
+    invoice_msat, invoice_payment_hash, pay_address, pay_url
+)
+from backend.ln_wallet import lnurl
+from backend.ln_wallet.wallet import PaymentError
+
+PAYMENT_HASH = "ab" * 32
+
+def make_invoice(msat, payment_hash=PAYMENT_HASH):
+    """Build an unsigned BOLT11 invoice with an amount and payment hash."""
+    tagged = [1, 1, 20] + convertbits(bytes.fromhex(payment_hash), 8, 5)
+    return bech32_encode(f"lnbc{msat // 100}n", [0] * 7 + tagged + [0] * 104, Encoding.BECH32)
+
+class FakeProvider:
+    """Threaded HTTP server answering LNURL-pay requests."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.status = 200
+        self.invoice_amount = None  # Overrides the amount in returned invoices
+        self.callback_domain = None  # Overrides the host of the callback
+        self.padding = 0  # Extra bytes added to each response
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self.domain = f"127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlsplit(self.path)
+                with fake._lock:
+                    fake.requests.append(self.path)
+                    fake.in_flight += 1
+                    fake.max_in_flight = max(fake.max_in_flight, fake.in_flight)
+                try:
+                    time.sleep(fake.latency)
+                    if fake.status != 200:
+                        self.send_error(fake.status)
+                        return
+                    if url.path.startswith("/.well-known/lnurlp/"):
+                        body = {
+                            "tag": "payRequest",
+                            "callback": f"http://{fake.callback_domain or fake.domain}/callback/{url.path.rsplit('/', 1)[1]}",
+                            "minSendable": 1000,
+                            "maxSendable": 5_000_000,
+                            "metadata": "[[\"text/plain\", \"zap me\"]]",
+                            "commentAllowed": 5,
+                        }
+                    else:
+                        msat = fake.invoice_amount or int(parse_qs(url.query)["amount"][0])
+                        body = {"pr": make_invoice(msat), "routes": []}
+                    body["padding"] = "x" * fake.padding
+                    data = json.dumps(body).encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Cache-Control", "max-age=600")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                finally:
+                    with fake._lock:
+                        fake.in_flight -= 1
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest.fixture
+def provider():
+    """Start a provider stand-in."""
+    fake = FakeProvider()
+    yield fake
+    fake.close()
+
+def test_address_parsing():
+    """Test lightning address and LNURL decoding and invoice amounts."""
+    assert pay_url("Alice@Example.com") == "https://example.com/.well-known/lnurlp/alice"
+    url = "https://example.com/lnurlp/a-rather-long-path-that-makes-this-lnurl-longer-than-ninety-characters"
+    lnurl = bech32_encode("lnurl", convertbits(url.encode(), 8, 5), Encoding.BECH32).upper()
+    assert decode_lnurl(f"lightning:{lnurl}") == url
+    assert pay_url(lnurl) == url
+    with pytest.raises(LNURLError):
+        decode_lnurl(lnurl[:-1] + "Q")
+    with pytest.raises(LNURLError):
+        pay_url("@example.com")
+
+    assert invoice_msat("lnbc10u1pzap") == 1_000_000
+    assert invoice_msat("lnbc2500n1pzap") == 250_000
+    assert invoice_msat("lnbc1pzap") is None
+    assert invoice_payment_hash(make_invoice(21_000)) == PAYMENT_HASH
+    assert invoice_payment_hash("lnbc10u1pzap") is None
+
+def test_unsafe_urls_are_refused(provider, monkeypatch):
+    """Test that only https URLs of public hosts on the default port are requested."""
+    check_provider_url("https://example.com/.well-known/lnurlp/alice")
+    check_provider_url("https://example.com:443/callback")
+    for url in [
+        "http://example.com/lnurlp/alice",
+        "https://example.com:8443/lnurlp/alice",
+        "https://127.0.0.1/lnurlp/alice",
+        "https://[::1]/lnurlp/alice",
+        "https://10.0.0.1/lnurlp/alice",
+        "https://localhost/lnurlp/alice",
+        "https://wallet.localhost/lnurlp/alice",
+        "https://intranet/lnurlp/alice",
+        "https://user@example.com/lnurlp/alice",
+        "file:///etc/passwd",
+    ]:
+        with pytest.raises(LNURLError):
+            check_provider_url(url)
+
+    resolver = LNURLResolver()
+    try:
+        with pytest.raises(LNURLError):
+            resolver.pay_params(f"alice@{provider.domain}")
+        # Hosts resolving to private addresses are refused before connecting
+        monkeypatch.setattr(lnurl.socket, "getaddrinfo", lambda *args, **kwargs: [
+            (None, None, None, "", ("192.168.1.10", 443))
+        ])
+        with pytest.raises(LNURLError):
+            resolver.pay_params("alice@wallet.example.com")
+        assert provider.requests == []
+    finally:
+        resolver.close()
+
+def test_untrusted_responses_are_refused(provider):
+    """Test that callbacks to other hosts and oversized responses are refused."""
+    resolver = LNURLResolver(allow_local=True)
+    try:
+        provider.callback_domain = "169.254.169.254"
+        with pytest.raises(LNURLError):
+            resolver.pay_params(f"alice@{provider.domain}")
+
+        provider.callback_domain = None
+        provider.padding = MAX_RESPONSE_BYTES
+        with pytest.raises(LNURLError):
+            resolver.pay_params(f"bob@{provider.domain}")
+        assert resolver.stats()["cached"] == 0
+    finally:
+        resolver.close()
+
+def test_pay_params_are_cached(provider):
+    """Test that invoices for one address reuse the fetched pay parameters."""
+    resolver = LNURLResolver(allow_local=True)
+    address = f"alice@{provider.domain}"
+    try:
+        assert resolver.request_invoice(address, 100, comment="thanks!") == make_invoice(100_000)
+        assert resolver.request_invoice(address, 200) == make_invoice(200_000)
+        paths = provider.requests
+        assert paths[0] == "/.well-known/lnurlp/alice"
+        assert paths[1] == "/callback/alice?amount=100000&comment=thank"
+        assert paths[2] == "/callback/alice?amount=200000"
+        assert resolver.stats()["cache_hits"] == 1
+
+        # Outside the provider's limits, no callback is made
+        with pytest.raises(LNURLError):
+            resolver.request_invoice(address, 10_000)
+        assert len(provider.requests) == 3
+
+        # An invoice for a different amount is refused
+        provider.invoice_amount = 999_000
+        with pytest.raises(LNURLError):
+            resolver.request_invoice(address, 100)
+    finally:
+        resolver.close()
+
+def test_failures_back_off(provider):
+    """Test that a failing provider is not asked again until its backoff ends."""
+    now = [0.0]
+    resolver = LNURLResolver(allow_local=True, clock=lambda: now[0])
+    provider.status = 503
+    try:
+        with pytest.raises(LNURLError):
+            resolver.pay_params(f"alice@{provider.domain}")
+        # Other addresses at the same domain back off too
+        with pytest.raises(LNURLUnavailable):
+            resolver.pay_params(f"bob@{provider.domain}")
+        assert len(provider.requests) == 1
+        assert resolver.stats()["backing_off"] == 1
+
+        provider.status = 200
+        now[0] = 31
+        assert resolver.pay_params(f"bob@{provider.domain}").max_sendable == 5_000_000
+        assert resolver.stats()["backing_off"] == 0
+    finally:
+        resolver.close()
+
+def test_domain_concurrency_is_limited():
+    """Test that concurrent requests to one domain stay within the limit."""
+    provider = FakeProvider(latency=0.05)
+    resolver = LNURLResolver(allow_local=True, domain_concurrency=2)
+    try:
+        addresses = [f"user{i}@{provider.domain}" for i in range(8)]
+        with ThreadPoolExecutor(8) as executor:
+            list(executor.map(resolver.pay_params, addresses + addresses))
+        assert len(provider.requests) == 8
+        assert provider.max_in_flight == 2
+    finally:
+        resolver.close()
+        provider.close()
+
+def test_pay_address(provider):
+    """Test that the invoice from the provider is paid through LNbits."""
+    class Client:
+        paid = []
+        status = "success"
+
+        def pay_invoice(self, bolt11):
+            self.paid.append(bolt11)
+            return {"payment_hash": "hash", "status": self.status}
+
+    resolver = LNURLResolver(allow_local=True)
+    hashes = []
+    try:
+        result = pay_address(resolver, Client(), f"alice@{provider.domain}", 21, on_invoice=hashes.append)
+        assert result.success and result.status == "paid"
+        assert result.payment_hash == "hash"
+        assert Client.paid == [make_invoice(21_000)]
+        # The payment hash is known before LNbits is asked to pay
+        assert hashes == [PAYMENT_HASH]
+
+        # The status is the one LNbits reports
+        Client.status = "pending"
+        assert pay_address(resolver, Client(), f"alice@{provider.domain}", 21).status == "pending"
+        Client.status = "failed"
+        with pytest.raises(PaymentError):
+            pay_address(resolver, Client(), f"alice@{provider.domain}", 21)
+    finally:
+        resolver.close()
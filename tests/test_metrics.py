@@ -0,0 +1,85 @@
+"""Test the metrics registry and its HTTP endpoint."""
+
+import urllib.request
+from src.backend.metrics import Counter, Gauge, Histogram, Registry, start_http_server
+
+def test_disabled_registry_records_nothing():
+    """Test that updates are dropped until the registry is enabled."""
+    registry = Registry()
+    counter = Counter("test_total", "Test counter", ["relay"], registry=registry)
+    histogram = Histogram("test_seconds", "Test histogram", registry=registry)
+    
+    counter.inc("ws://a")
+    histogram.observe(0.1)
+    with histogram.time():
+        pass
+    assert counter.value("ws://a") == 0
+    assert histogram.count() == 0
+    
+    registry.enabled = True
+    counter.inc("ws://a")
+    counter.inc("ws://a", amount=2)
+    assert counter.value("ws://a") == 3
+
+def test_render_prometheus_text():
+    """Test the exposition format for each metric type."""
+    registry = Registry()
+    registry.enabled = True
+    counter = Counter("events_total", "Events", ["relay"], registry=registry)
+    gauge = Gauge("queue_depth", "Depth", ["queue"], registry=registry)
+    histogram = Histogram("stage_seconds", "Stages", ["stage"], buckets=(0.1, 1.0), registry=registry)
+    
+    counter.inc('ws://"a"')
+    gauge.set_function(lambda: 7, "payment")
+    histogram.observe(0.05, "match")
+    histogram.observe(0.5, "match")
+    histogram.observe(5, "match")
+    
+    text = registry.render()
+    assert "# TYPE events_total counter" in text
+    assert 'events_total{relay="ws://\\"a\\""} 1' in text
+    assert 'queue_depth{queue="payment"} 7' in text
+    assert 'stage_seconds_bucket{stage="match",le="0.1"} 1' in text
+    assert 'stage_seconds_bucket{stage="match",le="1.0"} 2' in text
+    assert 'stage_seconds_bucket{stage="match",le="+Inf"} 3' in text
+    assert 'stage_seconds_count{stage="match"} 3' in text
+    assert 'stage_seconds_sum{stage="match"} 5.55' in text
+
+def test_http_server_serves_metrics():
+    """Test that /metrics is served and other paths are not."""
+    registry = Registry()
+    Counter("served_total", "Served", registry=registry).inc()
+    server = start_http_server(0, registry=registry)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        with urllib.request.urlopen(f"{url}/metrics") as response:
+            assert response.headers["Content-Type"].startswith("text/plain")
+            assert "served_total" in response.read().decode()
+        try:
+            urllib.request.urlopen(f"{url}/other")
+            assert False, "expected 404"
+        except urllib.error.HTTPError as e:
+            assert e.code == 404
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_merge_snapshots():
+    """Test combining the metrics of several processes."""
+    registries = [Registry() for _ in range(3)]
+    for registry in registries:
+        registry.enabled = True
+        Counter("events_total", "Events", ["relay"], registry=registry)
+        Gauge("queue_depth", "Depth", registry=registry)
+        Histogram("stage_seconds", "Stages", buckets=(0.1, 1.0), registry=registry)
+    for n, registry in enumerate(registries[1:], 1):
+        registry.metrics["events_total"].inc("ws://a", amount=n)
+        registry.metrics["queue_depth"].set_function(lambda n=n: n * 10)
+        registry.metrics["stage_seconds"].observe(0.05 * n)
+    
+    merged = registries[0]
+    merged.merge(registry.snapshot() for registry in registries[1:])
+    assert merged.metrics["events_total"].value("ws://a") == 3
+    assert "queue_depth 30" in merged.render()
+    assert merged.metrics["stage_seconds"].count() == 2
+    assert 'stage_seconds_bucket{le="0.1"} 2' in merged.render()
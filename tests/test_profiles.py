@@ -0,0 +1,164 @@
+"""Test batched recipient profile lookups."""
+
+import asyncio
+import json
+import pytest
+import websockets
+from nostr.event import Event
+from nostr.key import PrivateKey
+from backend.db.models import Database, Profile
+from backend.nostr_bot.profiles import ProfileCache, ProfileResolver, parse_profile
+from backend.nostr_bot.relay_pool import RelayPool
+from backend.nostr_bot.wire import WireEvent
+
+def make_metadata(content, private_key=None, created_at=None):
+    """Create a kind-0 event signed by the given or a fresh key."""
+    private_key = private_key or PrivateKey()
+    event = Event(private_key.public_key.hex(), json.dumps(content), created_at=created_at, kind=0)
+    private_key.sign_event(event)
+    return event
+
+def event_data(event):
+    """Return the event as a relay would send it."""
+    return {
+        "id": event.id,
+        "pubkey": event.public_key,
+        "created_at": event.created_at,
+        "kind": event.kind,
+        "tags": event.tags,
+        "content": event.content,
+        "sig": event.signature,
+    }
+
+async def start_relay(events, requests):
+    """Start a relay that answers each REQ with the matching authors' events and EOSE."""
+    async def handler(websocket):
+        async for frame in websocket:
+            message = json.loads(frame)
+            requests.append(message)
+            if message[0] == "REQ":
+                authors = set(message[2]["authors"])
+                for event in events:
+                    if event.public_key in authors:
+                        await websocket.send(json.dumps(["EVENT", message[1], event_data(event)]))
+                await websocket.send(json.dumps(["EOSE", message[1]]))
+
+    server = await websockets.serve(handler, "127.0.0.1", 0)
+    return server, f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+
+async def wait_connected(pool, count=1):
+    """Wait until the pool has the given number of open relays."""
+    for _ in range(100):
+        if len(pool.connected_relays) >= count:
+            return
+        await asyncio.sleep(0.02)
+    raise AssertionError("relay did not connect")
+
+def test_parse_profile():
+    """Test that addresses are read from the content and blanks ignored."""
+    event = make_metadata({"name": "alice", "lud16": " alice@example.com ", "lud06": ""}, created_at=5)
+    profile = parse_profile(WireEvent.from_json(event_data(event)), 100)
+    assert profile == Profile(event.public_key, "alice@example.com", None, 5, 100)
+    assert profile.has_address
+
+    broken = make_metadata({}, created_at=5)
+    broken.content = "not json"
+    assert not parse_profile(WireEvent.from_json(event_data(broken)), 100).has_address
+
+def test_cache_expiry_and_eviction():
+    """Test separate TTLs for found and missing addresses and LRU eviction."""
+    now = [1000.0]
+    cache = ProfileCache(ttl=100, negative_ttl=10, max_entries=2, clock=lambda: now[0])
+    cache.put(Profile("a", lud16="a@example.com", fetched_at=1000))
+    cache.put(Profile("b", fetched_at=1000))
+    assert cache.get("a") and cache.get("b")
+
+    now[0] = 1050
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.misses == 1
+
+    cache.put(Profile("c", fetched_at=1050))
+    cache.put(Profile("d", fetched_at=1050))
+    assert cache.get("a") is None
+    assert cache.evictions == 1
+    assert len(cache) == 2
+
+    with pytest.raises(ValueError):
+        ProfileCache(max_entries=0)
+
+def test_resolver_batches_lookups(tmp_path):
+    """Test that concurrent lookups share one subscription and are persisted."""
+    alice, bob, carol = PrivateKey(), PrivateKey(), PrivateKey()
+    events = [
+        make_metadata({"lud16": "alice@old.example"}, alice, created_at=100),
+        make_metadata({"lud16": "alice@example.com"}, alice, created_at=200),
+        make_metadata({"name": "bob"}, bob, created_at=100),
+    ]
+    # A newer event for carol signed by someone else must be ignored
+    forged = make_metadata({"lud16": "thief@example.com"}, carol, created_at=300)
+    forged.signature = events[0].signature
+    events.append(forged)
+    dave = PrivateKey().public_key.hex()
+    db = Database(str(tmp_path / "payments.db"))
+
+    async def scenario():
+        requests = []
+        server, url = await start_relay(events, requests)
+        resolver = ProfileResolver(RelayPool([url]), db, batch_seconds=0.05)
+        resolver.start()
+        try:
+            await wait_connected(resolver.relay_pool)
+            pubkeys = [alice.public_key.hex(), bob.public_key.hex(), carol.public_key.hex(), dave]
+            profiles = await asyncio.wait_for(asyncio.gather(*(resolver.resolve(p) for p in pubkeys)), 5)
+
+            reqs = [message for message in requests if message[0] == "REQ"]
+            assert len(reqs) == 1
+            assert sorted(reqs[0][2]["authors"]) == sorted(pubkeys)
+            assert reqs[0][2]["kinds"] == [0]
+            assert ["CLOSE", reqs[0][1]] in requests
+
+            assert profiles[0].lud16 == "alice@example.com"
+            assert profiles[0].created_at == 200
+            assert not any(profile.has_address for profile in profiles[1:])
+
+            # Found and missing profiles are both answered from memory now
+            assert (await resolver.resolve(dave)).pubkey == dave
+            assert resolver.stats()["batches"] == 1
+            assert resolver.stats()["fetched"] == 2
+        finally:
+            await resolver.close()
+
+        # A new resolver starts from the stored profiles
+        resolver = ProfileResolver(RelayPool([url]), db, batch_seconds=0.01)
+        resolver.start()
+        try:
+            profile = await asyncio.wait_for(resolver.resolve(alice.public_key.hex()), 5)
+            assert profile.lud16 == "alice@example.com"
+            assert resolver.stats()["batches"] == 0
+        finally:
+            await resolver.close()
+            server.close()
+
+    asyncio.run(scenario())
+    assert len(db.get_profiles([alice.public_key.hex(), dave])) == 2
+    db.close()
+
+def test_resolver_does_not_cache_when_offline(tmp_path):
+    """Test that lookups without a connected relay are answered but not cached."""
+    db = Database(str(tmp_path / "payments.db"))
+
+    async def scenario():
+        resolver = ProfileResolver(RelayPool(["ws://127.0.0.1:9"], base_backoff=10), db, batch_seconds=0.01)
+        resolver.start()
+        try:
+            profile = await asyncio.wait_for(resolver.resolve("e" * 64), 5)
+            assert not profile.has_address
+            assert resolver.stats()["failed_batches"] == 1
+            assert resolver.stats()["cache_entries"] == 0
+        finally:
+            await resolver.close()
+
+    asyncio.run(scenario())
+    assert db.get_profiles(["e" * 64]) == []
+    db.close()
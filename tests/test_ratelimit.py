@@ -0,0 +1,85 @@
+"""Test the in-memory rate-limit cache."""
+
+import pytest
+from datetime import datetime
+from src.backend.db.models import Database, Payment
+from src.backend.nostr_bot.ratelimit import RateLimitCache
+
+WINDOW = 24 * 3600
+
+class FakeClock:
+    """Manually advanced clock."""
+    
+    def __init__(self, now=1700000000.0):
+        self.now = now
+    
+    def __call__(self):
+        return self.now
+
+class CountingDatabase(Database):
+    """Database that counts rate-limit queries."""
+    
+    queries = 0
+    
+    def latest_paid_at(self, npub, note_id, since):
+        self.queries += 1
+        return super().latest_paid_at(npub, note_id, since)
+
+@pytest.fixture
+def db():
+    """Create an in-memory database."""
+    return CountingDatabase(":memory:")
+
+@pytest.fixture
+def clock():
+    """Create a fake clock."""
+    return FakeClock()
+
+def add_paid(db, npub, note_id, paid_at):
+    """Record a paid payment at the given Unix time."""
+    db.add_payment(Payment(None, npub, 1000, "bolt11", "paid", datetime.fromtimestamp(paid_at), note_id))
+
+def test_recorded_payments_are_served_from_memory(db, clock):
+    """Test that repeat checks after a payment do not touch the database."""
+    cache = RateLimitCache(db, WINDOW, clock=clock)
+    assert not cache.is_limited("npub1", "note1")
+    assert db.queries == 1
+    
+    cache.record("npub1", "note1", clock.now)
+    for _ in range(5):
+        assert cache.is_limited("npub1", "note1")
+    assert db.queries == 1
+    assert cache.stats()["hits"] == 5
+
+def test_entries_expire_at_end_of_window(db, clock):
+    """Test that the limit lifts exactly when the window ends."""
+    cache = RateLimitCache(db, WINDOW, clock=clock)
+    cache.record("npub1", "note1", clock.now)
+    
+    clock.now += WINDOW
+    assert cache.is_limited("npub1", "note1")
+    clock.now += 1
+    assert not cache.is_limited("npub1", "note1")
+    assert len(cache) == 0
+
+def test_warm_loads_payments_inside_window(db, clock):
+    """Test that startup warming only keeps payments still in the window."""
+    add_paid(db, "npub1", "note1", clock.now - 3600)
+    add_paid(db, "npub2", "note1", clock.now - WINDOW - 3600)
+    
+    cache = RateLimitCache(db, WINDOW, clock=clock)
+    assert cache.warm() == 1
+    assert cache.is_limited("npub1", "note1")
+    assert db.queries == 0
+
+def test_misses_fall_back_to_database(db, clock):
+    """Test that evicted or externally written payments are still found."""
+    cache = RateLimitCache(db, WINDOW, max_entries=2, clock=clock)
+    for n in range(3):
+        cache.record(f"npub{n}", "note1", clock.now)
+    assert len(cache) == 2
+    assert cache.stats()["evictions"] == 1
+    
+    add_paid(db, "npub0", "note1", clock.now)
+    assert cache.is_limited("npub0", "note1")
+    assert db.queries == 1
@@ -0,0 +1,72 @@
+"""Test reconciliation of pending payments against LNbits."""
+
+import json
+import re
+from datetime import datetime
+import responses
+from src.backend.db.models import Database, Payment
+from backend.ln_wallet.reconcile import PaymentReconciler, payment_state
+from backend.ln_wallet.wallet import CircuitBreaker, LNbitsClient
+
+LNBITS_URL = "https://test.lnbits.com"
+
+def add_pending(db, npub, payment_hash):
+    """Record a pending payment."""
+    return db.add_payment(Payment(
+        id=None, npub=npub, amount=1000, bolt11="bolt11", status="pending",
+        created_at=datetime.now(), note_id="note1", payment_hash=payment_hash
+    ))
+
+def test_payment_state():
+    """Test mapping LNbits lookups to payment statuses."""
+    assert payment_state({"paid": True}) == "paid"
+    assert payment_state({"paid": False, "details": {"status": "pending"}}) is None
+    assert payment_state({"paid": False, "details": {"status": "failed"}}) == "failed"
+    assert payment_state({"paid": False, "status": "expired"}) == "expired"
+
+@responses.activate
+def test_reconcile_updates_pending_payments(tmp_path):
+    """Test that pending payments take their LNbits status page by page."""
+    db = Database(str(tmp_path / "payments.db"))
+    states = {"hash0": {"paid": True}, "hash1": {"paid": False, "details": {"status": "failed"}}}
+    for n in range(5):
+        add_pending(db, f"npub{n}", f"hash{n}")
+    
+    def lookup(request):
+        payment_hash = request.url.rsplit("/", 1)[1]
+        if payment_hash == "hash2":
+            return (500, {}, "")
+        return (200, {}, json.dumps(states.get(payment_hash, {"paid": False})))
+    
+    responses.add_callback(responses.GET, re.compile(f"{LNBITS_URL}/api/v1/payments/.*"), callback=lookup)
+    
+    client = LNbitsClient(LNBITS_URL, "key", max_retries=0, breaker=CircuitBreaker(failure_threshold=100))
+    reconciler = PaymentReconciler(db, client, page_size=2, concurrency=4)
+    result = reconciler.reconcile()
+    reconciler.close()
+    
+    assert (result.checked, result.unchanged, result.errors) == (5, 2, 1)
+    assert result.changed == {"paid": 1, "failed": 1}
+    assert [npub for npub, _, _ in result.paid] == ["npub0"]
+    statuses = {p.npub: p.status for p in db.get_payment_history()}
+    assert statuses == {"npub0": "paid", "npub1": "failed", "npub2": "pending", "npub3": "pending", "npub4": "pending"}
+    assert db.has_recent_payment("npub0", "note1")
+    db.close()
+
+@responses.activate
+def test_reconcile_stops_when_circuit_opens(tmp_path):
+    """Test that a pass ends early once LNbits is considered down."""
+    db = Database(str(tmp_path / "payments.db"))
+    for n in range(4):
+        add_pending(db, f"npub{n}", f"hash{n}")
+    responses.add(responses.GET, re.compile(f"{LNBITS_URL}/api/v1/payments/.*"), status=503)
+    
+    client = LNbitsClient(LNBITS_URL, "key", max_retries=0, breaker=CircuitBreaker(failure_threshold=1))
+    reconciler = PaymentReconciler(db, client, page_size=2, concurrency=1)
+    result = reconciler.reconcile()
+    reconciler.close()
+    
+    assert result.interrupted
+    assert len(responses.calls) == 1
+    assert all(p.status == "pending" for p in db.get_payment_history())
+    db.close()
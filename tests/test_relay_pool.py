@@ -0,0 +1,205 @@
+"""Test the asyncio relay pool against local websocket relays."""
+
+import asyncio
+import json
+import websockets
+from nostr.filter import Filter, Filters
+from src.backend.nostr_bot.relay_pool import RelayPool
+
+def make_event_data(event_id):
+    """Create raw event data as a relay would send it."""
+    return {
+        "id": event_id,
+        "pubkey": "a" * 64,
+        "created_at": 1700000000,
+        "kind": 6,
+        "tags": [["e", "b" * 64]],
+        "content": "",
+        "sig": "c" * 128,
+    }
+
+async def start_relay(event_ids, requests, drop_first=False):
+    """Start a relay that answers each REQ with the given events and EOSE."""
+    connections = []
+
+    async def handler(websocket):
+        connections.append(websocket)
+        if drop_first and len(connections) == 1:
+            await websocket.close()
+            return
+        async for frame in websocket:
+            message = json.loads(frame)
+            requests.append(message)
+            if message[0] == "REQ":
+                for event_id in event_ids:
+                    await websocket.send(json.dumps(["EVENT", message[1], make_event_data(event_id)]))
+                await websocket.send(json.dumps(["EOSE", message[1]]))
+
+    server = await websockets.serve(handler, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    return server, f"ws://127.0.0.1:{port}"
+
+async def collect(pool, count, timeout=5):
+    """Collect the given number of events, accepting them as a verifying consumer would."""
+    events = []
+    while len(events) < count:
+        relay_event = await asyncio.wait_for(pool.queue.get(), timeout)
+        if pool.accept(relay_event):
+            events.append(relay_event)
+    return events
+
+def test_events_are_delivered_once_across_relays():
+    """Test that events from several relays arrive deduplicated."""
+    async def scenario():
+        requests = []
+        server1, url1 = await start_relay(["1" * 64, "2" * 64], requests)
+        server2, url2 = await start_relay(["2" * 64, "3" * 64], requests)
+        pool = RelayPool([url1, url2])
+        await pool.subscribe("sub", Filters([Filter(kinds=[6])]))
+        pool.start()
+        try:
+            events = await collect(pool, 3)
+            assert sorted(e.event.id for e in events) == ["1" * 64, "2" * 64, "3" * 64]
+            assert {e.subscription_id for e in events} == {"sub"}
+            assert requests[0] == ["REQ", "sub", {"kinds": [6]}]
+            await asyncio.sleep(0.05)
+            # Copies queued before the first was accepted are refused
+            while not pool.queue.empty():
+                assert not pool.accept(pool.queue.get_nowait())
+        finally:
+            await pool.close()
+            server1.close()
+            server2.close()
+
+    asyncio.run(scenario())
+
+def test_reconnects_and_resubscribes():
+    """Test that a dropped relay is reconnected and the subscription replayed."""
+    async def scenario():
+        requests = []
+        server, url = await start_relay(["1" * 64], requests, drop_first=True)
+        pool = RelayPool([url], base_backoff=0.05)
+        await pool.subscribe("sub", Filters([Filter(kinds=[6])]))
+        pool.start()
+        try:
+            events = await collect(pool, 1)
+            assert events[0].url == url
+            assert requests == [["REQ", "sub", {"kinds": [6]}]]
+            assert pool.connected_relays == [url]
+        finally:
+            await pool.close()
+            server.close()
+        assert pool.connected_relays == []
+
+    asyncio.run(scenario())
+
+def test_backoff_delay_is_bounded():
+    """Test that jittered backoff stays within its exponential ceiling."""
+    pool = RelayPool(base_backoff=1.0, max_backoff=8.0)
+    for attempt in range(10):
+        assert 0 <= pool.backoff_delay(attempt) <= min(8.0, 2 ** attempt)
+
+def test_frames_are_filtered_before_decoding():
+    """Test that unwatched and repeated events are dropped from the raw frame."""
+    async def scenario():
+        pool = RelayPool(watched={"b" * 64})
+        unwatched = make_event_data("2" * 64)
+        unwatched["tags"] = [["e", "d" * 64]]
+        
+        await pool.handle_frame("ws://a", json.dumps(["EVENT", "sub", make_event_data("1" * 64)]))
+        relay_event = await pool.queue.get()
+        assert relay_event.event.id == "1" * 64
+        assert relay_event.mentioned == ("b" * 64,)
+        assert pool.accept(relay_event)
+        await pool.handle_frame("ws://b", json.dumps(["EVENT", "sub", make_event_data("1" * 64)]))
+        await pool.handle_frame("ws://a", json.dumps(["EVENT", "sub", unwatched]))
+        
+        assert pool.queue.empty()
+        stats = pool.stats()
+        assert (stats["events_received"], stats["events_skipped"], stats["events_duplicate"]) == (3, 1, 1)
+    
+    asyncio.run(scenario())
+
+def test_forged_frames_do_not_suppress_the_event():
+    """Test that only accepted events are remembered and advance cursors."""
+    from src.backend.nostr_bot.cursors import RelayCursors
+    
+    async def scenario():
+        cursors = RelayCursors(overlap_seconds=0)
+        pool = RelayPool(watched={"b" * 64}, cursors=cursors)
+        forged = make_event_data("1" * 64)
+        forged["created_at"] = 1700000500
+        
+        # The consumer rejects the forged copy, so the genuine one gets through
+        await pool.handle_frame("ws://evil", json.dumps(["EVENT", "sub", forged]))
+        await pool.queue.get()
+        await pool.handle_frame("ws://a", json.dumps(["EVENT", "sub", make_event_data("1" * 64)]))
+        assert pool.queue.qsize() == 1
+        assert cursors.since("ws://evil", ["b" * 64], 0) == 0
+        
+        assert pool.accept(await pool.queue.get())
+        assert cursors.since("ws://a", ["b" * 64], 0) == 1700000000
+    
+    asyncio.run(scenario())
+
+def test_resubscribes_from_cursor_after_eose():
+    """Test that a reconnecting relay is asked only for events after its cursor."""
+    from src.backend.nostr_bot.cursors import RelayCursors
+    
+    async def scenario():
+        requests = []
+        server, url = await start_relay(["1" * 64], requests)
+        cursors = RelayCursors(overlap_seconds=0)
+        pool = RelayPool([url], base_backoff=0.05, watched={"b" * 64}, cursors=cursors)
+        
+        def filters_for(relay_url):
+            return Filters([Filter(kinds=[6], since=cursors.since(relay_url, ["b" * 64], 0))])
+        
+        await pool.subscribe("sub", filters_for)
+        pool.start()
+        try:
+            await collect(pool, 1)
+            # Wait for EOSE to make the catch-up count
+            for _ in range(100):
+                if cursors.is_live(url) and cursors.stats()["cursors"]:
+                    break
+                await asyncio.sleep(0.01)
+            
+            await pool.relays[url].websocket.close()
+            for _ in range(100):
+                if len(requests) == 2:
+                    break
+                await asyncio.sleep(0.01)
+            assert requests[0] == ["REQ", "sub", {"kinds": [6], "since": 0}]
+            assert requests[1] == ["REQ", "sub", {"kinds": [6], "since": 1700000000}]
+        finally:
+            await pool.close()
+            server.close()
+    
+    asyncio.run(scenario())
+
+def test_wait_connected_stops_at_quorum_or_deadline():
+    """Test the startup barrier with one relay that never connects."""
+    async def scenario():
+        requests = []
+        server1, url1 = await start_relay([], requests)
+        server2, url2 = await start_relay([], requests)
+        pool = RelayPool([url1, url2, "ws://127.0.0.1:9"], base_backoff=10)
+        # Subscribing before any relay is up reaches each one as it connects
+        await pool.subscribe("sub", Filters([Filter(kinds=[6])]))
+        pool.start()
+        try:
+            assert await asyncio.wait_for(pool.wait_connected(2, timeout=5), 5) == 2
+            start = asyncio.get_running_loop().time()
+            assert await pool.wait_connected(3, timeout=0.2) == 2
+            assert asyncio.get_running_loop().time() - start >= 0.2
+            # A quorum larger than the pool waits for every relay
+            assert await pool.wait_connected(10, timeout=0) == 2
+            await asyncio.sleep(0.05)
+            assert requests.count(["REQ", "sub", {"kinds": [6]}]) == 2
+        finally:
+            await pool.close()
+            server1.close()
+            server2.close()
+
+    asyncio.run(scenario())
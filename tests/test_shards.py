@@ -0,0 +1,61 @@
+"""Test note sharding and the shard supervisor."""
+
+import os
+import time
+from backend.metrics import Counter, Registry
+from backend.nostr_bot.shards import Shard, ShardRing
+from backend.nostr_bot.supervisor import Supervisor
+
+NOTES = [os.urandom(32).hex() for _ in range(4000)]
+
+def test_ring_spreads_notes_evenly():
+    """Test that every shard gets a similar share of the notes."""
+    ring = ShardRing(4)
+    counts = [0] * 4
+    for note_id in NOTES:
+        counts[ring.shard_of(note_id)] += 1
+    assert all(700 < count < 1300 for count in counts)
+    # The assignment is stable across instances
+    assert [ShardRing(4).shard_of(n) for n in NOTES[:50]] == [ring.shard_of(n) for n in NOTES[:50]]
+
+def test_adding_a_shard_moves_few_notes():
+    """Test that growing the ring only moves notes to the new shard."""
+    before, after = ShardRing(4), ShardRing(5)
+    moved = [n for n in NOTES if before.shard_of(n) != after.shard_of(n)]
+    assert all(after.shard_of(n) == 4 for n in moved)
+    assert len(moved) < len(NOTES) * 0.3
+
+def test_each_note_has_one_owner():
+    """Test that exactly one shard owns each note."""
+    ring = ShardRing(3)
+    shards = [Shard(index, ring) for index in range(3)]
+    for note_id in NOTES[:200]:
+        assert sum(shard.owns(note_id) for shard in shards) == 1
+
+def fake_shard(index, shards, note_ids, stats_queue):
+    """Report one snapshot, then run until stopped (shard 1 exits at once)."""
+    stats_queue.put((index, {"matched_total": {(): index + 1}}, {"running": True, "index": index}))
+    if index == 1 and not os.environ.get("AUTOZAP_TEST_RESTARTED"):
+        return
+    time.sleep(60)
+
+def test_supervisor_merges_reports_and_restarts(monkeypatch):
+    """Test metrics merging, restarts of exited shards and shutdown."""
+    registry = Registry()
+    matched = Counter("matched_total", "Matched", registry=registry)
+    supervisor = Supervisor(2, target=fake_shard, registry=registry, restart_delay=0)
+    supervisor.start()
+    # Only the first run of shard 1 exits; the restarted one stays up
+    monkeypatch.setenv("AUTOZAP_TEST_RESTARTED", "1")
+    try:
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline and not (
+            supervisor.restarts and matched.value() == 3 and supervisor.health()["shards"]["0"]["running"]
+        ):
+            supervisor.poll(timeout=0.2)
+        assert supervisor.restarts == 1
+        assert matched.value() == 3
+        assert supervisor.health()["shards"]["0"]["index"] == 0
+    finally:
+        supervisor.stop(timeout=5)
+    assert not any(process.is_alive() for process in supervisor.processes.values())
@@ -0,0 +1,213 @@
+"""Test payment processing through the payment outbox."""
+
+import os
+import sqlite3
+import subprocess
+import sys
+import pytest
+from backend.db.models import get_database
+from backend.ln_wallet.wallet import PaymentResult, InvoiceGenerationError
+
+@pytest.fixture
+def transactions(monkeypatch, tmp_path):
+    """Load the transactions module against a fresh database."""
+    import backend.config
+    import backend.nostr_bot.transactions as transactions
+    
+    monkeypatch.setenv("LNBITS_API_KEY", "test_key")
+    monkeypatch.setenv("LNBITS_URL", "https://test.lnbits.com")
+    monkeypatch.setenv("NOSTR_RELAY_URLS", "wss://relay1.com")
+    monkeypatch.setenv("DB_PATH", str(tmp_path / "payments.db"))
+    monkeypatch.setattr(backend.config, "config", None)
+    monkeypatch.setattr(transactions, "_rate_limiter", None)
+    monkeypatch.setattr(transactions, "_budget_ledger", None)
+    yield transactions
+    get_database(str(tmp_path / "payments.db")).close()
+
+def test_repost_is_paid_once(transactions, monkeypatch):
+    """Test that an outbox entry is paid once and duplicates are dropped."""
+    calls = []
+    
+    def fake_invoice(npub, note_id, amount, park_seconds):
+        calls.append((npub, note_id, amount))
+        return PaymentResult(success=True, status="invoice_generated", bolt11="bolt11")
+    
+    monkeypatch.setattr(transactions, "request_invoice_parked", fake_invoice)
+    
+    entry = transactions.enqueue_payment("event1", "npub1", "note1", 500)
+    assert transactions.enqueue_payment("event1", "npub1", "note1", 500) is None
+    
+    assert transactions.process_payment(entry).success
+    # A replayed entry finds the outbox row finished
+    assert transactions.process_payment(entry) is None
+    assert calls == [("npub1", "note1", 500)]
+    
+    db = get_database(transactions.get_config().db_path)
+    assert db.get_outbox_entry(entry.id).status == "paid"
+    assert [p.bolt11 for p in db.get_payment_history()] == ["bolt11"]
+
+def test_failed_and_interrupted_payments(transactions, monkeypatch):
+    """Test that LNbits errors fail an entry and crashes leave it to resume."""
+    def failing_invoice(npub, note_id, amount, park_seconds):
+        raise InvoiceGenerationError("bad request")
+    
+    monkeypatch.setattr(transactions, "request_invoice_parked", failing_invoice)
+    failed = transactions.enqueue_payment("event1", "npub1", "note1")
+    assert transactions.process_payment(failed).status == "failed"
+    
+    def crashing_invoice(npub, note_id, amount, park_seconds):
+        raise RuntimeError("crash")
+    
+    monkeypatch.setattr(transactions, "request_invoice_parked", crashing_invoice)
+    interrupted = transactions.enqueue_payment("event2", "npub2", "note1")
+    transactions.process_payment(interrupted)
+    
+    db = get_database(transactions.get_config().db_path)
+    assert db.get_outbox_entry(failed.id).status == "failed"
+    assert [(e.event_id, e.status) for e in db.get_unfinished_outbox_entries()] == [
+        ("event2", "submitted")
+    ]
+    # Until its lease runs out, nobody else drives the interrupted entry
+    assert transactions.process_payment(interrupted) is None
+
+def test_stalled_entry_is_recovered(transactions, monkeypatch):
+    """Test that a taken-over entry records the payment LNbits already has."""
+    import backend.ln_wallet.wallet as wallet
+    
+    calls = []
+    
+    def fake_invoice(npub, note_id, amount, park_seconds):
+        calls.append(npub)
+        return PaymentResult(success=True, status="invoice_generated", bolt11="bolt11", payment_hash="hash1")
+    
+    monkeypatch.setattr(transactions, "request_invoice_parked", fake_invoice)
+    db = get_database(transactions.get_config().db_path)
+    complete = db.complete_outbox_entry
+    
+    def locked(entry_id, payment):
+        raise sqlite3.OperationalError("database is locked")
+    
+    # The invoice is created but the write fails, so the entry stays submitted
+    monkeypatch.setattr(db, "complete_outbox_entry", locked)
+    entry = transactions.enqueue_payment("event1", "npub1", "note1", 500)
+    assert not transactions.process_payment(entry).success
+    assert db.get_outbox_entry(entry.id).payment_hash == "hash1"
+    
+    monkeypatch.setattr(db, "complete_outbox_entry", complete)
+    monkeypatch.setattr(wallet, "find_payment", lambda payment_hash: PaymentResult(
+        success=True, status="paid", bolt11="bolt11", payment_hash=payment_hash
+    ))
+    with db._get_connection() as conn:
+        conn.execute("UPDATE payment_outbox SET updated_at = updated_at - 1000")
+    
+    assert transactions.process_payment(entry).status == "paid"
+    assert calls == ["npub1"]
+    assert db.get_outbox_entry(entry.id).status == "paid"
+    assert [p.payment_hash for p in db.get_payment_history()] == ["hash1"]
+
+def test_entries_fail_after_max_attempts(transactions, monkeypatch):
+    """Test that an entry whose attempts keep stalling is eventually failed."""
+    monkeypatch.setenv("OUTBOX_MAX_ATTEMPTS", "2")
+    monkeypatch.setattr(transactions, "request_invoice_parked", lambda *args: pytest.fail("paid again"))
+    db = get_database(transactions.get_config().db_path)
+    
+    entry = transactions.enqueue_payment("event1", "npub1", "note1", 500)
+    for _ in range(2):
+        db.claim_outbox_entry(entry.id)
+        with db._get_connection() as conn:
+            conn.execute("UPDATE payment_outbox SET updated_at = updated_at - 1000")
+    
+    assert transactions.process_payment(entry).error_message == "gave up after 2 attempts"
+    assert db.get_outbox_entry(entry.id).status == "failed"
+
+def test_takeover_waits_for_payments_in_flight(transactions, monkeypatch):
+    """Test that a taken-over entry is only finished once LNbits settles its payment."""
+    import backend.ln_wallet.wallet as wallet
+    
+    db = get_database(transactions.get_config().db_path)
+    states = {"hash1": "pending", "hash2": "failed"}
+    monkeypatch.setattr(wallet, "find_payment", lambda payment_hash: PaymentResult(
+        success=states[payment_hash] != "failed", status=states[payment_hash],
+        payment_hash=payment_hash, error_message="payment failed"
+    ))
+    
+    entries = [transactions.enqueue_payment(f"event{n}", f"npub{n}", "note1", 500) for n in (1, 2)]
+    for n, entry in enumerate(entries, 1):
+        db.claim_outbox_entry(entry.id)
+        db.set_outbox_payment_hash(entry.id, f"hash{n}")
+    with db._get_connection() as conn:
+        conn.execute("UPDATE payment_outbox SET updated_at = updated_at - 1000")
+    
+    assert transactions.process_payment(entries[0]).status == "pending"
+    assert db.get_outbox_entry(entries[0].id).status == "submitted"
+    assert transactions.process_payment(entries[1]).status == "failed"
+    assert (db.get_outbox_entry(entries[1].id).status, db.get_outbox_entry(entries[1].id).error) == (
+        "failed", "payment failed"
+    )
+    assert db.get_payment_history() == []
+
+def test_lightning_addresses_are_zapped(transactions, monkeypatch):
+    """Test that reposters are paid at their lightning address when profiles are looked up."""
+    import backend.ln_wallet.lnurl as lnurl
+    import backend.ln_wallet.wallet as wallet
+    from concurrent.futures import TimeoutError
+    from backend.db.models import Profile
+    
+    db = get_database(transactions.get_config().db_path)
+    paid = []
+    
+    class Profiles:
+        def resolve_threadsafe(self, pubkey, timeout):
+            if pubkey == "npub3":
+                raise TimeoutError()
+            return Profile(pubkey, lud16="alice@example.com" if pubkey == "npub1" else None)
+    
+    def fake_pay(resolver, client, address, amount, comment=None, on_invoice=None):
+        on_invoice("hash1")
+        # The hash is on the entry before LNbits pays
+        paid.append((address, amount, db.get_outbox_entry(entries[0].id).payment_hash))
+        return PaymentResult(success=True, status="paid", bolt11="lnbc1", payment_hash="hash1")
+    
+    monkeypatch.setattr(lnurl, "get_resolver", lambda: None)
+    monkeypatch.setattr(lnurl, "pay_address", fake_pay)
+    monkeypatch.setattr(wallet, "get_client", lambda: None)
+    
+    entries = [transactions.enqueue_payment(f"event{n}", f"npub{n}", "note1", 21) for n in (1, 2, 3)]
+    assert transactions.process_payment(entries[0], Profiles()).status == "paid"
+    assert paid == [("alice@example.com", 21, "hash1")]
+    assert [(p.status, p.payment_hash) for p in db.get_payment_history()] == [("paid", "hash1")]
+    
+    # Reposters without an address are not paid; slow lookups are retried
+    assert not transactions.process_payment(entries[1], Profiles()).success
+    assert "no lightning address" in db.get_outbox_entry(entries[1].id).error
+    assert transactions.process_payment(entries[2], Profiles()).status == "pending"
+    assert db.get_outbox_entry(entries[2].id).status == "pending"
+    assert len(paid) == 1
+
+def test_budget_stops_payments(transactions, monkeypatch):
+    """Test that payments stop once the daily limit is spent."""
+    monkeypatch.setenv("BUDGET_DAILY_SATS", "1000")
+    monkeypatch.setattr(transactions, "request_invoice_parked", lambda *args: PaymentResult(
+        success=True, status="invoice_generated", bolt11="bolt11"
+    ))
+    
+    entries = [transactions.enqueue_payment(f"event{n}", f"npub{n}", "note1", 400) for n in range(3)]
+    assert [bool(transactions.process_payment(e)) for e in entries] == [True, True, False]
+    
+    db = get_database(transactions.get_config().db_path)
+    assert db.get_outbox_entry(entries[2].id).error == "over budget"
+    assert transactions.get_budget_ledger().stats()["rejections"] == 1
+    
+    # A fresh ledger, as in another process, sees the same spend
+    monkeypatch.setattr(transactions, "_budget_ledger", None)
+    assert transactions.get_budget_ledger().remaining("note1") == 200
+
+def test_bot_starts_without_loading_the_wallet():
+    """Test that importing the bot leaves requests and http.server to be loaded once relays connect."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([os.path.join(root, "src"), root]))
+    loaded = subprocess.run(
+        [sys.executable, "-c", "import sys, backend.nostr_bot.bot; print('requests' in sys.modules, 'http.server' in sys.modules)"],
+        env=env, capture_output=True, text=True, check=True
+    ).stdout.strip()
+    assert loaded == "False False"
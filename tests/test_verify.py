@@ -0,0 +1,58 @@
+"""Test batched event verification."""
+
+import asyncio
+from nostr.event import Event
+from nostr.key import PrivateKey
+from src.backend.nostr_bot.verify import EventVerifier, event_fields, verify_event
+
+def make_signed_event(content="", private_key=None):
+    """Create a repost signed by a fresh key."""
+    private_key = private_key or PrivateKey()
+    event = Event(private_key.public_key.hex(), content, kind=6, tags=[["e", "b" * 64]])
+    private_key.sign_event(event)
+    return event
+
+def test_verify_event():
+    """Test that IDs and signatures are both checked."""
+    event = make_signed_event()
+    assert verify_event(event_fields(event))
+    
+    # Content changed after signing: the ID no longer matches
+    tampered = make_signed_event()
+    tampered.content = "changed"
+    assert not verify_event(event_fields(tampered))
+    
+    # Valid ID, but signed by someone other than the claimed pubkey
+    forged = make_signed_event()
+    other = make_signed_event(private_key=PrivateKey())
+    forged.signature = other.signature
+    assert not verify_event(event_fields(forged))
+    
+    assert not verify_event(("zz", "a" * 64, 0, 6, [], "", "c" * 128))
+
+def test_verifier_passes_only_genuine_events():
+    """Test that the process pool verifier hands on genuine events only."""
+    async def scenario():
+        accepted = []
+        
+        async def handler(item):
+            accepted.append(item)
+        
+        verifier = EventVerifier(handler, workers=2, batch_size=8)
+        verifier.start()
+        try:
+            for n in range(20):
+                event = make_signed_event(str(n))
+                if n % 5 == 0:
+                    event.content = "forged"
+                await verifier.submit(event, n)
+        finally:
+            await verifier.close()
+        
+        assert sorted(accepted) == [n for n in range(20) if n % 5]
+        stats = verifier.stats()
+        assert (stats["verified"], stats["rejected"]) == (16, 4)
+        assert stats["batches"] >= 3
+        assert stats["batch_latency_max"] > 0
+    
+    asyncio.run(scenario())
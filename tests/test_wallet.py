@@ -75,3 +75,119 @@ def test_create_invoice_network_error(mock_config):
     
     with pytest.raises(InvoiceGenerationError):
         create_invoice("test_npub", "test_note")
+
+@responses.activate
+def test_client_retries_idempotent_failures(mock_config):
+    """Test that retryable errors are retried on the same session."""
+    from src.backend.ln_wallet.wallet import LNbitsClient
+    url = f"{mock_config.lnbits_url}/api/v1/payments"
+    responses.add(responses.POST, url, status=503)
+    responses.add(responses.POST, url, json={"payment_request": "bolt11"}, status=201)
+    
+    client = LNbitsClient(mock_config.lnbits_url, "test_key", backoff_base=0.001)
+    assert client.create_invoice(1000, "memo")["payment_request"] == "bolt11"
+    
+    stats = client.stats()
+    assert stats["calls"] == 2
+    assert stats["retries"] == 1
+    assert stats["circuit"] == "closed"
+    assert responses.calls[1].request.headers["X-Api-Key"] == "test_key"
+
+@responses.activate
+def test_client_does_not_retry_unsafe_requests(mock_config):
+    """Test that non-idempotent requests are not repeated after a server error."""
+    import requests
+    from src.backend.ln_wallet.wallet import LNbitsClient
+    url = f"{mock_config.lnbits_url}/api/v1/payments"
+    responses.add(responses.POST, url, status=500)
+    
+    client = LNbitsClient(mock_config.lnbits_url, "test_key", backoff_base=0.001)
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.request("POST", "/api/v1/payments", idempotent=False, json={"out": True})
+    assert len(responses.calls) == 1
+
+@responses.activate
+def test_refused_payments_raise_payment_error(mock_config):
+    """Test that LNbits rejecting a payment is final while server errors stay unknown."""
+    import requests
+    from src.backend.ln_wallet.wallet import LNbitsClient, PaymentError
+    url = f"{mock_config.lnbits_url}/api/v1/payments"
+    responses.add(responses.POST, url, json={"detail": "Insufficient balance."}, status=402)
+    
+    client = LNbitsClient(mock_config.lnbits_url, "test_key", max_retries=0)
+    with pytest.raises(PaymentError, match="Insufficient balance"):
+        client.pay_invoice("lnbc1")
+    
+    responses.replace(responses.POST, url, status=500)
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.pay_invoice("lnbc1")
+
+@responses.activate
+def test_circuit_breaker_fails_fast_and_recovers(mock_config):
+    """Test that the circuit opens after repeated failures and closes after a trial call."""
+    import requests
+    from src.backend.ln_wallet.wallet import LNbitsClient, CircuitBreaker, CircuitOpenError
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30, clock=lambda: now[0])
+    client = LNbitsClient(mock_config.lnbits_url, "test_key", max_retries=0, breaker=breaker)
+    url = f"{mock_config.lnbits_url}/api/v1/payments"
+    responses.add(responses.POST, url, status=502)
+    
+    for _ in range(2):
+        with pytest.raises(requests.exceptions.HTTPError):
+            client.create_invoice(1000, "memo")
+    
+    with pytest.raises(CircuitOpenError) as exc_info:
+        client.create_invoice(1000, "memo")
+    assert exc_info.value.retry_after == 30
+    assert len(responses.calls) == 2
+    
+    now[0] = 31
+    responses.replace(responses.POST, url, json={"payment_request": "bolt11"}, status=201)
+    client.create_invoice(1000, "memo")
+    assert breaker.state == CircuitBreaker.CLOSED
+
+@responses.activate
+def test_client_error_ends_half_open_trial(mock_config):
+    """Test that a 4xx answer to the trial call closes the circuit."""
+    import requests
+    from src.backend.ln_wallet.wallet import LNbitsClient, CircuitBreaker
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=lambda: now[0])
+    client = LNbitsClient(mock_config.lnbits_url, "test_key", max_retries=0, breaker=breaker)
+    url = f"{mock_config.lnbits_url}/api/v1/payments"
+    responses.add(responses.GET, f"{url}/hash", status=503)
+    
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.payment_status("hash")
+    assert breaker.state == CircuitBreaker.OPEN
+    
+    now[0] = 31
+    responses.replace(responses.GET, f"{url}/hash", status=404)
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.payment_status("hash")
+    assert breaker.state == CircuitBreaker.CLOSED
+    
+    responses.replace(responses.GET, f"{url}/hash", json={"paid": True})
+    assert client.payment_status("hash") == {"paid": True}
+
+@responses.activate
+def test_find_payment(mock_config):
+    """Test looking up the payment of an interrupted attempt."""
+    from src.backend.ln_wallet.wallet import find_payment
+    url = f"{mock_config.lnbits_url}/api/v1/payments"
+    responses.add(responses.GET, f"{url}/known", json={"paid": True, "details": {"bolt11": "bolt11"}})
+    responses.add(responses.GET, f"{url}/unknown", status=404)
+    
+    responses.add(responses.GET, f"{url}/sending", json={"paid": False, "details": {"amount": -21000, "status": "pending"}})
+    responses.add(responses.GET, f"{url}/failed", json={"paid": False, "details": {"amount": -21000, "status": "failed"}})
+    responses.add(responses.GET, f"{url}/invoice", json={"paid": False, "details": {"amount": 21000, "status": "pending"}})
+    
+    result = find_payment("known")
+    assert (result.status, result.bolt11, result.payment_hash) == ("paid", "bolt11", "known")
+    assert find_payment("unknown") is None
+    # Outgoing payments count only once settled; an unpaid invoice is just created
+    assert find_payment("sending").status == "pending"
+    failed = find_payment("failed")
+    assert (failed.success, failed.status, failed.error_message) == (False, "failed", "payment failed")
+    assert find_payment("invoice").status == "invoice_generated"
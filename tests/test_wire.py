@@ -0,0 +1,47 @@
+"""Test raw relay frame scanning and event decoding."""
+
+import json
+import pytest
+from src.backend.nostr_bot.wire import WireEvent, frame_event_id, is_event_frame, mentions_any
+
+NOTE_ID = "b" * 64
+
+def make_frame(tags, content="", event_id="1" * 64):
+    """Create an EVENT frame as a relay would send it."""
+    return json.dumps(["EVENT", "sub", {
+        "id": event_id,
+        "pubkey": "a" * 64,
+        "created_at": 1700000000,
+        "kind": 6,
+        "tags": tags,
+        "content": content,
+        "sig": "c" * 128,
+    }])
+
+def test_frame_scanning():
+    """Test the pre-decode checks on raw frames."""
+    frame = make_frame([["e", NOTE_ID]], content='{"id":"' + "d" * 64 + '"}')
+    assert is_event_frame(frame)
+    assert is_event_frame(' [ "EVENT", "sub", {}]')
+    assert not is_event_frame('["EOSE", "sub"]')
+    
+    # The ID is read from the event, not from escaped quotes in the content
+    assert frame_event_id(frame) == "1" * 64
+    assert frame_event_id('["EVENT", "sub", {}]') is None
+    
+    assert mentions_any(frame, {NOTE_ID})
+    assert not mentions_any(make_frame([["e", "e" * 64]]), {NOTE_ID})
+    # Signatures are longer than IDs and never match
+    assert not mentions_any(frame, {"c" * 64})
+
+def test_wire_event_from_json():
+    """Test decoding keeps the wire ID and rejects malformed events."""
+    data = json.loads(make_frame([["e", NOTE_ID]]))[2]
+    event = WireEvent.from_json(data)
+    assert (event.id, event.public_key, event.kind, event.tags) == ("1" * 64, "a" * 64, 6, [["e", NOTE_ID]])
+    assert not hasattr(event, "__dict__")
+    
+    with pytest.raises(TypeError):
+        WireEvent.from_json({**data, "content": 1})
+    with pytest.raises(KeyError):
+        WireEvent.from_json({k: v for k, v in data.items() if k != "sig"})
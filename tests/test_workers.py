@@ -0,0 +1,136 @@
+"""Test the payment worker pool."""
+
+import asyncio
+import threading
+import time
+from dataclasses import dataclass
+from operator import attrgetter
+from src.backend.nostr_bot.workers import PaymentWorkerPool
+
+@dataclass
+class Job:
+    """Minimal payment job."""
+    pubkey: str
+    n: int
+
+class Recorder:
+    """Blocking handler that tracks concurrency per key."""
+    
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.active = {}
+        self.max_active = 0
+        self.max_active_per_key = 0
+        self.done = []
+    
+    def __call__(self, job):
+        with self.lock:
+            self.active[job.pubkey] = self.active.get(job.pubkey, 0) + 1
+            self.max_active = max(self.max_active, sum(self.active.values()))
+            self.max_active_per_key = max(self.max_active_per_key, self.active[job.pubkey])
+        time.sleep(self.delay)
+        with self.lock:
+            self.active[job.pubkey] -= 1
+            self.done.append(job.n)
+
+def test_jobs_run_concurrently():
+    """Test that different recipients are paid in parallel."""
+    async def scenario():
+        handler = Recorder()
+        pool = PaymentWorkerPool(handler, workers=4)
+        pool.start()
+        for n in range(8):
+            await pool.submit(Job(f"pubkey{n}", n))
+        start = time.monotonic()
+        await pool.close()
+        return handler, pool, time.monotonic() - start
+    
+    handler, pool, elapsed = asyncio.run(scenario())
+    assert sorted(handler.done) == list(range(8))
+    assert handler.max_active == 4
+    assert elapsed < 8 * handler.delay
+    assert pool.stats()["processed"] == 8
+
+def test_same_recipient_is_serialized():
+    """Test that jobs for one pubkey never overlap."""
+    async def scenario():
+        handler = Recorder(delay=0.02)
+        pool = PaymentWorkerPool(handler, workers=4)
+        pool.start()
+        for n in range(6):
+            await pool.submit(Job("same", n))
+        await pool.close()
+        return handler, pool
+    
+    handler, pool = asyncio.run(scenario())
+    assert handler.max_active_per_key == 1
+    assert len(handler.done) == 6
+    assert pool._locks == {}
+
+def test_full_queue_applies_backpressure():
+    """Test that submit waits when the queue is full."""
+    async def scenario():
+        release = threading.Event()
+        pool = PaymentWorkerPool(lambda job: release.wait(), workers=1, queue_size=2)
+        pool.start()
+        for n in range(3):
+            await pool.submit(Job(f"pubkey{n}", n))
+        await asyncio.sleep(0.05)
+        
+        # One job is running, two are queued: the next submit must wait
+        blocked = asyncio.create_task(pool.submit(Job("extra", 3)))
+        await asyncio.sleep(0.05)
+        assert not blocked.done()
+        assert pool.stats()["queue_depth"] == 2
+        
+        release.set()
+        await asyncio.wait_for(blocked, 1)
+        await pool.close()
+        return pool
+    
+    pool = asyncio.run(scenario())
+    assert pool.stats()["processed"] == 4
+    assert pool.stats()["max_queue_depth"] == 2
+
+def test_handler_errors_are_counted():
+    """Test that a failing job does not stop the worker."""
+    def handler(job):
+        if job.n == 0:
+            raise RuntimeError("LNbits unavailable")
+    
+    async def scenario():
+        pool = PaymentWorkerPool(handler, workers=1)
+        pool.start()
+        await pool.submit(Job("a", 0))
+        await pool.submit(Job("b", 1))
+        await pool.close()
+        return pool
+    
+    stats = asyncio.run(scenario()).stats()
+    assert stats["failed"] == 1
+    assert stats["processed"] == 1
+
+def test_queued_jobs_are_not_duplicated():
+    """Test that a job already queued or running is dropped when submitted again."""
+    async def scenario():
+        handler = Recorder(delay=0.05)
+        pool = PaymentWorkerPool(handler, workers=2, job_id=attrgetter("n"))
+        jobs = [Job("a", 1), Job("b", 2)]
+        for job in jobs:
+            assert await pool.submit(job)
+        pool.start()
+        await asyncio.sleep(0.01)
+        # Both are running now; resubmitting them is a no-op
+        assert not await pool.submit(Job("a", 1))
+        assert await pool.submit(Job("c", 3))
+        await pool.queue.join()
+        # Finished jobs may be queued again
+        assert await pool.submit(Job("a", 1))
+        await pool.close()
+        return handler, pool
+    
+    handler, pool = asyncio.run(scenario())
+    assert sorted(handler.done) == [1, 1, 2, 3]
+    assert pool.stats()["duplicates"] == 1
+    assert pool._active_ids == set()